@@ -1,17 +1,43 @@
+import logging
 import os
-import json
+import time
 from typing import List, Optional, Dict, Any
 
 import chainlit as cl
+from chainlit.server import app as server
 from dotenv import load_dotenv
+from fastapi.responses import PlainTextResponse
 import pandas as pd
 
 from langchain_core.documents import Document
 
 # Import your LangGraph compiled app
-from graph.graph import app as graph_app
+from graph.graph import get_app
+from graph.answer_cache import answer_cache
+from graph.chains.generation import GENERATION_RUN_NAME
+from graph.consts import GRADE_DOCUMENTS
+from graph.json_stream import IncrementalJSONParser
+from graph.logger import log_interaction
+from graph.metrics import PROMETHEUS_CONTENT_TYPE, metrics
+from graph.embeddings import get_embeddings
+from graph.session_index import session_index_cache
+from graph.tracing import configure_logging
 
 load_dotenv()
+configure_logging(names=("graph", "ingestion", "app"))
+logger = logging.getLogger("app")
+
+
+# Graph metrics (node latencies, LLM calls, tokens...) for Prometheus
+@server.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.to_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# Chainlit serves the frontend from a catch-all route: /metrics has to come first
+metrics_route = next(r for r in server.router.routes if getattr(r, "path", None) == "/metrics")
+server.router.routes.remove(metrics_route)
+server.router.routes.insert(0, metrics_route)
 
 # --------------------------
 # 1. Helpers to load files
@@ -154,6 +180,9 @@ async def on_chat_start():
     cl.user_session.set("description_text", description_text)
 
     if session_docs:
+        # Embed the uploads once; every later message reuses this index
+        await cl.make_async(session_index_cache.get_or_build)(session_docs, get_embeddings())
+
         await cl.Message(
             content=(
                 f"✅ Se han cargado {len(session_docs)} fragmentos de documentación.\n"
@@ -170,145 +199,29 @@ async def on_chat_start():
 
 
 # --------------------------
-# 3. On each user message
+# 3. UI cards for each JSON section
 # --------------------------
 
-@cl.on_message
-async def on_message(message: cl.Message):
-    question = message.content.strip()
+ANSWER_HEADER = "🧾 **Respuesta principal**\n\n"
 
-    session_docs: List[Document] = cl.user_session.get("session_docs") or []
-    bom_text: str = cl.user_session.get("bom_text") or ""
-    description_text: str = cl.user_session.get("description_text") or ""
-
-    # Build initial graph state
-    initial_state = {
-        "question": question,
-        "bom": bom_text,
-        "description": description_text,
-        "generation": "",
-        "documents": [],
-        "session_docs": session_docs,
-    }
 
-    # LangGraph invoke
-    try:
-        final_state = graph_app.invoke(initial_state)
-    except Exception as e:
-        await cl.Message(content=f"❌ Error ejecutando LangGraph: {e}").send()
-        return
+def normalize_to_list(obj):
+    if obj is None:
+        return []
+    if isinstance(obj, list):
+        return obj
+    if isinstance(obj, dict):
+        return [obj]
+    return [str(obj)]
 
-    generation_str = final_state.get("generation", "")
-    docs: List[Document] = final_state.get("documents", [])
 
-    # Try parsing JSON
-    try:
-        data = json.loads(generation_str)
-    except:
-        await cl.Message(
-            content="⚠️ La respuesta del modelo no es un JSON válido.\nSe muestra el texto sin procesar:"
-        ).send()
-        await cl.Message(content=generation_str).send()
-        return
+def normalize_to_dict(obj):
+    if isinstance(obj, dict):
+        return obj
+    return {}
 
-    answer = data.get("answer", "")
-    sources_json = data.get("sources", [])
-
-    # Optional fields (the model may or may not include them)
-    recommendations = data.get("recommendations", [])
-    comparative_analysis = data.get("comparative_analysis", {})
-    material_substitution = data.get("material_substitution", {})
-    circularity_considerations = data.get("circularity_considerations", {})
-    highlights = data.get("highlights", [])
-    limitations = data.get("limitations", [])
-    notas = data.get("notas", "")
-
-    # ---------- UI Cards ----------
-
-    def normalize_to_list(obj):
-        if obj is None:
-            return []
-        if isinstance(obj, list):
-            return obj
-        if isinstance(obj, dict):
-            return [obj]
-        return [str(obj)]
-
-    def normalize_to_dict(obj):
-        if isinstance(obj, dict):
-            return obj
-        return {}
-
-    # Main Answer
-    await cl.Message(
-        content="🧾 **Respuesta principal**",
-        elements=[cl.Text(name="Respuesta", content=answer)],
-    ).send()
 
-    recs = normalize_to_list(recommendations)
-    if recs:
-        safe_items = []
-        for r in recs:
-            if isinstance(r, dict):
-                current = r.get("current_material", "")
-                alt = r.get("alternative", "")
-                reason = r.get("reason", "")
-                safe_items.append(f"- {current} → {alt}: {reason}")
-            else:
-                safe_items.append(f"- {str(r)}")
-        bullets = "\n".join(safe_items)
-        await cl.Message(
-            content="🛠️ **Recomendaciones técnicas**",
-            elements=[cl.Text(name="Recomendaciones", content=bullets)],
-        ).send()
-
-    comp = normalize_to_dict(comparative_analysis)
-    if comp:
-        text = "\n".join(f"**{k}:** {v}" for k, v in comp.items())
-        await cl.Message(
-            content="⚖️ **Análisis comparativo**",
-            elements=[cl.Text(name="Comparativa", content=text)],
-        ).send()
-
-    subs = normalize_to_dict(material_substitution)
-    if subs:
-        text = "\n".join(f"**{k}:** {v}" for k, v in subs.items())
-        await cl.Message(
-            content="🔄 **Sustitución de materiales**",
-            elements=[cl.Text(name="Materiales", content=text)],
-        ).send()
-
-    circ = normalize_to_dict(circularity_considerations)
-    if circ:
-        text = "\n".join(f"**{k}:** {v}" for k, v in circ.items())
-        await cl.Message(
-            content="♻️ **Consideraciones de circularidad**",
-            elements=[cl.Text(name="Circularidad", content=text)],
-        ).send()
-
-    if notas:
-        await cl.Message(
-            content="📝 **Notas adicionales**",
-            elements=[cl.Text(name="Notas", content=str(notas))],
-        ).send()
-
-    highs = normalize_to_list(highlights)
-    if highs:
-        bullets = "\n".join(f"- {str(h)}" for h in highs)
-        await cl.Message(
-            content="⭐ **Aspectos clave**",
-            elements=[cl.Text(name="Highlights", content=bullets)],
-        ).send()
-
-    lims = normalize_to_list(limitations)
-    if lims:
-        bullets = "\n".join(f"- {str(l)}" for l in lims)
-        await cl.Message(
-            content="⚠️ **Limitaciones**",
-            elements=[cl.Text(name="Limitaciones", content=bullets)],
-        ).send()
-
-    # Sources
+def render_sources(sources_json, docs: List[Document]) -> Optional[cl.Message]:
     doc_map = {}
     for d in docs:
         key = (d.metadata.get("source"), d.metadata.get("page"))
@@ -317,7 +230,9 @@ async def on_message(message: cl.Message):
 
     source_elements = []
 
-    for i, s in enumerate(sources_json, 1):
+    for i, s in enumerate(normalize_to_list(sources_json), 1):
+        if not isinstance(s, dict):
+            continue
         src = s.get("source", "desconocido")
         page = s.get("page", "N/A")
         reason = s.get("reason", "")
@@ -337,8 +252,197 @@ async def on_message(message: cl.Message):
             cl.Text(name=f"Fuente {i}", content="\n".join(lines))
         )
 
-    if source_elements:
-        await cl.Message(
-            content="📚 **Fuentes consultadas**",
-            elements=source_elements,
-        ).send()
\ No newline at end of file
+    if not source_elements:
+        return None
+    return cl.Message(
+        content="📚 **Fuentes consultadas**",
+        elements=source_elements,
+    )
+
+
+def render_section(key: str, value: Any, docs: List[Document]) -> Optional[cl.Message]:
+    """
+    Build the card for one top-level field of the generation JSON.
+    Returns None for empty or unknown fields.
+    """
+    if key == "recommendations":
+        recs = normalize_to_list(value)
+        if not recs:
+            return None
+        safe_items = []
+        for r in recs:
+            if isinstance(r, dict):
+                current = r.get("current_material", "")
+                alt = r.get("alternative", "")
+                reason = r.get("reason", "")
+                safe_items.append(f"- {current} → {alt}: {reason}")
+            else:
+                safe_items.append(f"- {str(r)}")
+        bullets = "\n".join(safe_items)
+        return cl.Message(
+            content="🛠️ **Recomendaciones técnicas**",
+            elements=[cl.Text(name="Recomendaciones", content=bullets)],
+        )
+
+    dict_cards = {
+        "comparative_analysis": ("⚖️ **Análisis comparativo**", "Comparativa"),
+        "material_substitution": ("🔄 **Sustitución de materiales**", "Materiales"),
+        "circularity_considerations": ("♻️ **Consideraciones de circularidad**", "Circularidad"),
+    }
+    if key in dict_cards:
+        data = normalize_to_dict(value)
+        if not data:
+            return None
+        title, name = dict_cards[key]
+        text = "\n".join(f"**{k}:** {v}" for k, v in data.items())
+        return cl.Message(content=title, elements=[cl.Text(name=name, content=text)])
+
+    if key == "notas":
+        if not value:
+            return None
+        return cl.Message(
+            content="📝 **Notas adicionales**",
+            elements=[cl.Text(name="Notas", content=str(value))],
+        )
+
+    list_cards = {
+        "highlights": ("⭐ **Aspectos clave**", "Highlights"),
+        "limitations": ("⚠️ **Limitaciones**", "Limitaciones"),
+    }
+    if key in list_cards:
+        items = normalize_to_list(value)
+        if not items:
+            return None
+        title, name = list_cards[key]
+        bullets = "\n".join(f"- {str(i)}" for i in items)
+        return cl.Message(content=title, elements=[cl.Text(name=name, content=bullets)])
+
+    if key == "sources":
+        return render_sources(value, docs)
+
+    return None
+
+
+async def send_raw_generation(generation_str: str):
+    await cl.Message(
+        content="⚠️ La respuesta del modelo no es un JSON válido.\nSe muestra el texto sin procesar:"
+    ).send()
+    await cl.Message(content=generation_str).send()
+
+
+async def render_generation(generation_str: str, docs: List[Document]):
+    """Render a complete generation (e.g. from the answer cache) at once."""
+    parser = IncrementalJSONParser()
+    for kind, key, value in parser.feed(generation_str):
+        if kind != "section":
+            continue
+        if key == "answer":
+            await cl.Message(content=ANSWER_HEADER + str(value)).send()
+        else:
+            card = render_section(key, value, docs)
+            if card is not None:
+                await card.send()
+
+    if not parser.result:
+        await send_raw_generation(generation_str)
+
+
+# --------------------------
+# 4. On each user message
+# --------------------------
+
+@cl.on_message
+async def on_message(message: cl.Message):
+    started = time.perf_counter()
+    question = message.content.strip()
+
+    session_docs: List[Document] = cl.user_session.get("session_docs") or []
+    bom_text: str = cl.user_session.get("bom_text") or ""
+    description_text: str = cl.user_session.get("description_text") or ""
+
+    # Build initial graph state
+    initial_state = {
+        "question": question,
+        "bom": bom_text,
+        "description": description_text,
+        "generation": "",
+        "documents": [],
+        "session_docs": session_docs,
+    }
+
+    # Same question, BOM, description and index version: reuse the answer
+    cached, cache_status = await cl.make_async(answer_cache.lookup)(initial_state)
+    if cached is not None:
+        logger.info("[AnswerCache] %s: %s", cache_status, answer_cache.stats())
+        log_interaction(question, cached["documents"], cached["generation"], cache=cache_status)
+        await render_generation(cached["generation"], cached["documents"])
+        return
+    initial_state["cache_status"] = cache_status
+
+    final_state: Dict[str, Any] = {}
+    docs: List[Document] = []
+    parser = IncrementalJSONParser()
+    answer_msg: Optional[cl.Message] = None
+    sent: List[cl.Message] = []  # cards of the current generation attempt
+    ttft: Optional[float] = None
+
+    # Stream the graph: the answer card fills in token by token and every
+    # other section is rendered as soon as its JSON value is complete.
+    try:
+        # The request's trace (graph/tracing.py) is keyed by the message id
+        config = {"metadata": {"request_id": message.id}}
+        async for event in get_app().astream_events(initial_state, config=config, version="v2"):
+            kind = event["event"]
+
+            if kind == "on_chain_end" and event["name"] == GRADE_DOCUMENTS:
+                docs = event["data"]["output"].get("documents", docs)
+
+            elif kind == "on_chain_start" and event["name"] == GENERATION_RUN_NAME:
+                # New generation attempt (the previous one was not grounded)
+                for m in sent:
+                    await m.remove()
+                sent = []
+                answer_msg = None
+                parser = IncrementalJSONParser()
+
+            elif kind == "on_chat_model_stream" and GENERATION_RUN_NAME in event["tags"]:
+                token = event["data"]["chunk"].content
+                if not token:
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                    metrics.observe("generation_ttft_seconds", ttft)
+                    logger.info("[Metrics] Time to first token: %.2fs", ttft)
+
+                for section_kind, key, value in parser.feed(token):
+                    if section_kind == "delta":
+                        if answer_msg is None:
+                            answer_msg = cl.Message(content=ANSWER_HEADER)
+                            sent.append(answer_msg)
+                        await answer_msg.stream_token(value)
+                    elif key == "answer":
+                        if answer_msg is None:
+                            answer_msg = cl.Message(content=ANSWER_HEADER + str(value))
+                            sent.append(answer_msg)
+                        await answer_msg.send()
+                    else:
+                        card = render_section(key, value, docs)
+                        if card is not None:
+                            await card.send()
+                            sent.append(card)
+
+            elif kind == "on_chain_end" and not event["parent_ids"]:
+                final_state = event["data"]["output"] or {}
+    except Exception as e:
+        await cl.Message(content=f"❌ Error ejecutando LangGraph: {e}").send()
+        return
+
+    await cl.make_async(answer_cache.store)(initial_state, final_state)
+
+    if parser.result:
+        return
+
+    # The model did not produce a JSON object: show the raw text
+    for m in sent:
+        await m.remove()
+    await send_raw_generation(final_state.get("generation", ""))
@@ -0,0 +1,115 @@
+"""
+BOM retrieval benchmark: whole-BOM single query vs per-component queries
+fused with RRF (graph.bom_planner).
+
+Runs on a synthetic corpus with a local hashing embedder whose input is
+truncated like a real embedding model. Recall is the share of BOM
+materials with at least one retrieved chunk about that material.
+
+    python -m benchmarks.bench_bom_retrieval --rows 120 --top-k 20
+"""
+import argparse
+import json
+import random
+import time
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from benchmarks.fakes import HashingEmbeddings
+from graph.bom_planner import retrieve_for_bom
+
+MATERIALS = [
+    "acero", "aluminio", "cobre", "latón", "bronce", "titanio", "polipropileno",
+    "polietileno", "poliamida", "pvc", "abs", "policarbonato", "vidrio", "fibra",
+    "carbono", "epoxi", "poliuretano", "caucho", "neopreno", "silicona", "madera",
+    "corcho", "cerámica", "hormigón", "zinc", "níquel", "estaño", "plomo",
+    "magnesio", "teflón", "nylon", "poliéster", "lana", "algodón", "grafito",
+    "cromo", "cobalto", "manganeso", "wolframio", "litio",
+]
+
+COMPONENTS = [
+    "bastidor", "eje", "carcasa", "tapa", "soporte", "brida", "junta", "tornillo",
+    "panel", "cable", "motor", "contrapeso", "rueda", "guía", "bisagra", "placa",
+]
+
+FILLER = (
+    "impacto ambiental ciclo de vida reciclaje fin de vida huella de carbono "
+    "proveedor transporte mantenimiento durabilidad normativa"
+).split()
+
+
+def build_corpus(rng: random.Random, chunks_per_material: int):
+    docs = []
+    for m in MATERIALS:
+        for i in range(chunks_per_material):
+            words = rng.sample(FILLER, 6)
+            docs.append(
+                Document(
+                    page_content=f"Guía sobre {m}: {' '.join(words)} del {m}.",
+                    metadata={"material": m},
+                )
+            )
+    return docs
+
+
+def build_bom(rng: random.Random, rows: int):
+    lines = ["| Componente | Material | Cantidad |", "|:---|---|---|"]
+    used = []
+    for i in range(rows):
+        m = rng.choice(MATERIALS)
+        used.append(m)
+        lines.append(f"| {rng.choice(COMPONENTS)} | {m} | {rng.randint(1, 9)} |")
+    return "\n".join(lines), sorted(set(used))
+
+
+def recall(found, materials):
+    covered = {d.metadata.get("material") for d in found}
+    return len(covered & set(materials)) / len(materials)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=120)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--max-chars", type=int, default=1500, help="Embedder input limit")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per embedding call")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    embeddings = HashingEmbeddings(size=1024, max_chars=args.max_chars, latency=args.latency)
+    store = FAISS.from_documents(build_corpus(rng, 3), embeddings)
+    bom, materials = build_bom(rng, args.rows)
+
+    embeddings.calls = embeddings.texts = 0
+    start = time.perf_counter()
+    single = store.similarity_search_by_vector(embeddings.embed_query(bom), k=args.top_k)
+    single_s = time.perf_counter() - start
+    single_calls = embeddings.calls
+
+    embeddings.calls = embeddings.texts = 0
+    start = time.perf_counter()
+    planned = retrieve_for_bom(bom, store, embeddings, top_k=args.top_k)
+    planned_s = time.perf_counter() - start
+
+    print(json.dumps({
+        "bom_rows": args.rows,
+        "bom_chars": len(bom),
+        "materials": len(materials),
+        "top_k": args.top_k,
+        "single_query": {
+            "seconds": round(single_s, 4),
+            "embedding_calls": single_calls,
+            "recall": round(recall(single, materials), 3),
+        },
+        "per_component_rrf": {
+            "seconds": round(planned_s, 4),
+            "embedding_calls": embeddings.calls,
+            "queries": embeddings.texts,
+            "recall": round(recall(planned, materials), 3),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Cold-start benchmark: importing the graph package vs building every client.
+
+Each sample runs in a fresh interpreter. "import" only imports graph.graph
+(what a Chainlit worker or pytest collection pays now); "eager" also
+compiles the app and creates the LLM chains, embedder, Chroma collection
+and retriever, which is what importing graph.graph used to do (minus
+rendering graph.png through a web service). No request is sent to OpenAI.
+
+    python -m benchmarks.bench_import --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+IMPORT_ONLY = "import graph.graph"
+
+EAGER = """
+import ingestion
+ingestion.PERSIST_DIRECTORY = {persist!r}
+import graph.graph
+from graph.chains.answer_grader import get_answer_grader
+from graph.chains.generation import get_generation_chain
+from graph.chains.hallucination_grader import get_hallucination_grader
+from graph.chains.retrieval_grader import get_retrieval_grader
+graph.graph.get_app()
+get_answer_grader(); get_generation_chain(); get_hallucination_grader(); get_retrieval_grader()
+ingestion.get_retriever()
+"""
+
+TIMED = """
+import time
+t0 = time.perf_counter()
+{code}
+print(time.perf_counter() - t0)
+"""
+
+
+def sample(code: str) -> float:
+    env = dict(os.environ)
+    # Clients are only constructed, never called
+    env.setdefault("OPENAI_API_KEY", "sk-bench")
+    out = subprocess.run(
+        [sys.executable, "-c", TIMED.format(code=code)],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    return {
+        "runs": len(samples),
+        "median_seconds": round(statistics.median(samples), 3),
+        "min_seconds": round(min(samples), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist:
+        modes = {"import": IMPORT_ONLY, "eager": EAGER.format(persist=persist)}
+        # One warm-up run so the OS file cache is equally hot for every mode
+        sample(modes["eager"])
+        results = {
+            name: summarize([sample(code) for _ in range(args.runs)])
+            for name, code in modes.items()
+        }
+
+    results["speedup"] = round(
+        results["eager"]["median_seconds"] / results["import"]["median_seconds"], 2
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
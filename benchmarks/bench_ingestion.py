@@ -0,0 +1,116 @@
+"""
+Ingestion benchmark: serial vs process-pool load/split.
+
+Each mode runs in its own subprocess against a fresh temporary Chroma
+collection with a local fake embedder, so only loading, splitting and the
+upsert path are measured. The extracted-text cache is disabled so both
+modes parse every file.
+
+    python -m benchmarks.bench_ingestion --docs ./docs --workers 8
+    python -m benchmarks.bench_ingestion --synthetic 200
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def run_mode(docs: str, workers: int, char_splitter: bool) -> dict:
+    from langchain_chroma import Chroma
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    import ingestion
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = Chroma(
+            collection_name="bench",
+            persist_directory=str(Path(tmp) / "chroma"),
+            embedding_function=DeterministicFakeEmbedding(size=64),
+        )
+        splitter = None
+        if char_splitter:
+            splitter = RecursiveCharacterTextSplitter(chunk_size=1600, chunk_overlap=200)
+
+        start = time.perf_counter()
+        stats = ingestion.ingest(
+            docs,
+            store=store,
+            manifest_path=Path(tmp) / "manifest.json",
+            workers=workers,
+            use_text_cache=False,
+            splitter=splitter,
+        )
+        wall = time.perf_counter() - start
+
+    return {
+        "workers": workers,
+        "wall_seconds": round(wall, 3),
+        "chunks": stats["chunks_upserted"],
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_worker_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1
+        ),
+    }
+
+
+def make_synthetic_corpus(directory: Path, n_files: int) -> None:
+    paragraph = (
+        "El casco de acero naval se recubre con pinturas antiincrustantes. "
+        "La sustitución por materiales reciclados reduce el impacto del ciclo de vida. "
+    )
+    for i in range(n_files):
+        (directory / f"doc_{i:04d}.txt").write_text(paragraph * 400, encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", help="Folder to ingest")
+    parser.add_argument("--synthetic", type=int, default=100, help="Synthetic files if no --docs")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument(
+        "--char-splitter",
+        action="store_true",
+        help="Split by characters (the tiktoken splitter downloads its encoding once)",
+    )
+    parser.add_argument("--mode-workers", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode_workers is not None:
+        print(json.dumps(run_mode(args.docs, args.mode_workers, args.char_splitter)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = args.docs
+        if docs is None:
+            docs = tmp
+            make_synthetic_corpus(Path(tmp), args.synthetic)
+
+        results = {}
+        for name, workers in (("serial", 1), ("parallel", args.workers)):
+            cmd = [
+                sys.executable, "-m", "benchmarks.bench_ingestion",
+                "--docs", docs, "--mode-workers", str(workers),
+            ]
+            if args.char_splitter:
+                cmd.append("--char-splitter")
+            out = subprocess.run(
+                cmd,
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            results[name] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    results["speedup"] = round(
+        results["serial"]["wall_seconds"] / results["parallel"]["wall_seconds"], 2
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
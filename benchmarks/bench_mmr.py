@@ -0,0 +1,122 @@
+"""
+MMR microbenchmark: one Chroma/FAISS MMR search per (query, store) pair,
+as the retrieve node did, vs one NumPy MMR pass over the pooled
+candidates of every query (graph.mmr).
+
+The corpus, BOM and embedder are the synthetic ones of
+bench_bom_retrieval; the base store is an in-memory Chroma collection and
+the session store a FAISS index. "engine" times the MMR arithmetic alone
+on the same candidates (LangChain's per-query loop vs graph.mmr).
+
+    python -m benchmarks.bench_mmr --rows 40 --repeat 5
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_community.vectorstores import FAISS
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+from benchmarks.bench_bom_retrieval import build_bom, build_corpus, recall
+from benchmarks.fakes import HashingEmbeddings
+from graph.bom_planner import plan_bom_queries
+from graph.mmr import MMR_FETCH_K, fetch_candidates, mmr_select, multi_query_mmr
+
+QUESTION = "¿Qué materiales del casco tienen menor huella de carbono?"
+
+
+def timed(func, repeat):
+    runs, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - start)
+    return result, statistics.median(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=40)
+    parser.add_argument("--chunks-per-material", type=int, default=25)
+    parser.add_argument("--per-query-k", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    embeddings = HashingEmbeddings(size=1024)
+    corpus = build_corpus(rng, args.chunks_per_material)
+    base = Chroma(collection_name="bench-mmr", embedding_function=embeddings)
+    base.add_documents(corpus)
+    session = FAISS.from_documents(rng.sample(corpus, 200), embeddings)
+    stores = [base, session]
+
+    bom, materials = build_bom(rng, args.rows)
+    queries = [QUESTION] + plan_bom_queries(bom)
+    vectors = embeddings.embed_documents(queries)
+
+    def per_query():
+        found = {}
+        for store in stores:
+            for v in vectors:
+                for d in store.max_marginal_relevance_search_by_vector(
+                    v, k=args.per_query_k, fetch_k=MMR_FETCH_K
+                ):
+                    found.setdefault(d.page_content, d)
+        return list(found.values())
+
+    per_query_docs, per_query_s = timed(per_query, args.repeat)
+    # Same document budget as the distinct documents of the per-query path
+    k = len(per_query_docs)
+
+    def pooled():
+        # score_threshold=None: the per-query LangChain path ignores it
+        return multi_query_mmr(stores, vectors, embeddings, k=k, score_threshold=None)
+
+    pooled_docs, pooled_s = timed(pooled, args.repeat)
+
+    # MMR arithmetic alone: each query over its own candidates vs one pass over the union
+    pairs = [(v, fetch_candidates(s, [v], embeddings)[1]) for s in stores for v in vectors]
+    candidates = [
+        np.asarray(v, dtype=np.float32)
+        for s in stores
+        for v in fetch_candidates(s, vectors, embeddings)[1]
+    ]
+    _, engine_loop_s = timed(
+        lambda: [
+            maximal_marginal_relevance(np.asarray(v), c, k=args.per_query_k) for v, c in pairs
+        ],
+        args.repeat,
+    )
+    _, engine_pooled_s = timed(lambda: mmr_select(vectors, candidates, k=k), args.repeat)
+
+    print(json.dumps({
+        "queries": len(queries),
+        "stores": len(stores),
+        "candidates": len(candidates),
+        "k": k,
+        "per_query": {
+            "seconds": round(per_query_s, 4),
+            "store_searches": len(vectors) * len(stores),
+            "documents": len(per_query_docs),
+            "recall": round(recall(per_query_docs, materials), 3),
+        },
+        "pooled": {
+            "seconds": round(pooled_s, 4),
+            # Same searches, plus one get of the stored Chroma vectors
+            "store_searches": len(vectors) * len(stores) + 1,
+            "documents": len(pooled_docs),
+            "recall": round(recall(pooled_docs, materials), 3),
+        },
+        "engine": {
+            "per_query_loop_seconds": round(engine_loop_s, 5),
+            "pooled_seconds": round(engine_pooled_s, 5),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Offline end-to-end benchmark of the compiled LangGraph app.
+
+The real graph runs against local stand-ins: FakeChatModel (configurable
+latency, canned grader verdicts) for every chain, HashingEmbeddings, an
+in-memory Chroma collection for the knowledge base and a FAISS session
+index. Questions are replayed from rag_logs.jsonl (synthetic ones if there
+is no log). For each concurrency level it reports per-node p50/p95
+latency, LLM and embedding call counts and throughput as JSON.
+
+Everything is deterministic apart from scheduling noise, so the output can
+be saved as a baseline and later runs compared against it:
+
+    python -m benchmarks.bench_pipeline --output baseline.json
+    python -m benchmarks.bench_pipeline --compare baseline.json
+
+Call counts (LLM and embedding) must match the baseline exactly; p50s may
+drift by --tolerance. The session index is built before the timed runs, as
+after an upload, so no level pays for it or races to build it. Each request
+grades its own chunks (no verdict cache), so GradeDocuments calls do not
+depend on how concurrent requests interleave. --shared-verdict-cache
+measures the cache instead; its counts then depend on the concurrency and
+are only comparable with a baseline at the same level.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+from unittest import mock
+
+from langchain_chroma import Chroma
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+
+from benchmarks.bench_bom_retrieval import build_bom, build_corpus
+from benchmarks.fakes import FakeChatModel, HashingEmbeddings, canned_outputs
+from graph.bm25 import BM25Index
+from graph.consts import GENERATE, GRADE_DOCUMENTS, GRADE_GENERATION, RETRIEVE
+from graph.disk_cache import DiskCache
+from graph.logger import LOG_PATH, iter_log_records
+from graph.session_index import session_index_cache
+from graph.verdict_cache import VerdictCache
+
+# Timed runs: the graph nodes plus the post-generation check (a conditional edge)
+TIMED = {
+    RETRIEVE: RETRIEVE,
+    GRADE_DOCUMENTS: GRADE_DOCUMENTS,
+    GENERATE: GENERATE,
+    GRADE_GENERATION: GRADE_GENERATION,
+    "LangGraph": "request",
+}
+
+SYNTHETIC_QUESTIONS = [
+    "¿Qué impacto ambiental tiene el acero del bastidor?",
+    "Alternativas recicladas al aluminio de la carcasa",
+    "Huella de carbono del cobre en los cables",
+    "¿Cómo reducir el uso de pvc en las juntas?",
+    "Normativa sobre fin de vida del titanio",
+    "Comparativa entre polipropileno y poliamida para soportes",
+]
+
+DESCRIPTION = "Embarcación de recreo de 12 m con casco de acero y cubierta de teca."
+
+
+class NoVerdictCache(VerdictCache):
+    """Verdict cache that never hits: every request calls the grader for its chunks."""
+
+    def __init__(self):
+        pass
+
+    def get_many(self, keys):
+        return {}
+
+    def set_many(self, verdicts):
+        pass
+
+
+def _quantile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Wall time of every node run, by node name (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = {}
+        self._labels = {}
+        self.seconds = defaultdict(list)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, name=None, **kwargs):
+        label = TIMED.get(name or (serialized or {}).get("name"))
+        with self._lock:
+            self._labels[run_id] = label
+            # The node's RunnableLambda runs inside a step of the same name: time it once
+            if label is not None and self._labels.get(parent_run_id) != label:
+                self._started[run_id] = (label, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        with self._lock:
+            self._labels.pop(run_id, None)
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                label, t0 = started
+                self.seconds[label].append(time.perf_counter() - t0)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._labels.pop(run_id, None)
+            self._started.pop(run_id, None)
+
+    def summary(self):
+        return {
+            label: {
+                "count": len(values),
+                "p50_ms": round(1000 * _quantile(values, 0.5), 2),
+                "p95_ms": round(1000 * _quantile(values, 0.95), 2),
+            }
+            for label, values in sorted(self.seconds.items())
+        }
+
+
+def load_questions(log_path, count):
+    """`count` questions in log order, repeats included (cycling if the log is shorter)."""
+    questions = []
+    try:
+        for record in iter_log_records(log_path, resolve=False):
+            if record.get("question"):
+                questions.append(record["question"])
+    except FileNotFoundError:
+        pass
+    source = str(log_path)
+    if not questions:
+        questions, source = SYNTHETIC_QUESTIONS, "synthetic"
+    return [questions[i % len(questions)] for i in range(count)], source
+
+
+def build_fixture(embeddings, chunks_per_material):
+    rng = random.Random(0)
+    corpus = build_corpus(rng, chunks_per_material)
+    for i, doc in enumerate(corpus):
+        doc.metadata.update(source=f"guia_{doc.metadata['material']}.pdf", page=i % 7)
+    store = Chroma(collection_name="bench-pipeline", embedding_function=embeddings)
+    store.add_documents(corpus)
+    bom, _ = build_bom(rng, 20)
+    session_docs = [
+        Document(page_content=DESCRIPTION, metadata={"source": "descripcion.txt"}),
+        Document(page_content=bom, metadata={"source": "BOM.xlsx"}),
+    ]
+    return store, bom, session_docs
+
+
+def offline_pipeline(stack: ExitStack, llm, embeddings, store, workdir: Path):
+    """Point every client the graph uses at the local stand-ins."""
+    # graph.nodes re-exports the node functions under the module names
+    answer_grader = importlib.import_module("graph.chains.answer_grader")
+    generation = importlib.import_module("graph.chains.generation")
+    hallucination_grader = importlib.import_module("graph.chains.hallucination_grader")
+    retrieval_grader = importlib.import_module("graph.chains.retrieval_grader")
+    context_packer = importlib.import_module("graph.context_packer")
+    logger = importlib.import_module("graph.logger")
+    grade = importlib.import_module("graph.nodes.grade_documents")
+    retrieve = importlib.import_module("graph.nodes.retrieve")
+
+    chains = (
+        (retrieval_grader, retrieval_grader.get_retrieval_grader),
+        (answer_grader, answer_grader.get_answer_grader),
+        (hallucination_grader, hallucination_grader.get_hallucination_grader),
+        (generation, generation.get_generation_chain),
+    )
+    for module, factory in chains:
+        stack.enter_context(mock.patch.object(module, "get_llm", lambda **kwargs: llm))
+        factory.cache_clear()
+        stack.callback(factory.cache_clear)
+
+    index = BM25Index.from_vectorstore(store)
+    retriever = store.as_retriever(search_type="mmr", search_kwargs={"k": 6, "fetch_k": 20})
+    patches = [
+        (retrieve, "get_embeddings", lambda: embeddings),
+        (retrieve, "get_vectorstore", lambda: store),
+        (retrieve, "get_retriever", lambda: retriever),
+        (retrieve, "get_bm25_index", lambda: index),
+        (grade, "get_embeddings", lambda: embeddings),
+        (grade, "get_thresholds", lambda: None),
+        (context_packer, "get_token_counter", lambda: context_packer.TokenCounter()),
+        (logger, "LOG_PATH", workdir / "rag_logs.jsonl"),
+    ]
+    for module, name, value in patches:
+        stack.enter_context(mock.patch.object(module, name, value))
+    return grade
+
+
+def run_level(app, states, concurrency, mode):
+    timer = NodeTimer()
+    config = {"max_concurrency": concurrency, "callbacks": [timer]}
+    start = time.perf_counter()
+    if mode == "async":
+        asyncio.run(app.abatch(states, config=config))
+    else:
+        app.batch(states, config=config)
+    return timer, time.perf_counter() - start
+
+
+def compare(result, baseline, tolerance):
+    """
+    Differences against a baseline: call counts must match exactly (they are
+    deterministic), node p50s may be up to `tolerance` slower.
+    """
+    regressions = []
+    for level, current in result["levels"].items():
+        before = baseline.get("levels", {}).get(level)
+        if before is None:
+            continue
+        for kind in sorted(set(current["llm_calls"]) | set(before["llm_calls"])):
+            now, old = current["llm_calls"].get(kind, 0), before["llm_calls"].get(kind, 0)
+            if now != old:
+                regressions.append(
+                    {"concurrency": level, "llm_calls": kind, "baseline": old, "current": now}
+                )
+        for count in ("embedding_calls", "embedded_texts"):
+            if count in before and current[count] != before[count]:
+                regressions.append({
+                    "concurrency": level,
+                    "embeddings": count,
+                    "baseline": before[count],
+                    "current": current[count],
+                })
+        for node, stats in current["nodes"].items():
+            old = before["nodes"].get(node)
+            if old and old["p50_ms"] and stats["p50_ms"] > old["p50_ms"] * (1 + tolerance):
+                regressions.append({
+                    "concurrency": level,
+                    "node": node,
+                    "baseline_p50_ms": old["p50_ms"],
+                    "p50_ms": stats["p50_ms"],
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--log", default=str(LOG_PATH))
+    parser.add_argument("--questions", type=int, default=24, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--mode", choices=["async", "sync"], default="async")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--embedding-latency", type=float, default=0.01)
+    parser.add_argument("--relevant-share", type=float, default=0.7)
+    parser.add_argument("--chunks-per-material", type=int, default=10)
+    parser.add_argument("--output", help="Write the JSON result here (e.g. a baseline)")
+    parser.add_argument("--compare", help="Baseline JSON to compare p50s against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--shared-verdict-cache",
+        action="store_true",
+        help="Share one verdict cache per level (grader calls then depend on the concurrency)",
+    )
+    args = parser.parse_args()
+
+    questions, source = load_questions(args.log, args.questions)
+    llm = FakeChatModel(latency=args.llm_latency, structured=canned_outputs(args.relevant_share))
+    embeddings = HashingEmbeddings(size=512, latency=args.embedding_latency)
+    store, bom, session_docs = build_fixture(embeddings, args.chunks_per_material)
+
+    with tempfile.TemporaryDirectory() as tmp, ExitStack() as stack:
+        grade = offline_pipeline(stack, llm, embeddings, store, Path(tmp))
+        from graph.graph import build_workflow
+
+        app = build_workflow().compile()
+        session_index_cache.get_or_build(session_docs, embeddings)
+        states = [
+            {
+                "question": q,
+                "bom": bom,
+                "description": DESCRIPTION,
+                "generation": "",
+                "documents": [],
+                "session_docs": session_docs,
+            }
+            for q in questions
+        ]
+
+        levels = {}
+        for level in [int(c) for c in args.concurrency.split(",")]:
+            if args.shared_verdict_cache:
+                # Fresh per level: every level grades the same chunks
+                verdicts = VerdictCache(DiskCache(Path(tmp) / f"verdicts-{level}.sqlite", table="v"))
+            else:
+                verdicts = NoVerdictCache()
+            stack.enter_context(mock.patch.object(grade, "get_verdict_cache", lambda v=verdicts: v))
+            llm.reset()
+            embeddings.reset()
+
+            timer, elapsed = run_level(app, states, level, args.mode)
+            embedded = embeddings.reset()
+            levels[str(level)] = {
+                "requests": len(states),
+                "seconds": round(elapsed, 3),
+                "throughput_rps": round(len(states) / elapsed, 2),
+                "nodes": timer.summary(),
+                "llm_calls": dict(sorted(llm.reset().items())),
+                "embedding_calls": embedded["calls"],
+                "embedded_texts": embedded["texts"],
+            }
+
+    result = {
+        "config": {
+            "questions": len(questions),
+            "distinct_questions": len(set(questions)),
+            "question_source": source,
+            "mode": args.mode,
+            "llm_latency": args.llm_latency,
+            "embedding_latency": args.embedding_latency,
+            "relevant_share": args.relevant_share,
+            "shared_verdict_cache": args.shared_verdict_cache,
+            "corpus_chunks": len(store.get(include=[])["ids"]),
+        },
+        "levels": levels,
+    }
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            result["regressions"] = compare(result, json.load(f), args.tolerance)
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
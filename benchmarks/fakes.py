@@ -0,0 +1,158 @@
+"""Local stand-ins for OpenAI services used by the offline benchmarks."""
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import Field, PrivateAttr
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embedder: tokens are hashed into `size`
+    buckets and the vector is L2-normalised, so texts sharing words are
+    close. `max_chars` mimics the input limit of a real model (longer
+    texts are silently truncated) and `latency` adds a per-call delay.
+    The call and text counters are thread-safe.
+    """
+
+    def __init__(self, size: int = 256, max_chars: int = 0, latency: float = 0.0):
+        self.size = size
+        self.max_chars = max_chars
+        self.latency = latency
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.texts = 0
+
+    def _embed(self, text: str) -> List[float]:
+        if self.max_chars:
+            text = text[: self.max_chars]
+        vec = np.zeros(self.size, dtype=np.float32)
+        for token in _TOKEN.findall(text.lower()):
+            bucket = int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16) % self.size
+            vec[bucket] += 1.0
+        norm = np.linalg.norm(vec)
+        if norm:
+            vec /= norm
+        return vec.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def reset(self) -> Dict[str, int]:
+        """Return the call and text counts so far and start again from zero."""
+        with self._lock:
+            counts = {"calls": self.calls, "texts": self.texts}
+            self.calls = self.texts = 0
+        return counts
+
+
+def _stable_share(text: str) -> float:
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+
+
+def canned_outputs(relevant_share: float = 0.7) -> Dict[str, Callable[[str], Dict[str, Any]]]:
+    """
+    Structured outputs of the three graders. Retrieval verdicts depend only
+    on the prompt text (a stable `relevant_share` of chunks is relevant);
+    generations are always grounded and useful, so there are no retries.
+    """
+    return {
+        "GradeDocuments": lambda text: {
+            "binary_score": "yes" if _stable_share(text) < relevant_share else "no"
+        },
+        "GradeHallucinations": lambda text: {"binary_score": True},
+        "GradeAnswer": lambda text: {"binary_score": True},
+    }
+
+
+DEFAULT_GENERATION = (
+    '{"answer": "Respuesta de prueba basada en el contexto.", '
+    '"sources": [{"source": "doc.pdf", "page": 1, "reason": "prueba"}]}'
+)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering after `latency` seconds: `response` as plain text
+    and, through `with_structured_output`, the canned output registered for
+    the schema's class name. Calls are counted per kind ("generation" or
+    the schema name), thread-safely.
+    """
+
+    latency: float = 0.0
+    response: str = DEFAULT_GENERATION
+    structured: Dict[str, Callable[[str], Dict[str, Any]]] = Field(default_factory=canned_outputs)
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _calls: Counter = PrivateAttr(default_factory=Counter)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def calls(self) -> Counter:
+        with self._lock:
+            return Counter(self._calls)
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self._calls[kind] += 1
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._count("generation")
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._count("generation")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    def with_structured_output(self, schema, **kwargs):
+        make = self.structured[schema.__name__]
+
+        def text_of(prompt) -> str:
+            return prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+
+        def invoke(prompt):
+            self._count(schema.__name__)
+            if self.latency:
+                time.sleep(self.latency)
+            return schema(**make(text_of(prompt)))
+
+        async def ainvoke(prompt):
+            self._count(schema.__name__)
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return schema(**make(text_of(prompt)))
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"Fake{schema.__name__}")
+
+    def reset(self) -> Counter:
+        """Return the call counts so far and start again from zero."""
+        with self._lock:
+            calls, self._calls = self._calls, Counter()
+        return calls
@@ -0,0 +1,80 @@
+# calibrate_grader.py
+"""
+Calibra los umbrales del prefiltro de relevancia (graph/grade_prefilter.py)
+con los veredictos del grader guardados en los logs RAG (campo "grades").
+
+Por encima del umbral superior los chunks se aceptan sin llamar al LLM, por
+debajo del inferior se descartan, y solo la franja intermedia va al grader.
+
+    python calibrate_grader.py                   # escribe grader_thresholds.json
+    python calibrate_grader.py --precision 0.99  # umbrales más conservadores
+    python calibrate_grader.py --dry-run         # solo muestra el resultado
+
+Los umbrales se eligen con el primer 80% de los veredictos (en orden
+cronológico) y el acuerdo con el grader se mide sobre el 20% restante.
+"""
+import argparse
+import json
+from datetime import datetime, timezone
+
+from graph.grade_prefilter import (
+    CALIBRATION_MIN_SUPPORT,
+    CALIBRATION_PRECISION,
+    GRADER_THRESHOLDS_PATH,
+    calibrate,
+    evaluate,
+    graded_pairs,
+)
+from graph.logger import LOG_PATH, iter_log_records
+
+# Parte de los veredictos (los más antiguos) usada para elegir los umbrales
+FRACCION_CALIBRACION = 0.8
+
+
+def calibrar(log, precision=CALIBRATION_PRECISION, min_support=CALIBRATION_MIN_SUPPORT):
+    pares = graded_pairs(iter_log_records(log, resolve=False))
+    corte = int(len(pares) * FRACCION_CALIBRACION)
+    calibracion, validacion = pares[:corte], pares[corte:]
+
+    umbrales = calibrate(calibracion, precision, min_support)
+    return {
+        "lower": umbrales.lower,
+        "upper": umbrales.upper,
+        "precision": precision,
+        "min_support": min_support,
+        "calibrated_at": datetime.now(timezone.utc).isoformat(),
+        "log": str(log),
+        "calibration": evaluate(calibracion, umbrales),
+        "validation": evaluate(validacion, umbrales),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibra el prefiltro del grader de relevancia.")
+    parser.add_argument("--log", default=str(LOG_PATH))
+    parser.add_argument("--output", default=str(GRADER_THRESHOLDS_PATH))
+    parser.add_argument("--precision", type=float, default=CALIBRATION_PRECISION)
+    parser.add_argument("--min-support", type=int, default=CALIBRATION_MIN_SUPPORT)
+    parser.add_argument("--dry-run", action="store_true", help="No escribe el fichero")
+    args = parser.parse_args()
+
+    print("Cargando veredictos desde:", args.log)
+    resultado = calibrar(args.log, args.precision, args.min_support)
+    print(json.dumps(resultado, indent=2))
+
+    if resultado["calibration"]["chunks"] == 0:
+        print("No hay veredictos con similitud en los logs. "
+              "Ejecuta el sistema RAG con GRADER_LOG_SIMILARITIES=1 primero.")
+        return
+    if resultado["lower"] is None and resultado["upper"] is None:
+        print("Ninguna franja alcanza la precisión pedida: todos los chunks irán al grader.")
+
+    if args.dry_run:
+        return
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2)
+    print(f"\nUmbrales escritos en: {args.output} (reinicia la app para aplicarlos)")
+
+
+if __name__ == "__main__":
+    main()
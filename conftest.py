@@ -0,0 +1,6 @@
+import os
+
+# Tests fake every OpenAI client; the placeholder key only keeps a client that
+# a test builds through the lazy get_*() factories from failing construction
+# (no request is ever sent).
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
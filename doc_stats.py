@@ -1,69 +1,332 @@
 # doc_stats.py
+"""
+Frecuencia de uso de documentos a partir de los logs RAG.
+
+Los logs se procesan en streaming y de forma incremental: un checkpoint
+guarda hasta qué byte se leyó el fichero activo, qué segmentos rotados
+están ya procesados (por el hash de su primera línea, que no cambia al
+comprimirlos) y los contadores por día, así que cada ejecución solo lee
+los registros añadidos desde la anterior. Las preguntas distintas se
+estiman con un HyperLogLog por documento y día, de tamaño fijo.
+
+    python doc_stats.py                 # todo el histórico
+    python doc_stats.py --window week   # últimos 7 días
+    python doc_stats.py --rebuild       # ignora el checkpoint
+"""
+import argparse
+import base64
+import gzip
+import hashlib
 import json
+import math
+import os
+import zlib
 from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from graph.logger import iter_log_files
 
 LOG_PATH = "rag_logs.jsonl"
+CHECKPOINT_PATH = "doc_stats.checkpoint.json"
+# Resumen en JSON para dashboards (se reescribe en cada ejecución)
+SUMMARY_PATH = "doc_stats_summary.json"
 
+# Ventanas de tiempo en días naturales UTC (hoy cuenta como 1)
+VENTANAS = {"day": 1, "week": 7, "all": None}
 
-def cargar_logs(path):
-    registros = []
-    with open(path, "r", encoding="utf-8") as f:
-        for linea in f:
-            item = json.loads(linea.strip())
-            registros.append(item)
-    return registros
+SIN_FECHA = "sin-fecha"
 
+# Registros del HyperLogLog: 2^10 (1 KB por documento y día, error ~3%)
+HLL_BITS = 10
 
-def main():
-    print("Cargando logs desde:", LOG_PATH)
-    registros = cargar_logs(LOG_PATH)
 
-    if not registros:
-        print("No hay registros en el fichero de logs.")
-        return
+def _hash(texto: str) -> str:
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()[:16]
 
-    # Contadores
-    hits_por_doc = Counter()
-    preguntas_por_doc = defaultdict(set)
 
-    for idx, item in enumerate(registros):
-        question = item.get("question", f"q_{idx}")
-        sources = item.get("sources")
+def _abrir(path: Path):
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+
+def cabecera(path: Path) -> Optional[str]:
+    """Hash de la primera línea: identifica el fichero aunque se rote y comprima."""
+    with _abrir(path) as f:
+        linea = f.readline()
+    return _hash(linea.decode("utf-8")) if linea.endswith(b"\n") else None
+
+
+class ContadorDistintos:
+    """
+    HyperLogLog: número aproximado de elementos distintos en memoria fija.
+    Dos contadores se combinan (unión) con el máximo de cada registro.
+    """
+
+    def __init__(self, registros: Optional[bytes] = None):
+        self.registros = bytearray(registros or bytes(1 << HLL_BITS))
+
+    def add(self, hash_hex: str) -> None:
+        # 64 bits del hash: los primeros eligen el registro, el resto da el rango
+        h = int(hash_hex[:16], 16)
+        resto_bits = 64 - HLL_BITS
+        indice = h >> resto_bits
+        resto = h & ((1 << resto_bits) - 1)
+        rango = resto_bits - resto.bit_length() + 1
+        if rango > self.registros[indice]:
+            self.registros[indice] = rango
+
+    def unir(self, otro: "ContadorDistintos") -> None:
+        self.registros = bytearray(map(max, self.registros, otro.registros))
 
+    def estimar(self) -> int:
+        m = len(self.registros)
+        estimacion = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self.registros)
+        vacios = self.registros.count(0)
+        if estimacion <= 2.5 * m and vacios:
+            # Conteo lineal: exacto en la práctica para pocos elementos
+            estimacion = m * math.log(m / vacios)
+        return round(estimacion)
+
+    def serializar(self) -> str:
+        return base64.b64encode(zlib.compress(bytes(self.registros))).decode("ascii")
+
+    @classmethod
+    def deserializar(cls, texto: str) -> "ContadorDistintos":
+        return cls(zlib.decompress(base64.b64decode(texto)))
+
+
+class Agregador:
+    """
+    Contadores por día y documento: hits y un HyperLogLog de las preguntas
+    distintas. La memoria depende del número de días y documentos, no del
+    tamaño del log ni del número de preguntas.
+    """
+
+    def __init__(self):
+        # día -> source -> {"hits": int, "preguntas": ContadorDistintos}
+        self.dias: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+        self.registros_por_dia: Counter = Counter()
+        # Cabeceras (hash de la primera línea) de los segmentos ya procesados
+        self.segmentos = set()
+        self.cabecera: Optional[str] = None
+        self.offset = 0
+
+    # --------------------------
+    # Checkpoint
+    # --------------------------
+
+    @classmethod
+    def cargar(cls, path) -> "Agregador":
+        agregador = cls()
+        if not Path(path).exists():
+            return agregador
+        with open(path, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+        agregador.segmentos = set(datos["segmentos"])
+        agregador.cabecera = datos["cabecera"]
+        agregador.offset = datos["offset"]
+        agregador.registros_por_dia = Counter(datos["registros_por_dia"])
+        for dia, fuentes in datos["dias"].items():
+            agregador.dias[dia] = {
+                src: {"hits": c["hits"], "preguntas": _cargar_preguntas(c["preguntas"])}
+                for src, c in fuentes.items()
+            }
+        return agregador
+
+    def guardar(self, path) -> None:
+        datos = {
+            "segmentos": sorted(self.segmentos),
+            "cabecera": self.cabecera,
+            "offset": self.offset,
+            "registros_por_dia": dict(self.registros_por_dia),
+            "dias": {
+                dia: {
+                    src: {"hits": c["hits"], "preguntas": c["preguntas"].serializar()}
+                    for src, c in fuentes.items()
+                }
+                for dia, fuentes in self.dias.items()
+            },
+        }
+        _escribir_json(path, datos)
+
+    # --------------------------
+    # Procesado incremental
+    # --------------------------
+
+    def procesar_registro(self, item: Dict[str, Any]) -> None:
+        dia = (item.get("timestamp") or "")[:10] or SIN_FECHA
+        self.registros_por_dia[dia] += 1
+
+        sources = item.get("sources")
         # Compatibilidad: si no hay 'sources', saltamos
         if not sources:
-            continue
-
+            return
+        pregunta = _hash(item.get("question") or "")
+        fuentes = self.dias[dia]
         for src in sources:
             if src is None:
                 continue
-            hits_por_doc[src] += 1
-            preguntas_por_doc[src].add(question)
+            contador = fuentes.setdefault(src, {"hits": 0, "preguntas": ContadorDistintos()})
+            contador["hits"] += 1
+            contador["preguntas"].add(pregunta)
 
-    if not hits_por_doc:
+    def procesar_fichero(self, path: Path, offset: int = 0) -> int:
+        """
+        Procesa las líneas completas a partir de `offset` (bytes sin
+        comprimir) y devuelve el nuevo offset. Una última línea a medio
+        escribir se deja para la siguiente ejecución.
+        """
+        with _abrir(path) as f:
+            f.seek(offset)
+            for linea in f:
+                if not linea.endswith(b"\n"):
+                    break
+                offset += len(linea)
+                if linea.strip():
+                    self.procesar_registro(json.loads(linea))
+        return offset
+
+    def actualizar(self, log_path) -> int:
+        """Procesa lo añadido desde el último checkpoint. Devuelve los registros nuevos."""
+        antes = sum(self.registros_por_dia.values())
+        ficheros = iter_log_files(log_path)
+        activo = Path(log_path)
+
+        # Por cabecera y no por nombre: un segmento leído como .jsonl antes de
+        # que el writer lo comprima vuelve después como .jsonl.gz
+        vistos = set()
+        for path in ficheros:
+            if path == activo:
+                continue
+            id_segmento = cabecera(path) or path.name
+            vistos.add(id_segmento)
+            if id_segmento in self.segmentos:
+                continue
+            # El segmento puede ser el antiguo fichero activo, ya leído en parte
+            offset = self.offset if self.cabecera and id_segmento == self.cabecera else 0
+            self.procesar_fichero(path, offset)
+            self.segmentos.add(id_segmento)
+            if offset:
+                self.cabecera, self.offset = None, 0
+
+        if activo in ficheros:
+            actual = cabecera(activo)
+            offset = self.offset if actual and actual == self.cabecera else 0
+            self.offset = self.procesar_fichero(activo, offset)
+            self.cabecera = cabecera(activo)
+        else:
+            self.cabecera, self.offset = None, 0
+
+        # Segmentos borrados del disco
+        self.segmentos &= vistos
+        return sum(self.registros_por_dia.values()) - antes
+
+    # --------------------------
+    # Consultas
+    # --------------------------
+
+    def resumen(self, dias: Optional[int] = None, hoy=None) -> Dict[str, Any]:
+        hoy = hoy or datetime.now(timezone.utc).date()
+        desde = (hoy - timedelta(days=dias - 1)).isoformat() if dias else None
+
+        def en_ventana(dia: str) -> bool:
+            return desde is None or (dia != SIN_FECHA and dia >= desde)
+
+        hits = Counter()
+        preguntas = defaultdict(ContadorDistintos)
+        for dia, fuentes in self.dias.items():
+            if not en_ventana(dia):
+                continue
+            for src, c in fuentes.items():
+                hits[src] += c["hits"]
+                preguntas[src].unir(c["preguntas"])
+
+        total_hits = sum(hits.values())
+        return {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "window_days": dias,
+            "since": desde,
+            "records": sum(n for d, n in self.registros_por_dia.items() if en_ventana(d)),
+            "total_hits": total_hits,
+            "documents": [
+                {
+                    "source": src,
+                    "hits": count,
+                    "share": round(count / total_hits, 4) if total_hits else 0.0,
+                    "questions": preguntas[src].estimar(),
+                }
+                for src, count in hits.most_common()
+            ],
+        }
+
+
+def _cargar_preguntas(guardado) -> ContadorDistintos:
+    contador = ContadorDistintos()
+    if isinstance(guardado, list):
+        # Checkpoint anterior: lista de hashes de las preguntas
+        for h in guardado:
+            contador.add(h)
+        return contador
+    return ContadorDistintos.deserializar(guardado)
+
+
+def _escribir_json(path, datos) -> None:
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def imprimir(resumen: Dict[str, Any]) -> None:
+    if not resumen["documents"]:
         print("No se encontraron 'sources' en los logs. "
               "Asegúrate de haber actualizado el logger.")
         return
 
-    total_hits = sum(hits_por_doc.values())
+    total_hits = resumen["total_hits"]
     print("\nFrecuencia de uso de documentos (Document Hit Frequency):\n")
     print(f"Total de hits (chunks recuperados con 'source' válido): {total_hits}\n")
 
     # Ordenar de más usado a menos
-    for src, count in hits_por_doc.most_common():
-        num_preguntas = len(preguntas_por_doc[src])
-        porcentaje = 100.0 * count / total_hits if total_hits > 0 else 0.0
-
+    for doc in resumen["documents"]:
         print("────────────────────────────────────────")
-        print(f"Documento: {src}")
-        print(f"   ➤ Hits totales: {count}")
-        print(f"   ➤ Porcentaje de todos los hits: {porcentaje:.2f}%")
-        print(f"   ➤ Número de preguntas distintas que lo usan: {num_preguntas}")
+        print(f"Documento: {doc['source']}")
+        print(f"   ➤ Hits totales: {doc['hits']}")
+        print(f"   ➤ Porcentaje de todos los hits: {100.0 * doc['share']:.2f}%")
+        print(f"   ➤ Número de preguntas distintas que lo usan (aprox.): {doc['questions']}")
 
     print("\nAnálisis completado.")
     print("   Si los 2-3 primeros documentos concentran >60-70% de los hits,")
     print("   es muy probable que el recuperador esté sesgado hacia ellos.")
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Frecuencia de uso de documentos en los logs RAG.")
+    parser.add_argument("--log", default=LOG_PATH)
+    parser.add_argument("--window", choices=sorted(VENTANAS), default="all")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--summary", default=SUMMARY_PATH)
+    parser.add_argument("--rebuild", action="store_true", help="Reprocesa todo el log")
+    args = parser.parse_args()
+
+    print("Cargando logs desde:", args.log)
+    agregador = Agregador() if args.rebuild else Agregador.cargar(args.checkpoint)
+    nuevos = agregador.actualizar(args.log)
+    agregador.guardar(args.checkpoint)
+    print(f"Registros nuevos procesados: {nuevos}")
+
+    resumen = agregador.resumen(VENTANAS[args.window])
+    resumen["log"] = args.log
+    _escribir_json(args.summary, resumen)
+
+    if not resumen["records"]:
+        print("No hay registros en el fichero de logs.")
+        return
+    imprimir(resumen)
+    print(f"\nResumen JSON escrito en: {args.summary}")
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
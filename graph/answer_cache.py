@@ -0,0 +1,217 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from graph.embeddings import get_embeddings
+from graph.logger import log_interaction
+from graph.session_index import hash_documents
+from ingestion import ManifestVersion
+
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+# Semantic near-hit mode: reuse the answer of a very similar question
+ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "0") == "1"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+HIT = "hit"
+SEMANTIC_HIT = "semantic-hit"
+MISS = "miss"
+
+_PUNCTUATION = re.compile(r"[¿?¡!.,;:]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    question = _PUNCTUATION.sub(" ", question.lower())
+    return _SPACES.sub(" ", question).strip()
+
+
+def _sha(*parts: str) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+@dataclass
+class _Entry:
+    result: Dict[str, Any]
+    scope: str
+    created: float
+    vector: Optional[np.ndarray] = None
+
+
+class AnswerCache:
+    """
+    In-memory cache of final graph states in front of the compiled app.
+
+    The exact key is a hash of the normalized question, the BOM text, the
+    description, the uploaded session documents and the index version of
+    the Chroma collection. With
+    `semantic=True` a miss falls back to the most similar cached question
+    for the same BOM, description and index version, if its cosine
+    similarity is at least `threshold`. Entries expire after `ttl` seconds,
+    the least recently used are evicted past `max_entries`, and the whole
+    cache is dropped whenever the index version changes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl: float = ANSWER_CACHE_TTL_SECONDS,
+        semantic: bool = ANSWER_CACHE_SEMANTIC,
+        threshold: float = ANSWER_CACHE_SIMILARITY,
+        embeddings: Optional[Embeddings] = None,
+        index_version: Optional[Callable[[], str]] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic = semantic
+        self.threshold = threshold
+        self._embeddings = embeddings
+        self._index_version = index_version or ManifestVersion()
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _keys(self, state: Dict[str, Any]) -> Tuple[str, str]:
+        version = self._index_version()
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._version = version
+
+        # Uploaded session files change retrieval too, so they are part of the scope
+        scope = _sha(
+            state.get("bom") or "",
+            state.get("description") or "",
+            hash_documents(state.get("session_docs") or []),
+            version,
+        )
+        key = _sha(normalize_question(state["question"]), scope)
+        return key, scope
+
+    @property
+    def embeddings(self) -> Embeddings:
+        # Only semantic mode embeds questions: the default embedder is created on first use
+        if self._embeddings is None:
+            self._embeddings = get_embeddings()
+        return self._embeddings
+
+    def _question_vector(self, question: str) -> np.ndarray:
+        vec = np.asarray(self.embeddings.embed_query(normalize_question(question)), dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def lookup(self, state: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], str]:
+        """Returns (cached final state or None, HIT / SEMANTIC_HIT / MISS)."""
+        key, scope = self._keys(state)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.result, HIT
+            if entry is not None:
+                del self._entries[key]
+
+            candidates = [
+                (k, e)
+                for k, e in self._entries.items()
+                if self.semantic and e.scope == scope and e.vector is not None
+                and now - e.created <= self.ttl
+            ]
+
+        if candidates:
+            vec = self._question_vector(state["question"])
+            sims = np.stack([e.vector for _, e in candidates]) @ vec
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold:
+                best_key, best_entry = candidates[best]
+                with self._lock:
+                    if best_key in self._entries:
+                        self._entries.move_to_end(best_key)
+                    self.semantic_hits += 1
+                return best_entry.result, SEMANTIC_HIT
+
+        with self._lock:
+            self.misses += 1
+        return None, MISS
+
+    def store(self, state: Dict[str, Any], result: Dict[str, Any]) -> None:
+        if not result.get("generation"):
+            return
+        key, scope = self._keys(state)
+        vector = self._question_vector(state["question"]) if self.semantic else None
+        cached = {
+            "generation": result["generation"],
+            "documents": list(result.get("documents") or []),
+        }
+
+        with self._lock:
+            self._entries[key] = _Entry(cached, scope, time.time(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+def invoke_cached(app, state: Dict[str, Any], cache: Optional[AnswerCache] = None) -> Dict[str, Any]:
+    """`app.invoke` behind the answer cache. Hits are logged with their marker."""
+    cache = cache if cache is not None else answer_cache
+    cached, status = cache.lookup(state)
+    if cached is not None:
+        log_interaction(state["question"], cached["documents"], cached["generation"], cache=status)
+        return {**state, **cached, "cache_status": status}
+
+    result = app.invoke({**state, "cache_status": MISS})
+    cache.store(state, result)
+    return result
+
+
+async def ainvoke_cached(app, state: Dict[str, Any], cache: Optional[AnswerCache] = None) -> Dict[str, Any]:
+    """Async version of `invoke_cached`."""
+    cache = cache if cache is not None else answer_cache
+    cached, status = cache.lookup(state)
+    if cached is not None:
+        log_interaction(state["question"], cached["documents"], cached["generation"], cache=status)
+        return {**state, **cached, "cache_status": status}
+
+    result = await app.ainvoke({**state, "cache_status": MISS})
+    cache.store(state, result)
+    return result
+
+
+answer_cache = AnswerCache()
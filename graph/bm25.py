@@ -0,0 +1,139 @@
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+# Standard Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Documents read per call when loading a collection
+_PAGE_SIZE = 1000
+
+# Words, keeping codes such as "EN-10025-2", "S355JR" or "1.4301" in one piece
+_TOKEN = re.compile(r"\w+(?:[-./]\w+)*", re.UNICODE)
+_PARTS = re.compile(r"[-./]")
+_HAS_DIGIT = re.compile(r"\d")
+_COMBINING = re.compile(r"[\u0300-\u036f]")
+
+
+def _fold(text: str) -> str:
+    # Lowercase and drop accents: "Acústico" and "acustico" are the same term
+    text = text.lower()
+    if text.isascii():
+        return text
+    return _COMBINING.sub("", unicodedata.normalize("NFKD", text))
+
+
+def tokenize(text: str) -> List[str]:
+    """Terms of a text. Compound codes are indexed whole and then by their parts."""
+    tokens = _TOKEN.findall(_fold(text))
+    for compound in [t for t in tokens if not t.isalnum()]:
+        parts = [p for p in _PARTS.split(compound) if p]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def is_identifier_query(query: str, max_terms: int = 4) -> bool:
+    """
+    Short queries made of part numbers, standard codes or material grades
+    ("S355JR", "UNE-EN 1090-2", "ISO 14001"): words with digits in them, where
+    lexical matching is exact and embeddings add nothing.
+    """
+    words = _TOKEN.findall(_fold(query))
+    return 0 < len(words) <= max_terms and any(_HAS_DIGIT.search(w) for w in words)
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of documents.
+
+    Postings are stored CSR-style in flat NumPy arrays: the postings of term
+    t are `doc_ids[indptr[t]:indptr[t + 1]]` with their term frequencies and
+    the precomputed length normalisation of each (term, document) pair, so a
+    query is scored with a few vectorized operations per query term.
+    """
+
+    def __init__(self, documents: List[Document], k1: float = BM25_K1, b: float = BM25_B):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_len = np.zeros(len(documents), dtype=np.int64)
+        for i, doc in enumerate(documents):
+            tokens = tokenize(doc.page_content)
+            doc_len[i] = len(tokens)
+            term_ids.extend([vocab.setdefault(t, len(vocab)) for t in tokens])
+        self.vocab = vocab
+
+        # One (term, document) pair per posting, sorted by term then document
+        n_docs, n_terms = len(documents), len(vocab)
+        stride = max(n_docs, 1)
+        terms = np.asarray(term_ids, dtype=np.int64)
+        docs = np.repeat(np.arange(n_docs, dtype=np.int64), doc_len)
+        pairs, tf = np.unique(terms * stride + docs, return_counts=True)
+
+        self.doc_ids = (pairs % stride).astype(np.int32)
+        self.tfs = tf.astype(np.float32)
+        self.indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs // stride, minlength=n_terms), out=self.indptr[1:])
+
+        df = np.diff(self.indptr).astype(np.float32)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        avgdl = float(doc_len.mean()) if n_docs else 0.0
+        lengths = doc_len[self.doc_ids] / avgdl if avgdl else np.ones_like(self.tfs)
+        self.norm = (k1 * (1.0 - b + b * lengths)).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @classmethod
+    def from_vectorstore(cls, store: VectorStore, **kwargs) -> "BM25Index":
+        """Index every chunk of a Chroma collection (texts and metadata, no vectors)."""
+        documents = []
+        offset = 0
+        while True:
+            page = store.get(include=["documents", "metadatas"], limit=_PAGE_SIZE, offset=offset)
+            for text, metadata in zip(page["documents"], page["metadatas"]):
+                documents.append(Document(page_content=text, metadata=metadata or {}))
+            if len(page["ids"]) < _PAGE_SIZE:
+                break
+            offset += _PAGE_SIZE
+        return cls(documents, **kwargs)
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for term, qtf in Counter(tokenize(query)).items():
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            start, end = self.indptr[t], self.indptr[t + 1]
+            tf = self.tfs[start:end]
+            # Postings of one term have distinct documents: plain fancy-index add
+            scores[self.doc_ids[start:end]] += (
+                qtf * self.idf[t] * tf * (self.k1 + 1.0) / (tf + self.norm[start:end])
+            )
+        return scores
+
+    def search_with_scores(self, query: str, k: int = 6) -> List[Tuple[Document, float]]:
+        if k <= 0:
+            return []
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        # Best first; ties keep collection order
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        return [(self.documents[i], float(scores[i])) for i in hits]
+
+    def search(self, query: str, k: int = 6) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query, k)]
+
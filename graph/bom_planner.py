@@ -0,0 +1,179 @@
+import asyncio
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from graph.fusion import reciprocal_rank_fusion
+
+# Upper bound on component queries per BOM (one embedding each)
+MAX_BOM_QUERIES = 48
+# Hits kept per component query before fusion
+BOM_PER_QUERY_K = 2
+# Documents kept after fusing all component queries
+BOM_TOP_K = 8
+
+# Header names (lowercase substrings) used to group rows, by priority
+MATERIAL_COLUMNS = ("material", "materia prima", "acabado", "finish")
+COMPONENT_COLUMNS = (
+    "componente", "component", "descrip", "pieza", "part", "item", "nombre", "name",
+)
+
+_SEPARATOR_CELL = re.compile(r"^:?-{3,}:?$")
+_EMPTY_VALUES = {"", "nan", "none", "null", "-"}
+
+# Vector searches of one request run in parallel here (BOM queries, pooled MMR)
+search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bom-search")
+
+
+def parse_bom_table(bom_text: str) -> Tuple[List[str], List[List[str]]]:
+    """
+    Parse the markdown-like BOM table built by app.py (or DataFrame.to_markdown).
+    Returns (headers, rows); both are empty if the text is not a table.
+    """
+    lines = [l.strip() for l in bom_text.splitlines() if l.strip().startswith("|")]
+    table = []
+    for line in lines:
+        cells = [c.strip() for c in line.strip("|").split("|")]
+        if all(_SEPARATOR_CELL.match(c) for c in cells if c):
+            continue
+        table.append(cells)
+
+    if len(table) < 2:
+        return [], []
+    return table[0], table[1:]
+
+
+def _find_column(headers: List[str], candidates) -> int:
+    lowered = [h.lower() for h in headers]
+    for candidate in candidates:
+        for i, h in enumerate(lowered):
+            if candidate in h:
+                return i
+    return -1
+
+
+def _value(row: List[str], i: int) -> str:
+    if i < 0 or i >= len(row):
+        return ""
+    v = row[i].strip()
+    return "" if v.lower() in _EMPTY_VALUES else v
+
+
+def plan_bom_queries(bom_text: str, max_queries: int = MAX_BOM_QUERIES) -> List[str]:
+    """
+    Turn a BOM into short per-material / per-component queries.
+
+    Rows are grouped by their material column ("acero: bastidor, eje, ...");
+    rows without a material become one query per component. If no known
+    column is found every row becomes a query. Text that is not a table is
+    returned as a single query (the previous behaviour).
+    """
+    if not bom_text.strip():
+        return []
+
+    headers, rows = parse_bom_table(bom_text)
+    if not rows:
+        return [bom_text]
+
+    material_col = _find_column(headers, MATERIAL_COLUMNS)
+    component_col = _find_column(headers, COMPONENT_COLUMNS)
+
+    groups: "OrderedDict[str, List[str]]" = OrderedDict()
+    for row in rows:
+        material = _value(row, material_col)
+        component = _value(row, component_col)
+
+        if material_col < 0 and component_col < 0:
+            text = " ".join(v for v in (_value(row, i) for i in range(len(row))) if v)
+            if text:
+                groups.setdefault(text, [])
+            continue
+
+        if material:
+            members = groups.setdefault(material, [])
+            if component and component not in members:
+                members.append(component)
+        elif component:
+            groups.setdefault(component, [])
+
+    # Materials shared by many components first, in case we must cut
+    ranked = sorted(groups.items(), key=lambda kv: len(kv[1]), reverse=True)
+    queries = []
+    for head, members in ranked[:max_queries]:
+        queries.append(f"{head}: {', '.join(members[:3])}" if members else head)
+    return queries
+
+
+def summarize_bom(bom_text: str, max_components: int = 6) -> str:
+    """
+    Compact version of a BOM for prompts that cannot take the whole table:
+    one line per material with its row count and first components. Text
+    without a table or a material column is returned unchanged.
+    """
+    headers, rows = parse_bom_table(bom_text)
+    material_col = _find_column(headers, MATERIAL_COLUMNS)
+    if not rows or material_col < 0:
+        return bom_text
+    component_col = _find_column(headers, COMPONENT_COLUMNS)
+
+    groups: "OrderedDict[str, List[str]]" = OrderedDict()
+    for row in rows:
+        material = _value(row, material_col) or "(sin material)"
+        groups.setdefault(material, []).append(_value(row, component_col))
+
+    lines = [f"BOM summary: {len(rows)} rows grouped by {headers[material_col]}"]
+    for material, components in sorted(groups.items(), key=lambda kv: len(kv[1]), reverse=True):
+        names = list(dict.fromkeys(c for c in components if c))
+        more = ", ..." if len(names) > max_components else ""
+        listed = f": {', '.join(names[:max_components])}{more}" if names else ""
+        lines.append(f"- {material} ({len(components)} rows){listed}")
+    return "\n".join(lines)
+
+
+def retrieve_for_bom(
+    bom_text: str,
+    vectorstore: VectorStore,
+    embeddings: Embeddings,
+    per_query_k: int = BOM_PER_QUERY_K,
+    top_k: int = BOM_TOP_K,
+) -> List[Document]:
+    """
+    Retrieve documents for a BOM with one query per component group.
+    All queries are embedded in one batch, searched in parallel and fused
+    with reciprocal rank fusion.
+    """
+    queries = plan_bom_queries(bom_text)
+    if not queries:
+        return []
+
+    vectors = embeddings.embed_documents(queries)
+    rankings = list(
+        search_pool.map(
+            lambda v: vectorstore.similarity_search_by_vector(v, k=per_query_k), vectors
+        )
+    )
+    return reciprocal_rank_fusion(rankings, top_k=top_k)
+
+
+async def aretrieve_for_bom(
+    bom_text: str,
+    vectorstore: VectorStore,
+    embeddings: Embeddings,
+    per_query_k: int = BOM_PER_QUERY_K,
+    top_k: int = BOM_TOP_K,
+) -> List[Document]:
+    """Async version of `retrieve_for_bom`."""
+    queries = plan_bom_queries(bom_text)
+    if not queries:
+        return []
+
+    vectors = await embeddings.aembed_documents(queries)
+    rankings = await asyncio.gather(
+        *(vectorstore.asimilarity_search_by_vector(v, k=per_query_k) for v in vectors)
+    )
+    return reciprocal_rank_fusion(rankings, top_k=top_k)
@@ -1,7 +1,10 @@
+from functools import lru_cache
+
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from langchain_core.runnables import RunnableSequence
-from langchain_openai import ChatOpenAI
+
+from graph.llm import get_llm
 
 
 class GradeAnswer(BaseModel):
@@ -11,9 +14,6 @@ class GradeAnswer(BaseModel):
     )
 
 
-llm = ChatOpenAI(model="gpt-4.1", temperature=0)
-structured_llm_grader = llm.with_structured_output(GradeAnswer)
-
 system = """You are a grader assessing whether an answer addresses / resolves a question \n 
      Give a binary score 'yes' or 'no'. Yes' means that the answer resolves the question."""
 answer_prompt = ChatPromptTemplate.from_messages(
@@ -23,4 +23,14 @@ answer_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-answer_grader: RunnableSequence = answer_prompt | structured_llm_grader
\ No newline at end of file
+
+
+@lru_cache(maxsize=None)
+def get_answer_grader() -> RunnableSequence:
+    return answer_prompt | get_llm().with_structured_output(GradeAnswer)
+
+
+def __getattr__(name):
+    if name == "answer_grader":
+        return get_answer_grader()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
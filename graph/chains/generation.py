@@ -1,8 +1,14 @@
+from functools import lru_cache
+
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import Runnable
+
+from graph.llm import get_llm
+from graph.rate_limiter import GENERATION_LANE
 
-llm = ChatOpenAI(model="gpt-4.1", temperature=0)
+# Run name / tag used to pick the generation tokens out of the graph event stream
+GENERATION_RUN_NAME = "generation"
 
 prompt = PromptTemplate(
     input_variables=["context", "question"],
@@ -93,4 +99,15 @@ El campo "answer" debe contener únicamente una explicación narrativa breve.
 """
 )
 
-generation_chain = prompt | llm | StrOutputParser()
\ No newline at end of file
+
+@lru_cache(maxsize=None)
+def get_generation_chain() -> Runnable:
+    return (prompt | get_llm(lane=GENERATION_LANE) | StrOutputParser()).with_config(
+        run_name=GENERATION_RUN_NAME, tags=[GENERATION_RUN_NAME]
+    )
+
+
+def __getattr__(name):
+    if name == "generation_chain":
+        return get_generation_chain()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,9 +1,10 @@
+from functools import lru_cache
+
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableSequence
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
-
-llm = ChatOpenAI(model="gpt-4.1", temperature=0)
 
+from graph.llm import get_llm
 
 
 class GradeDocuments(BaseModel):
@@ -13,8 +14,6 @@ class GradeDocuments(BaseModel):
         description="Documents are relevant to the question, 'yes' or 'no'."
     )
 
-structured_llm_grader = llm.with_structured_output(GradeDocuments)
-
 system = """You are a grader assessing relevance of a retrieved document to a user question. \n 
     If the document contains keyword(s) or semantic meaning related to the question, grade it as relevant. \n
     Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question."""
@@ -25,4 +24,16 @@ grade_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-retrieval_grader = grade_prompt | structured_llm_grader
\ No newline at end of file
+
+
+@lru_cache(maxsize=None)
+def get_retrieval_grader() -> RunnableSequence:
+    return grade_prompt | get_llm().with_structured_output(GradeDocuments)
+
+
+def __getattr__(name):
+    # `from graph.chains.retrieval_grader import retrieval_grader` still works,
+    # but only builds the chain when it is actually imported
+    if name == "retrieval_grader":
+        return get_retrieval_grader()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
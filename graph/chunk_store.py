@@ -0,0 +1,72 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+# SQLite limits the number of "?" parameters per statement
+_CHUNK = 500
+
+
+def chunk_hash(text: str) -> str:
+    """Content address of a chunk: the same text always gets the same ID."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def chunk_store_path(log_path: Union[str, Path]) -> Path:
+    """Chunk store that belongs to a log file: rag_logs.jsonl -> rag_logs.chunks.sqlite."""
+    log_path = Path(log_path)
+    return log_path.with_name(f"{log_path.stem}.chunks.sqlite")
+
+
+class ChunkStore:
+    """
+    Deduplicated chunk texts referenced by the `context_ids` of the
+    interaction logs. Append-only (chunks are never evicted, since old log
+    records point at them); SQLite in WAL mode so every worker process can
+    write to it.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, content TEXT NOT NULL)"
+            )
+
+    def put_many(self, texts: Iterable[Optional[str]]) -> list:
+        """Store the texts (None is kept as a None ID) and return their IDs, in order."""
+        texts = list(texts)
+        ids = [chunk_hash(t) if t is not None else None for t in texts]
+        rows = {i: t for i, t in zip(ids, texts) if i is not None}
+        if rows:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO chunks (id, content) VALUES (?, ?)", rows.items()
+                )
+        return ids
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, str]:
+        ids = list(dict.fromkeys(i for i in ids if i is not None))
+        found: Dict[str, str] = {}
+        with self._lock:
+            for start in range(0, len(ids), _CHUNK):
+                chunk = ids[start : start + _CHUNK]
+                marks = ",".join("?" * len(chunk))
+                found.update(
+                    self._conn.execute(
+                        f"SELECT id, content FROM chunks WHERE id IN ({marks})", chunk
+                    ).fetchall()
+                )
+        return found
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
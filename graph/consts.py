@@ -1,3 +1,4 @@
 RETRIEVE = "retrieve"
 GENERATE = "generate"
-GRADE_DOCUMENTS = "grade_documents"
\ No newline at end of file
+GRADE_DOCUMENTS = "grade_documents"
+GRADE_GENERATION = "grade_generation"
\ No newline at end of file
@@ -0,0 +1,157 @@
+import logging
+import math
+import os
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from langchain_core.documents import Document
+
+from graph.bom_planner import summarize_bom
+from graph.llm import LLM_MODEL
+
+# Prompt tokens for the whole context (description + BOM + retrieved chunks)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "12000"))
+# Upper bounds for the description and BOM sections; what they leave unused goes to the chunks
+DESCRIPTION_TOKEN_QUOTA = int(os.getenv("DESCRIPTION_TOKEN_QUOTA", "1500"))
+BOM_TOKEN_QUOTA = int(os.getenv("BOM_TOKEN_QUOTA", "3000"))
+
+# Encoding used when tiktoken has no mapping for LLM_MODEL
+DEFAULT_ENCODING = "o200k_base"
+TRUNCATION_MARK = "\n[...]"
+
+logger = logging.getLogger(__name__)
+
+DESCRIPTION_HEADER = "=== Project Description ===\n"
+BOM_HEADER = "\n\n=== BOM ===\n"
+DOCUMENTS_HEADER = "\n\n=== Retrieved Documents ===\n"
+DOCUMENT_SEPARATOR = "\n\n"
+
+
+class TokenCounter:
+    """
+    Token counts with tiktoken. Without an encoding (tiktoken could not
+    download its BPE file, e.g. offline) it falls back to ~4 characters
+    per token, which is close enough for budgeting.
+    """
+
+    def __init__(self, encoding=None):
+        self.encoding = encoding
+
+    def count(self, text: str) -> int:
+        if self.encoding is None:
+            return math.ceil(len(text) / 4)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """First `max_tokens` tokens of `text`, marked with TRUNCATION_MARK if cut."""
+        if self.count(text) <= max_tokens:
+            return text
+        keep = max(0, max_tokens - self.count(TRUNCATION_MARK))
+        if self.encoding is None:
+            head = text[: keep * 4]
+        else:
+            head = self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:keep])
+        return head + TRUNCATION_MARK
+
+
+@lru_cache(maxsize=1)
+def get_token_counter() -> TokenCounter:
+    import tiktoken
+
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(LLM_MODEL)
+        except KeyError:
+            encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        logger.warning("[ContextPacker] tiktoken unavailable (%s); estimating tokens from length", e)
+        encoding = None
+    return TokenCounter(encoding)
+
+
+class PackedContext(NamedTuple):
+    text: str
+    # Chunks that made it into the context, most relevant first
+    documents: List[Document]
+    # Tokens per section: description, bom, documents, overhead (headers), total
+    tokens: Dict[str, int]
+    # Chunks left out for lack of budget
+    dropped: int
+    # Scores of `documents`, in the same order (None when packed without scores)
+    scores: Optional[List[Optional[float]]] = None
+
+
+def format_document(doc: Document) -> str:
+    src = doc.metadata.get("source", "desconocido")
+    page = doc.metadata.get("page", "N/A")
+    return f"[SOURCE: {src} | PAGE: {page}]\n{doc.page_content}"
+
+
+def _pack_bom(bom: str, quota: int, counter: TokenCounter) -> str:
+    # Whole table if it fits, else one line per material, else a cut of that
+    if counter.count(bom) <= quota:
+        return bom
+    return counter.truncate(summarize_bom(bom), quota)
+
+
+def pack_context(
+    description: str,
+    bom: str,
+    documents: Sequence[Document],
+    scores: Optional[Sequence[Optional[float]]] = None,
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    description_quota: int = DESCRIPTION_TOKEN_QUOTA,
+    bom_quota: int = BOM_TOKEN_QUOTA,
+    counter: Optional[TokenCounter] = None,
+) -> PackedContext:
+    """
+    Build the generation context within `budget` tokens.
+
+    The description is cut to its quota and the BOM summarized (then cut)
+    to its own; the remaining budget is filled with whole chunks, best
+    `scores` first (retrieval order when there are no scores). A chunk that
+    does not fit is skipped and smaller ones after it may still go in.
+    """
+    counter = counter or get_token_counter()
+
+    overhead = counter.count(DESCRIPTION_HEADER + BOM_HEADER + DOCUMENTS_HEADER)
+    description = counter.truncate(description, description_quota)
+    bom = _pack_bom(bom, bom_quota, counter)
+    tokens = {
+        "description": counter.count(description),
+        "bom": counter.count(bom),
+        "documents": 0,
+        "overhead": overhead,
+    }
+
+    order = list(range(len(documents)))
+    if scores is not None:
+        # Stable: equal or missing scores keep retrieval order
+        order.sort(key=lambda i: -(scores[i] if scores[i] is not None else -math.inf))
+
+    remaining = budget - overhead - tokens["description"] - tokens["bom"]
+    separator = counter.count(DOCUMENT_SEPARATOR)
+    kept, kept_scores, texts = [], [], []
+    for i in order:
+        text = format_document(documents[i])
+        cost = counter.count(text) + (separator if texts else 0)
+        if cost > remaining:
+            continue
+        remaining -= cost
+        tokens["documents"] += cost
+        kept.append(documents[i])
+        kept_scores.append(scores[i] if scores is not None else None)
+        texts.append(text)
+
+    tokens["total"] = sum(tokens.values())
+    text = (
+        DESCRIPTION_HEADER
+        + description
+        + BOM_HEADER
+        + bom
+        + DOCUMENTS_HEADER
+        + DOCUMENT_SEPARATOR.join(texts)
+    )
+    return PackedContext(
+        text, kept, tokens, len(documents) - len(kept), kept_scores if scores is not None else None
+    )
@@ -0,0 +1,140 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+# SQLite limits the number of "?" parameters per statement
+_CHUNK = 500
+
+
+def _chunks(items: List, size: int = _CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+class DiskCache:
+    """
+    Persistent key -> bytes store on SQLite with LRU eviction.
+
+    Several caches can share one database file by using different tables.
+    `version` describes whatever the cached values depend on (a prompt, a
+    model name...): when it changes, the table is emptied on open.
+    SQLite in WAL mode makes the file safe to share between processes.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        table: str = "cache",
+        max_entries: int = 100_000,
+        version: str = "",
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.table = table
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_last_used ON {table} (last_used)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, version TEXT)"
+            )
+            row = self._conn.execute(
+                "SELECT version FROM cache_meta WHERE name = ?", (table,)
+            ).fetchone()
+            if row is None or row[0] != version:
+                self._conn.execute(f"DELETE FROM {table}")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache_meta (name, version) VALUES (?, ?)",
+                    (table, version),
+                )
+        self._size = self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, bytes] = {}
+        with self._lock, self._conn:
+            for chunk in _chunks(keys):
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({marks})", chunk
+                ).fetchall()
+                found.update(rows)
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE {self.table} SET last_used = ? WHERE key IN "
+                        f"({','.join('?' * len(rows))})",
+                        [time.time()] + [k for k, _ in rows],
+                    )
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, value: bytes) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO {self.table} (key, value, last_used) VALUES (?, ?, ?)",
+                [(k, v, now) for k, v in items.items()],
+            )
+            self._size += self._conn.total_changes - before
+            # Existing keys (written by another process meanwhile) get the new value
+            self._conn.executemany(
+                f"UPDATE {self.table} SET value = ?, last_used = ? WHERE key = ?",
+                [(v, now, k) for k, v in items.items()],
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        excess = self._size - self.max_entries
+        if excess <= 0:
+            return
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN ("
+            f"SELECT key FROM {self.table} ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        self.evictions += excess
+        self._size = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,110 @@
+import hashlib
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from graph.disk_cache import DiskCache
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_CACHE_PATH = Path(os.getenv("EMBEDDING_CACHE_PATH", "./.cache/embeddings.sqlite"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# Texts sent to the underlying embedder per request
+EMBEDDING_BATCH_SIZE = 256
+
+
+def _model_name(embeddings: Embeddings) -> str:
+    for attr in ("model", "model_name"):
+        value = getattr(embeddings, attr, None)
+        if isinstance(value, str):
+            return value
+    return type(embeddings).__name__
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper backed by a persistent content-addressed cache.
+
+    Vectors are stored as float32 blobs keyed by (model, sha256(text)), so
+    the same BOM, question or chunk is only embedded once across requests,
+    sessions and ingestion runs. Misses are sent to the wrapped embedder in
+    batches. Works with any `Embeddings` implementation.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        cache: Optional[DiskCache] = None,
+        model: Optional[str] = None,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+    ):
+        self.underlying = underlying
+        self.model = model or _model_name(underlying)
+        if cache is None:
+            cache = DiskCache(
+                EMBEDDING_CACHE_PATH,
+                table="embeddings",
+                max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+            )
+        self.cache = cache
+        self.batch_size = batch_size
+
+    def _key(self, text: str, kind: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model}:{kind}:{digest}"
+
+    @staticmethod
+    def _encode(vector: List[float]) -> bytes:
+        return np.asarray(vector, dtype=np.float32).tobytes()
+
+    @staticmethod
+    def _decode(blob: bytes) -> List[float]:
+        return np.frombuffer(blob, dtype=np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(t, "doc") for t in texts]
+        found = self.cache.get_many(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+
+        missing_keys = list(missing)
+        for i in range(0, len(missing_keys), self.batch_size):
+            batch = missing_keys[i : i + self.batch_size]
+            vectors = self.underlying.embed_documents([missing[k] for k in batch])
+            blobs = {k: self._encode(v) for k, v in zip(batch, vectors)}
+            self.cache.set_many(blobs)
+            found.update(blobs)
+
+        return [self._decode(found[k]) for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text, "query")
+        blob = self.cache.get(key)
+        if blob is None:
+            blob = self._encode(self.underlying.embed_query(text))
+            self.cache.set(key, blob)
+        return self._decode(blob)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"model": self.model, **self.cache.stats()}
+
+
+@lru_cache(maxsize=None)
+def get_embeddings() -> CachedEmbeddings:
+    """Shared cached OpenAI embedder, created on first use."""
+    from langchain_openai import OpenAIEmbeddings
+
+    return CachedEmbeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL))
+
+
+def __getattr__(name):
+    if name == "embeddings":
+        return get_embeddings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,32 @@
+from typing import Callable, Dict, Hashable, List, Optional
+
+from langchain_core.documents import Document
+
+# Standard RRF damping constant (Cormack et al.)
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[Document]],
+    k: int = RRF_K,
+    top_k: Optional[int] = None,
+    key: Callable[[Document], Hashable] = lambda d: d.page_content,
+) -> List[Document]:
+    """
+    Fuse several ranked lists into one: every document scores
+    sum(1 / (k + rank)) over the lists it appears in.
+    Ties keep the order in which documents were first seen.
+    """
+    scores: Dict[Hashable, float] = {}
+    docs: Dict[Hashable, Document] = {}
+
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, 1):
+            doc_key = key(doc)
+            docs.setdefault(doc_key, doc)
+            scores[doc_key] = scores.get(doc_key, 0.0) + 1.0 / (k + rank)
+
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    if top_k is not None:
+        ordered = ordered[:top_k]
+    return [docs[doc_key] for doc_key in ordered]
@@ -0,0 +1,163 @@
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# Skip the grader outside the calibrated uncertain band (needs the thresholds file)
+GRADER_PREFILTER = os.getenv("GRADER_PREFILTER", "1") != "0"
+# Log question/chunk similarities even when not prefiltering, to collect
+# calibration data (calibrate_grader.py)
+GRADER_LOG_SIMILARITIES = os.getenv("GRADER_LOG_SIMILARITIES", "0") != "0"
+# Written by calibrate_grader.py; without it every chunk still goes to the grader
+GRADER_THRESHOLDS_PATH = Path(os.getenv("GRADER_THRESHOLDS_PATH", "grader_thresholds.json"))
+# Share of requests whose prefiltered chunks are graded anyway, to measure agreement
+GRADER_PREFILTER_AUDIT_RATE = float(os.getenv("GRADER_PREFILTER_AUDIT_RATE", "0.05"))
+
+# Calibration: verdict precision required on each side and minimum chunks per side
+CALIBRATION_PRECISION = 0.98
+CALIBRATION_MIN_SUPPORT = 20
+
+# How a verdict was reached, as logged in the "grades" field
+BY_GRADER = "llm"
+BY_CACHE = "cache"
+ACCEPTED = "accept"
+REJECTED = "reject"
+
+
+class Thresholds(NamedTuple):
+    """Cosine bounds of the uncertain band; None disables that side."""
+
+    lower: Optional[float]
+    upper: Optional[float]
+
+    def tier(self, similarity: float) -> Optional[str]:
+        if self.upper is not None and similarity >= self.upper:
+            return ACCEPTED
+        if self.lower is not None and similarity < self.lower:
+            return REJECTED
+        return None
+
+
+def load_thresholds(path=GRADER_THRESHOLDS_PATH) -> Optional[Thresholds]:
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return Thresholds(data.get("lower"), data.get("upper"))
+
+
+@lru_cache(maxsize=1)
+def get_thresholds() -> Optional[Thresholds]:
+    """Calibrated thresholds, read once per process (restart after recalibrating)."""
+    return load_thresholds()
+
+
+def _cosines(query_vector, doc_vectors) -> List[float]:
+    q = np.asarray(query_vector, dtype=np.float32)
+    docs = np.asarray(doc_vectors, dtype=np.float32).reshape(-1, len(q))
+    norms = np.linalg.norm(docs, axis=1) * (np.linalg.norm(q) or 1.0)
+    norms[norms == 0] = 1.0
+    return (docs @ q / norms).tolist()
+
+
+def similarities(question: str, documents: List[Document], embeddings: Embeddings) -> List[float]:
+    """
+    Cosine similarity of every chunk to the question. The retrieve node has
+    already embedded the question and ingestion the chunks, so with the
+    embedding cache this is a couple of SQLite lookups.
+    """
+    if not documents:
+        return []
+    return _cosines(
+        embeddings.embed_query(question),
+        embeddings.embed_documents([d.page_content for d in documents]),
+    )
+
+
+async def asimilarities(
+    question: str, documents: List[Document], embeddings: Embeddings
+) -> List[float]:
+    if not documents:
+        return []
+    return _cosines(
+        await embeddings.aembed_query(question),
+        await embeddings.aembed_documents([d.page_content for d in documents]),
+    )
+
+
+# --------------------------
+# Offline calibration
+# --------------------------
+
+
+def graded_pairs(records: Iterable[Dict[str, Any]]) -> List[Tuple[float, bool]]:
+    """
+    (similarity, relevant) for every grader call logged in the "grades"
+    field. Cached verdicts repeat an earlier call for the same chunk and
+    question, so they are left out rather than counted again.
+    """
+    pairs = []
+    for record in records:
+        for grade in record.get("grades") or []:
+            if grade.get("by") == BY_GRADER and grade.get("similarity") is not None:
+                pairs.append((float(grade["similarity"]), grade["verdict"] == "yes"))
+    return pairs
+
+
+def _deepest_cut(sims: np.ndarray, hits: np.ndarray, precision: float, min_support: int):
+    # Walk from the most extreme similarity inwards; keep the deepest
+    # prefix whose verdicts agree at least `precision` of the time
+    count = np.arange(1, len(sims) + 1)
+    ok = (count >= min_support) & (np.cumsum(hits) / count >= precision)
+    return int(np.flatnonzero(ok)[-1]) if ok.any() else None
+
+
+def calibrate(
+    pairs: List[Tuple[float, bool]],
+    precision: float = CALIBRATION_PRECISION,
+    min_support: int = CALIBRATION_MIN_SUPPORT,
+) -> Thresholds:
+    """
+    Widest accept/reject zones where the logged grader verdicts agree with
+    the zone at least `precision` of the time.
+    """
+    if not pairs:
+        return Thresholds(None, None)
+    sims = np.array([s for s, _ in pairs], dtype=np.float64)
+    relevant = np.array([r for _, r in pairs], dtype=bool)
+
+    order = np.argsort(-sims, kind="stable")
+    top = _deepest_cut(sims[order], relevant[order], precision, min_support)
+    upper = float(sims[order][top]) if top is not None else None
+
+    order = np.argsort(sims, kind="stable")
+    bottom = _deepest_cut(sims[order], ~relevant[order], precision, min_support)
+    # Strictly below the lower bound is rejected: step just past the cut
+    lower = float(np.nextafter(sims[order][bottom], np.inf)) if bottom is not None else None
+
+    if upper is not None and lower is not None and lower > upper:
+        return Thresholds(None, None)
+    return Thresholds(lower, upper)
+
+
+def evaluate(pairs: List[Tuple[float, bool]], thresholds: Thresholds) -> Dict[str, Any]:
+    """Grader calls saved and agreement with full grading on logged verdicts."""
+    skipped = agree = 0
+    for similarity, relevant in pairs:
+        tier = thresholds.tier(similarity)
+        if tier is None:
+            continue
+        skipped += 1
+        agree += (tier == ACCEPTED) == relevant
+    return {
+        "chunks": len(pairs),
+        "skipped": skipped,
+        "skipped_share": round(skipped / len(pairs), 4) if pairs else 0.0,
+        "agreement": round(agree / skipped, 4) if skipped else None,
+    }
@@ -1,76 +1,224 @@
+import argparse
+import asyncio
+import contextvars
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 from dotenv import load_dotenv
 
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import END, StateGraph
 
 
-from graph.chains.answer_grader import answer_grader
-from graph.chains.hallucination_grader import hallucination_grader
-from graph.consts import RETRIEVE, GRADE_DOCUMENTS, GENERATE
-from graph.nodes import generate, grade_documents, retrieve
+from graph.chains.answer_grader import get_answer_grader
+from graph.chains.hallucination_grader import get_hallucination_grader
+from graph.consts import RETRIEVE, GRADE_DOCUMENTS, GENERATE, GRADE_GENERATION
+from graph.nodes import (
+    agenerate,
+    agrade_documents,
+    aretrieve,
+    generate,
+    grade_documents,
+    retrieve,
+)
 from graph.state import GraphState
 from graph.logger import log_interaction
+from graph.tracing import RAG_TRACING, get_tracer
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+# Run the answer grader speculatively next to the hallucination grader
+PARALLEL_GENERATION_GRADING = os.getenv("PARALLEL_GENERATION_GRADING", "1") != "0"
+
+_grader_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="grader")
+
 
 def grade_generation_grounded_in_documents_and_question(state: GraphState) -> str:
-    print("---CHECK HALLUCINATIONS---")
+    logger.info("---CHECK HALLUCINATIONS---")
     question = state["question"]
     documents = state["documents"]
     generation = state["generation"]
-    log_interaction(question, documents, generation)
+    log_interaction(
+        question, documents, generation,
+        cache=state.get("cache_status"),
+        grades=state.get("grades"),
+        context_tokens=state.get("context_tokens"),
+    )
+    answer_grader = get_answer_grader()
+    hallucination_grader = get_hallucination_grader()
+
+    answer_future = None
+    if PARALLEL_GENERATION_GRADING:
+        # Both graders only read the current state, so start the answer
+        # grader now and drop its result if the generation is not grounded.
+        # copy_context carries the run config over, so the call is traced as part of this run
+        answer_future = _grader_pool.submit(
+            contextvars.copy_context().run,
+            answer_grader.invoke,
+            {"question": question, "generation": generation},
+        )
+
     score = hallucination_grader.invoke(
         {"documents": documents, "generation": generation}
     )
 
     if hallucination_grade := score.binary_score:
-        print("---DECISION: GENERATION IS GROUNDED IN DOCUMENTS---")
-        print("---GRADE GENERATION vs QUESTION---")
-        score = answer_grader.invoke({"question": question, "generation": generation})
+        logger.info("---DECISION: GENERATION IS GROUNDED IN DOCUMENTS---")
+        logger.info("---GRADE GENERATION vs QUESTION---")
+        if answer_future is not None:
+            score = answer_future.result()
+        else:
+            score = answer_grader.invoke({"question": question, "generation": generation})
         if answer_grade := score.binary_score:
-            print("---DECISION: GENERATION ADDRESSES QUESTION---")
+            logger.info("---DECISION: GENERATION ADDRESSES QUESTION---")
             return "useful"
         else:
-            print("---DECISION: GENERATION DOES NOT ADDRESS QUESTION---")
+            logger.info("---DECISION: GENERATION DOES NOT ADDRESS QUESTION---")
             return "not useful"
     else:
-        print("---DECISION: GENERATION IS NOT GROUNDED IN DOCUMENTS, RE-TRY---")
+        if answer_future is not None:
+            # Cancelled if still queued, otherwise its verdict is ignored
+            answer_future.cancel()
+        logger.info("---DECISION: GENERATION IS NOT GROUNDED IN DOCUMENTS, RE-TRY---")
         return "not supported"
 
 
+async def agrade_generation_grounded_in_documents_and_question(
+    state: GraphState,
+) -> str:
+    """Async version of the post-generation check, using `ainvoke` on the graders."""
+    logger.info("---CHECK HALLUCINATIONS (ASYNC)---")
+    question = state["question"]
+    documents = state["documents"]
+    generation = state["generation"]
+    log_interaction(
+        question, documents, generation,
+        cache=state.get("cache_status"),
+        grades=state.get("grades"),
+        context_tokens=state.get("context_tokens"),
+    )
+    answer_grader = get_answer_grader()
+    hallucination_grader = get_hallucination_grader()
+
+    answer_task = None
+    if PARALLEL_GENERATION_GRADING:
+        answer_task = asyncio.create_task(
+            answer_grader.ainvoke({"question": question, "generation": generation})
+        )
+
+    try:
+        score = await hallucination_grader.ainvoke(
+            {"documents": documents, "generation": generation}
+        )
+    except BaseException:
+        if answer_task is not None:
+            answer_task.cancel()
+        raise
+
+    if score.binary_score:
+        logger.info("---DECISION: GENERATION IS GROUNDED IN DOCUMENTS---")
+        logger.info("---GRADE GENERATION vs QUESTION---")
+        if answer_task is not None:
+            score = await answer_task
+        else:
+            score = await answer_grader.ainvoke(
+                {"question": question, "generation": generation}
+            )
+        if score.binary_score:
+            logger.info("---DECISION: GENERATION ADDRESSES QUESTION---")
+            return "useful"
+        else:
+            logger.info("---DECISION: GENERATION DOES NOT ADDRESS QUESTION---")
+            return "not useful"
+    else:
+        if answer_task is not None:
+            answer_task.cancel()
+        logger.info("---DECISION: GENERATION IS NOT GROUNDED IN DOCUMENTS, RE-TRY---")
+        return "not supported"
+
 
 def decide_to_generate(state):
-    print("---ASSESS GRADED DOCUMENTS---")
-    print("---DECISION: GENERATE---")
+    logger.info("---ASSESS GRADED DOCUMENTS---")
+    logger.info("---DECISION: GENERATE---")
     return GENERATE
 
 
-workflow = StateGraph(GraphState)
+def build_workflow() -> StateGraph:
+    workflow = StateGraph(GraphState)
 
-workflow.add_node(RETRIEVE, retrieve)
-workflow.add_node(GRADE_DOCUMENTS, grade_documents)
-workflow.add_node(GENERATE, generate)
+    # Each node has a sync and an async implementation: `app.invoke` runs the
+    # former, `app.ainvoke` / `app.astream` the latter.
+    workflow.add_node(RETRIEVE, RunnableLambda(retrieve, afunc=aretrieve))
+    workflow.add_node(
+        GRADE_DOCUMENTS, RunnableLambda(grade_documents, afunc=agrade_documents)
+    )
+    workflow.add_node(GENERATE, RunnableLambda(generate, afunc=agenerate))
 
-workflow.set_entry_point(RETRIEVE)
+    workflow.set_entry_point(RETRIEVE)
 
-workflow.add_edge(RETRIEVE, GRADE_DOCUMENTS)
-workflow.add_conditional_edges(
-    GRADE_DOCUMENTS,
-    decide_to_generate,
-    {
-        GENERATE: GENERATE,
-    },
-)
+    workflow.add_edge(RETRIEVE, GRADE_DOCUMENTS)
+    workflow.add_conditional_edges(
+        GRADE_DOCUMENTS,
+        decide_to_generate,
+        {
+            GENERATE: GENERATE,
+        },
+    )
 
-workflow.add_conditional_edges(
-    GENERATE,
-    grade_generation_grounded_in_documents_and_question,
-    {
-        "not supported": GENERATE,
-        "useful": END,
-    },
-)
-workflow.add_edge(GENERATE, END)
+    workflow.add_conditional_edges(
+        GENERATE,
+        RunnableLambda(
+            grade_generation_grounded_in_documents_and_question,
+            afunc=agrade_generation_grounded_in_documents_and_question,
+            name=GRADE_GENERATION,
+        ),
+        {
+            "not supported": GENERATE,
+            "useful": END,
+        },
+    )
+    workflow.add_edge(GENERATE, END)
+
+    return workflow
+
+
+@lru_cache(maxsize=None)
+def get_app():
+    """
+    The compiled graph, built on first use. Nodes only create their LLM,
+    embedding and Chroma clients when they first run. With RAG_TRACING every
+    run is recorded by the shared TraceRecorder (graph/tracing.py).
+    """
+    app = build_workflow().compile()
+    if RAG_TRACING:
+        app = app.with_config(callbacks=[get_tracer()])
+    return app
+
+
+def __getattr__(name):
+    # `from graph.graph import app` keeps working
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def render_diagram(output_file_path: str = "graph.png") -> None:
+    """Render the graph as PNG (uses the mermaid.ink web service)."""
+    get_app().get_graph().draw_mermaid_png(output_file_path=output_file_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the RAG graph diagram.")
+    parser.add_argument("--output", default="graph.png", help="PNG file (default: graph.png)")
+    args = parser.parse_args()
+
+    render_diagram(args.output)
+    print(f"Diagram written to {args.output}")
 
-app = workflow.compile()
 
-app.get_graph().draw_mermaid_png(output_file_path="graph.png")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import logging
+import os
+from typing import List, Optional, Sequence
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+from graph.bm25 import BM25Index, is_identifier_query
+from graph.bom_planner import BOM_TOP_K, plan_bom_queries
+from graph.fusion import reciprocal_rank_fusion
+from graph.mmr import amulti_query_mmr, multi_query_mmr
+
+# "hybrid" (dense + BM25 fused with RRF), "dense" (Chroma MMR only) or "lexical" (BM25 only)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# BM25 hits fused with the dense ones
+BM25_TOP_K = 6
+# Documents kept after fusion
+HYBRID_TOP_K = 8
+# Pooled search: documents kept for the question, plus BOM_TOP_K when there is a BOM
+POOLED_QUESTION_K = 6
+# Pooled search: slots kept for each session store (the user's uploads), so
+# the larger knowledge base cannot crowd them out
+SESSION_MIN_K = int(os.getenv("SESSION_MIN_K", "2"))
+
+logger = logging.getLogger(__name__)
+
+
+def _lexical(question: str, index: Optional[BM25Index], mode: str) -> List[Document]:
+    # No index is built for dense-only retrieval
+    if mode == "dense" or index is None:
+        return []
+    return index.search(question, k=BM25_TOP_K)
+
+
+def _lexical_only(question: str, lexical: List[Document], mode: str) -> bool:
+    # Identifier-like questions ("S355JR", "UNE-EN 1090-2") skip the embedding
+    # call, as long as BM25 found the identifier somewhere
+    if mode == "lexical":
+        return True
+    if lexical and is_identifier_query(question):
+        logger.info("---LEXICAL FAST PATH (IDENTIFIER QUERY)---")
+        return True
+    return False
+
+
+def hybrid_search(
+    question: str, retriever: BaseRetriever, index: Optional[BM25Index], mode: str = RETRIEVAL_MODE
+) -> List[Document]:
+    """
+    Dense retrieval from `retriever` fused with BM25 hits from `index`.
+    Terms the embeddings miss (material names, part numbers, standard
+    codes) still reach the grader through the lexical ranking.
+    """
+    lexical = _lexical(question, index, mode)
+    if _lexical_only(question, lexical, mode):
+        return lexical
+
+    dense = retriever.invoke(question)
+    if not lexical:
+        return dense
+    return reciprocal_rank_fusion([dense, lexical], top_k=HYBRID_TOP_K)
+
+
+async def ahybrid_search(
+    question: str, retriever: BaseRetriever, index: Optional[BM25Index], mode: str = RETRIEVAL_MODE
+) -> List[Document]:
+    """Async version of `hybrid_search` (BM25 scoring is a few ms of NumPy, done inline)."""
+    lexical = _lexical(question, index, mode)
+    if _lexical_only(question, lexical, mode):
+        return lexical
+
+    dense = await retriever.ainvoke(question)
+    if not lexical:
+        return dense
+    return reciprocal_rank_fusion([dense, lexical], top_k=HYBRID_TOP_K)
+
+
+def _pooled_budget(lexical_only: bool, bom_queries: List[str]) -> int:
+    return (0 if lexical_only else POOLED_QUESTION_K) + (BOM_TOP_K if bom_queries else 0)
+
+
+def _session_slots(stores: Sequence[VectorStore]) -> List[int]:
+    return [0] + [SESSION_MIN_K] * (len(stores) - 1)
+
+
+def _fuse_pooled(pooled: List[Document], lexical: List[Document], k: int) -> List[Document]:
+    if not lexical:
+        return pooled
+    return reciprocal_rank_fusion([pooled, lexical], top_k=max(k, HYBRID_TOP_K))
+
+
+def pooled_search(
+    question: str,
+    bom: str,
+    stores: Sequence[VectorStore],
+    embeddings: Embeddings,
+    index: Optional[BM25Index],
+    mode: str = RETRIEVAL_MODE,
+) -> List[Document]:
+    """
+    The question and the BOM component queries searched together: their
+    candidates in every store are pooled and diversified in one MMR pass
+    (graph.mmr), with the score threshold applied, then fused with BM25.
+    `stores[0]` is the knowledge base; each store after it (session uploads)
+    keeps at least SESSION_MIN_K of the slots when it has relevant chunks.
+    """
+    lexical = _lexical(question, index, mode)
+    lexical_only = _lexical_only(question, lexical, mode)
+    bom_queries = plan_bom_queries(bom)
+
+    vectors = [] if lexical_only else [embeddings.embed_query(question)]
+    if bom_queries:
+        vectors += embeddings.embed_documents(bom_queries)
+    k = _pooled_budget(lexical_only, bom_queries)
+    pooled = (
+        multi_query_mmr(stores, vectors, embeddings, k=k, min_per_store=_session_slots(stores))
+        if vectors
+        else []
+    )
+    return _fuse_pooled(pooled, lexical, k)
+
+
+async def apooled_search(
+    question: str,
+    bom: str,
+    stores: Sequence[VectorStore],
+    embeddings: Embeddings,
+    index: Optional[BM25Index],
+    mode: str = RETRIEVAL_MODE,
+) -> List[Document]:
+    """Async version of `pooled_search`."""
+    lexical = _lexical(question, index, mode)
+    lexical_only = _lexical_only(question, lexical, mode)
+    bom_queries = plan_bom_queries(bom)
+
+    vectors = [] if lexical_only else [await embeddings.aembed_query(question)]
+    if bom_queries:
+        vectors += await embeddings.aembed_documents(bom_queries)
+    k = _pooled_budget(lexical_only, bom_queries)
+    pooled = (
+        await amulti_query_mmr(stores, vectors, embeddings, k=k, min_per_store=_session_slots(stores))
+        if vectors
+        else []
+    )
+    return _fuse_pooled(pooled, lexical, k)
@@ -0,0 +1,188 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Parser states
+_START = "start"
+_KEY = "key"
+_IN_KEY = "in_key"
+_COLON = "colon"
+_VALUE = "value"
+_STRING = "string"
+_NESTED = "nested"
+_SCALAR = "scalar"
+_DONE = "done"
+
+_WS = " \t\r\n"
+
+Event = Tuple[str, str, Any]
+
+
+class IncrementalJSONParser:
+    """
+    Incremental parser for the JSON object produced by the generation chain.
+
+    Text is fed as it streams from the model. `feed` returns a list of events:
+
+    - ("delta", key, text): new decoded characters of a top-level string
+      member listed in `stream_keys` (by default only "answer").
+    - ("section", key, value): a top-level member has been fully received;
+      `value` is the parsed JSON value.
+
+    Anything before the first "{" (e.g. a ```json fence) is ignored, as is
+    anything after the closing "}".
+    """
+
+    def __init__(self, stream_keys: Iterable[str] = ("answer",)):
+        self.stream_keys = set(stream_keys)
+        self.result: Dict[str, Any] = {}
+        self.state = _START
+
+        self._key_raw = ""
+        self._key: Optional[str] = None
+        self._raw = ""  # raw JSON text of the current value
+        self._nesting = 0
+        self._in_string = False
+        self._escaped = False
+
+        # Escape sequence being decoded inside a streamed string
+        self._pending_escape = ""
+        self._high_surrogate = ""
+
+    @property
+    def done(self) -> bool:
+        return self.state == _DONE
+
+    def feed(self, chunk: str) -> List[Event]:
+        events: List[Event] = []
+        delta: List[str] = []
+
+        for c in chunk:
+            state = self.state
+
+            if state == _START:
+                if c == "{":
+                    self.state = _KEY
+
+            elif state == _KEY:
+                if c == '"':
+                    self._key_raw = ""
+                    self._escaped = False
+                    self.state = _IN_KEY
+                elif c == "}":
+                    self.state = _DONE
+
+            elif state == _IN_KEY:
+                if self._escaped:
+                    self._escaped = False
+                    self._key_raw += c
+                elif c == "\\":
+                    self._escaped = True
+                    self._key_raw += c
+                elif c == '"':
+                    self._key = json.loads('"' + self._key_raw + '"')
+                    self.state = _COLON
+                else:
+                    self._key_raw += c
+
+            elif state == _COLON:
+                if c == ":":
+                    self.state = _VALUE
+
+            elif state == _VALUE:
+                if c in _WS:
+                    continue
+                self._raw = c
+                if c == '"':
+                    self._escaped = False
+                    self._pending_escape = ""
+                    self._high_surrogate = ""
+                    self.state = _STRING
+                elif c in "{[":
+                    self._nesting = 1
+                    self._in_string = False
+                    self._escaped = False
+                    self.state = _NESTED
+                else:
+                    self.state = _SCALAR
+
+            elif state == _STRING:
+                self._raw += c
+                if self._escaped:
+                    self._escaped = False
+                    self._stream_escape(c, delta)
+                elif c == "\\":
+                    self._escaped = True
+                    self._stream_escape(c, delta)
+                elif self._pending_escape:
+                    # Remaining hex digits of a \uXXXX escape
+                    self._stream_escape(c, delta)
+                elif c == '"':
+                    self._flush_delta(delta, events)
+                    self._close_value(events)
+                else:
+                    if self._key in self.stream_keys:
+                        delta.append(c)
+
+            elif state == _NESTED:
+                self._raw += c
+                if self._in_string:
+                    if self._escaped:
+                        self._escaped = False
+                    elif c == "\\":
+                        self._escaped = True
+                    elif c == '"':
+                        self._in_string = False
+                elif c == '"':
+                    self._in_string = True
+                elif c in "{[":
+                    self._nesting += 1
+                elif c in "}]":
+                    self._nesting -= 1
+                    if self._nesting == 0:
+                        self._close_value(events)
+
+            elif state == _SCALAR:
+                if c == "," or c == "}" or c in _WS:
+                    self._close_value(events)
+                    if c == "}":
+                        self.state = _DONE
+                else:
+                    self._raw += c
+
+        self._flush_delta(delta, events)
+        return events
+
+    def _stream_escape(self, c: str, delta: List[str]) -> None:
+        if self._key not in self.stream_keys:
+            return
+
+        self._pending_escape += c
+        seq = self._pending_escape
+        if len(seq) < 2 or (seq[1] == "u" and len(seq) < 6):
+            return
+        self._pending_escape = ""
+
+        decoded = json.loads('"' + seq + '"')
+        if self._high_surrogate:
+            decoded = json.loads('"' + self._high_surrogate + seq + '"')
+            self._high_surrogate = ""
+        elif "\ud800" <= decoded <= "\udbff":
+            # Wait for the low surrogate to emit the full character
+            self._high_surrogate = seq
+            return
+        delta.append(decoded)
+
+    def _flush_delta(self, delta: List[str], events: List[Event]) -> None:
+        if delta:
+            events.append(("delta", self._key, "".join(delta)))
+            delta.clear()
+
+    def _close_value(self, events: List[Event]) -> None:
+        try:
+            value = json.loads(self._raw)
+        except json.JSONDecodeError:
+            value = self._raw
+        self.result[self._key] = value
+        events.append(("section", self._key, value))
+        self._raw = ""
+        self.state = _KEY
@@ -0,0 +1,81 @@
+import os
+from functools import lru_cache
+
+from graph.rate_limiter import GRADER_LANE
+
+# Chat model shared by the generation chain and the graders
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4.1")
+LLM_TEMPERATURE = 0.0
+# Admission control through the shared scheduler (graph/rate_limiter.py)
+LLM_RATE_LIMIT = os.getenv("LLM_RATE_LIMIT", "1") != "0"
+# HTTP connection pool shared by every client (kept alive between calls)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+
+
+def http_clients(scheduler, **kwargs):
+    """
+    Sync and async httpx clients (OpenAI SDK defaults plus `kwargs`) that
+    report every response to `scheduler`, including the SDK's own retries,
+    so a 429 pauses all lanes.
+    """
+    import openai
+
+    def on_response(response):
+        scheduler.observe_response(response.status_code, response.headers)
+
+    async def aon_response(response):
+        on_response(response)
+
+    return (
+        openai.DefaultHttpxClient(event_hooks={"response": [on_response]}, **kwargs),
+        openai.DefaultAsyncHttpxClient(event_hooks={"response": [aon_response]}, **kwargs),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_http_clients():
+    """The clients every chat model shares: one keep-alive pool each."""
+    import httpx
+
+    from graph.rate_limiter import get_scheduler
+
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+    )
+    return http_clients(get_scheduler(), limits=limits)
+
+
+@lru_cache(maxsize=None)
+def get_llm(model: str = LLM_MODEL, temperature: float = LLM_TEMPERATURE, lane: str = GRADER_LANE):
+    """
+    ChatOpenAI client, created on first use and shared by every chain asking
+    for the same model, temperature and lane. langchain_openai is only
+    imported here, so importing the graph package stays cheap and works offline.
+
+    All clients share the HTTP pool and the request/token buckets; `lane`
+    ("generation" or "grader") sets the priority of their calls.
+    """
+    from langchain_openai import ChatOpenAI
+
+    from graph.rate_limiter import TokenUsageDebit, get_scheduler
+
+    http_client, http_async_client = get_http_clients()
+    limits = {}
+    if LLM_RATE_LIMIT:
+        scheduler = get_scheduler()
+        limits = {
+            "rate_limiter": scheduler.limiter(lane),
+            "callbacks": [TokenUsageDebit(scheduler)],
+        }
+    # stream_usage: streamed generations report their tokens too (graph/tracing.py)
+    return ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        stream_usage=True,
+        http_client=http_client,
+        http_async_client=http_async_client,
+        **limits,
+    )
@@ -1,14 +1,309 @@
 # graph/logger.py
+import atexit
+import gzip
 import json
-from datetime import datetime
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from graph.chunk_store import ChunkStore, chunk_store_path
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
 
 LOG_PATH = Path("./rag_logs.jsonl")
 
+# Records waiting to be written; past this, LOG_FULL_POLICY applies
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# "drop": lose the record and count it; "block": wait for the writer
+LOG_FULL_POLICY = os.getenv("LOG_FULL_POLICY", "drop")
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "256"))
+# Max seconds a record waits for more records before its batch is written
+LOG_FLUSH_SECONDS = float(os.getenv("LOG_FLUSH_SECONDS", "0.5"))
+# The live file is rotated past this size (0 = no size limit) and on a new day (UTC)
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_ROTATE_DAILY = os.getenv("LOG_ROTATE_DAILY", "1") != "0"
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "1") != "0"
+# Log chunk IDs ("context_ids") pointing at a deduplicated chunk store
+# next to the log, instead of the full chunk texts ("contexts")
+LOG_CHUNK_STORE = os.getenv("LOG_CHUNK_STORE", "1") != "0"
+
+# Records resolved per chunk-store query when reading logs
+_RESOLVE_BATCH = 256
+
+logger = logging.getLogger(__name__)
+
+_FLUSH = object()
+_STOP = object()
+
+
+@contextmanager
+def log_lock(path: Path):
+    """Exclusive lock shared by every process writing to `path`."""
+    with open(path.with_name(path.name + ".lock"), "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _segment_pattern(path: Path) -> "re.Pattern":
+    return re.compile(
+        rf"^{re.escape(path.stem)}\.\d{{4}}-\d{{2}}-\d{{2}}\.\d+{re.escape(path.suffix)}(\.gz)?$"
+    )
+
+
+def _next_segment(path: Path, day: str) -> Path:
+    n = 1
+    while True:
+        target = path.with_name(f"{path.stem}.{day}.{n:03d}{path.suffix}")
+        if not target.exists() and not Path(f"{target}.gz").exists():
+            return target
+        n += 1
+
+
+def _compress(path: Path) -> None:
+    tmp = Path(f"{path}.gz.tmp")
+    with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp, f"{path}.gz")
+    path.unlink()
+
+
+def _replace_field(record: Dict[str, Any], old: str, new: str, value) -> Dict[str, Any]:
+    # Same key order as the original record
+    return {(new if k == old else k): (value if k == old else v) for k, v in record.items()}
+
+
+def compact_records(records: List[Dict[str, Any]], store: ChunkStore) -> List[Dict[str, Any]]:
+    """Move the `contexts` texts of the records into `store`, leaving `context_ids`."""
+    texts = [c for r in records if "contexts" in r for c in r["contexts"]]
+    ids = iter(store.put_many(texts))
+
+    compacted = []
+    for r in records:
+        if "contexts" not in r:
+            compacted.append(r)
+            continue
+        context_ids = [next(ids) for _ in r["contexts"]]
+        compacted.append(_replace_field(r, "contexts", "context_ids", context_ids))
+    return compacted
+
+
+def resolve_records(records: List[Dict[str, Any]], store: Optional[ChunkStore]) -> List[Dict[str, Any]]:
+    """Inverse of `compact_records`: replace `context_ids` by the chunk texts."""
+    if store is None:
+        return records
+    found = store.get_many(i for r in records for i in r.get("context_ids", ()))
+
+    resolved = []
+    for r in records:
+        if "context_ids" not in r:
+            resolved.append(r)
+            continue
+        contexts = [found.get(i) for i in r["context_ids"]]
+        resolved.append(_replace_field(r, "context_ids", "contexts", contexts))
+    return resolved
+
+
+class LogWriter:
+    """
+    Background JSONL writer.
+
+    `submit` only enqueues a record; a daemon thread serializes and writes them in
+    batches (up to `batch_size` lines, or whatever arrived within
+    `flush_interval` seconds) with one append per file. Every append and
+    rotation happens under an flock on "<file>.lock", so several worker
+    processes can share the same log. Closed segments are renamed to
+    "<stem>.<YYYY-MM-DD>.<n>.jsonl" and gzipped. The queue is flushed at exit.
+
+    With `chunk_store`, chunk texts go to "<stem>.chunks.sqlite" (once per
+    distinct text) and records only keep their IDs.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = LOG_QUEUE_SIZE,
+        policy: str = LOG_FULL_POLICY,
+        batch_size: int = LOG_BATCH_SIZE,
+        flush_interval: float = LOG_FLUSH_SECONDS,
+        max_bytes: int = LOG_MAX_BYTES,
+        rotate_daily: bool = LOG_ROTATE_DAILY,
+        compress: bool = LOG_COMPRESS,
+        chunk_store: bool = LOG_CHUNK_STORE,
+    ):
+        if policy not in ("drop", "block"):
+            raise ValueError(f"Unknown log policy: {policy!r}")
+        self.policy = policy
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        self.chunk_store = chunk_store
+        self._stores: Dict[Path, ChunkStore] = {}
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._atexit = False
 
-def log_interaction(question, documents, generation):
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.rotations = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+                if not self._atexit:
+                    atexit.register(self.close)
+                    self._atexit = True
+
+    def submit(self, path: Path, record: Dict[str, Any]) -> bool:
+        """Queue one JSON record for `path`. Returns False if it was dropped."""
+        self._ensure_started()
+        item = (Path(path), record)
+        if self.policy == "block":
+            self._queue.put(item)
+            return True
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self) -> None:
+        """Block until every record submitted so far is on disk."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            taken = 1
+            batch: List[Tuple[Path, Dict[str, Any]]] = []
+            stop = item is _STOP
+            if item is not _FLUSH and not stop:
+                batch.append(item)
+                deadline = time.monotonic() + self.flush_interval
+                # A flush or stop marker ends the batch early
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    taken += 1
+                    if item is _FLUSH or item is _STOP:
+                        stop = item is _STOP
+                        break
+                    batch.append(item)
+
+            try:
+                if batch:
+                    self._write(batch)
+            except Exception as e:
+                logger.error("[Logger] Error escribiendo %d registros: %s", len(batch), e)
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, batch: List[Tuple[Path, Dict[str, Any]]]) -> None:
+        by_path: "OrderedDict[Path, List[Dict[str, Any]]]" = OrderedDict()
+        for path, record in batch:
+            by_path.setdefault(path, []).append(record)
+
+        for path, records in by_path.items():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if self.chunk_store:
+                # Chunks are stored before the records that reference them
+                if path not in self._stores:
+                    self._stores[path] = ChunkStore(chunk_store_path(path))
+                records = compact_records(records, self._stores[path])
+            lines = [json.dumps(r, ensure_ascii=False) + "\n" for r in records]
+            data = "".join(lines).encode("utf-8")
+            with log_lock(path):
+                rotated = self._maybe_rotate(path, len(data))
+                with open(path, "ab") as f:
+                    f.write(data)
+            if rotated is not None and self.compress:
+                _compress(rotated)
+            self.written += len(lines)
+            self.batches += 1
+            logger.debug("[Logger] %d registro(s) escrito(s) en %s", len(lines), path)
+
+    def _maybe_rotate(self, path: Path, incoming: int) -> Optional[Path]:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        if st.st_size == 0:
+            return None
+
+        day = datetime.fromtimestamp(st.st_mtime, timezone.utc).date()
+        too_big = self.max_bytes and st.st_size + incoming > self.max_bytes
+        new_day = self.rotate_daily and day != datetime.now(timezone.utc).date()
+        if not (too_big or new_day):
+            return None
+
+        target = _next_segment(path, day.isoformat())
+        os.replace(path, target)
+        self.rotations += 1
+        logger.info("[Logger] Log rotado a %s", target)
+        return target
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "rotations": self.rotations,
+        }
+
+
+_writer = LogWriter()
+
+
+def log_interaction(question, documents, generation, cache=None, grades=None, context_tokens=None):
     """
     Guarda una interacción RAG en formato JSONL para análisis y evaluación.
+    `cache` marca si la respuesta vino de la caché de respuestas
+    ("hit", "semantic-hit") o se generó de nuevo ("miss"). `grades` son los
+    veredictos del grader por chunk (similitud, veredicto y origen), que
+    usa calibrate_grader.py, y `context_tokens` los tokens del contexto por
+    sección (descripción, BOM, documentos).
+
+    Solo encola el registro: un hilo en segundo plano lo escribe en disco.
     """
 
     # Contenidos de los chunks
@@ -31,8 +326,70 @@ def log_interaction(question, documents, generation):
         "sources": sources,
         "answer": generation,
     }
+    if cache is not None:
+        record["cache"] = cache
+    if grades is not None:
+        record["grades"] = grades
+    if context_tokens is not None:
+        record["context_tokens"] = context_tokens
+
+    _writer.submit(LOG_PATH, record)
+
+
+def flush():
+    """Espera a que todos los registros encolados estén escritos."""
+    _writer.flush()
+
+
+def stats() -> Dict[str, Any]:
+    return _writer.stats()
 
-    with LOG_PATH.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
 
-    print(f"[Logger] Interacción registrada en {LOG_PATH}")
\ No newline at end of file
+def iter_log_files(path=None) -> List[Path]:
+    """Segmentos rotados (en orden) seguidos del fichero activo."""
+    path = Path(path or LOG_PATH)
+    pattern = _segment_pattern(path)
+    names = {p.name for p in path.parent.glob(f"{path.stem}.*")} if path.parent.exists() else set()
+    segments = [
+        path.with_name(n)
+        for n in sorted(names)
+        if pattern.match(n) and not (not n.endswith(".gz") and f"{n}.gz" in names)
+    ]
+    return segments + ([path] if path.exists() else [])
+
+
+def read_log_files(files: Iterable[Path]) -> Iterator[Dict[str, Any]]:
+    for file in files:
+        opener = gzip.open if file.suffix == ".gz" else open
+        with opener(file, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def iter_log_records(path=None, resolve: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Todos los registros del log, incluidos los segmentos rotados y comprimidos.
+    Con `resolve`, los `context_ids` se sustituyen por los textos del almacén
+    de chunks (campo `contexts`, como en los logs antiguos).
+    """
+    path = Path(path or LOG_PATH)
+    records = read_log_files(iter_log_files(path))
+    if not resolve:
+        yield from records
+        return
+
+    store_path = chunk_store_path(path)
+    store = ChunkStore(store_path) if store_path.exists() else None
+    try:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == _RESOLVE_BATCH:
+                yield from resolve_records(batch, store)
+                batch = []
+        yield from resolve_records(batch, store)
+    finally:
+        if store is not None:
+            store.close()
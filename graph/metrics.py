@@ -0,0 +1,111 @@
+import re
+import threading
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+# Recent observations kept per metric to compute quantiles
+WINDOW = 1024
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _quantile(values, q: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class Metrics:
+    """
+    Small in-process metrics registry: monotonically increasing counters and
+    observed values (latencies, sizes) summarised as count/sum/p50/p95/max.
+    """
+
+    def __init__(self, window: int = WINDOW):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._count: Dict[str, int] = defaultdict(int)
+        self._sum: Dict[str, float] = defaultdict(float)
+        self._recent: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            self._count[name] += 1
+            self._sum[name] += value
+            self._recent[name].append(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            observations = {}
+            for name, recent in self._recent.items():
+                observations[name] = {
+                    "count": self._count[name],
+                    "sum": self._sum[name],
+                    "p50": _quantile(recent, 0.5),
+                    "p95": _quantile(recent, 0.95),
+                    "max": max(recent),
+                }
+            return {"counters": dict(self._counters), "observations": observations}
+
+    def to_prometheus(self, prefix: str = "rag") -> str:
+        """
+        Snapshot in the Prometheus text format: counters as `<name>_total`,
+        observations as summaries (p50/p95 of the recent window, plus
+        lifetime `_sum` and `_count`).
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = _metric_name(prefix, name)
+            lines += [f"# TYPE {metric}_total counter", f"{metric}_total {value:g}"]
+        for name, obs in sorted(snapshot["observations"].items()):
+            metric = _metric_name(prefix, name)
+            lines += [
+                f"# TYPE {metric} summary",
+                f'{metric}{{quantile="0.5"}} {obs["p50"]:g}',
+                f'{metric}{{quantile="0.95"}} {obs["p95"]:g}',
+                f"{metric}_sum {obs['sum']:g}",
+                f"{metric}_count {obs['count']}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._count.clear()
+            self._sum.clear()
+            self._recent.clear()
+
+
+def _metric_name(prefix: str, name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{name}")
+
+
+metrics = Metrics()
+
+
+def serve_metrics(port: int, registry: Metrics = metrics, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve `registry` at http://<host>:<port>/metrics from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
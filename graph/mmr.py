@@ -0,0 +1,208 @@
+import asyncio
+import math
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from graph.bom_planner import search_pool
+
+# Candidates fetched per query vector (as the Chroma retriever's fetch_k)
+MMR_FETCH_K = 20
+# 1.0 = pure relevance, 0.0 = maximum diversity (LangChain's default)
+MMR_LAMBDA = 0.5
+# Minimum relevance, on the scale LangChain reports for Chroma/FAISS L2 indexes
+MMR_SCORE_THRESHOLD = 0.35
+
+
+def relevance_from_cosine(cosine: np.ndarray) -> np.ndarray:
+    """
+    Relevance as LangChain computes it for the default L2 space of Chroma
+    and FAISS: 1 - squared_l2 / sqrt(2), with squared_l2 = 2 - 2 * cosine
+    for unit vectors. Keeps the retriever's `score_threshold` meaning the same.
+    """
+    return 1.0 - (2.0 - 2.0 * cosine) / math.sqrt(2.0)
+
+
+def _normalize(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def mmr_select(
+    query_vectors,
+    candidate_vectors,
+    k: int,
+    lambda_mult: float = MMR_LAMBDA,
+    score_threshold: Optional[float] = None,
+    selected: Sequence[int] = (),
+) -> List[int]:
+    """
+    Maximal marginal relevance over a pool of candidates for several queries
+    at once. A candidate's relevance is its best cosine similarity to any
+    query; candidates under `score_threshold` are dropped first. Similarities
+    are computed once as two matrix products, and each greedy step is a
+    vectorized update of the candidates' max similarity to the selection.
+    `selected` candidates (if over the threshold) are taken first and the
+    rest are picked to be diverse from them.
+
+    Returns candidate indices in selection order.
+    """
+    if k <= 0 or len(candidate_vectors) == 0 or len(query_vectors) == 0:
+        return []
+
+    candidates = _normalize(candidate_vectors)
+    relevance = (candidates @ _normalize(query_vectors).T).max(axis=1)
+
+    pool = np.arange(len(candidates))
+    if score_threshold is not None:
+        pool = np.flatnonzero(relevance_from_cosine(relevance) >= score_threshold)
+        if not len(pool):
+            return []
+        candidates, relevance = candidates[pool], relevance[pool]
+
+    similarity = candidates @ candidates.T
+    position = {int(c): j for j, c in enumerate(pool)}
+    chosen = [position[i] for i in dict.fromkeys(selected) if i in position][:k]
+    if not chosen:
+        chosen = [int(np.argmax(relevance))]
+    picked = [int(pool[j]) for j in chosen]
+    available = np.ones(len(pool), dtype=bool)
+    available[chosen] = False
+    # Max similarity of every candidate to the selection so far
+    redundancy = similarity[chosen].max(axis=0)
+    for _ in range(min(k, len(pool)) - len(picked)):
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(int(pool[best]))
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return picked
+
+
+def fetch_candidates(
+    store: VectorStore, query_vectors: Sequence[Sequence[float]], embeddings: Embeddings,
+    fetch_k: int = MMR_FETCH_K,
+) -> Tuple[List[Document], List[List[float]]]:
+    """
+    Top `fetch_k` chunks for every query vector, deduplicated by content,
+    with their stored vectors. The per-vector searches run in parallel on
+    the BOM search pool.
+    """
+    rankings = search_pool.map(
+        lambda v: store.similarity_search_by_vector(list(v), k=fetch_k), query_vectors
+    )
+    docs = _unique(rankings)
+    if not docs:
+        return [], []
+    return docs, _stored_vectors(store, docs, embeddings)
+
+
+async def afetch_candidates(
+    store: VectorStore, query_vectors: Sequence[Sequence[float]], embeddings: Embeddings,
+    fetch_k: int = MMR_FETCH_K,
+) -> Tuple[List[Document], List[List[float]]]:
+    """Async version of `fetch_candidates`: the per-vector searches are gathered."""
+    rankings = await asyncio.gather(
+        *(asyncio.to_thread(store.similarity_search_by_vector, list(v), k=fetch_k)
+          for v in query_vectors)
+    )
+    docs = _unique(rankings)
+    if not docs:
+        return [], []
+    return docs, await asyncio.to_thread(_stored_vectors, store, docs, embeddings)
+
+
+def _unique(rankings) -> List[Document]:
+    unique = {}
+    for ranking in rankings:
+        for doc in ranking:
+            unique.setdefault(doc.page_content, doc)
+    return list(unique.values())
+
+
+def _stored_vectors(store: VectorStore, docs: List[Document], embeddings: Embeddings):
+    """
+    Chroma hands back the vectors it holds for the chunk IDs in one `get`.
+    Other stores (the FAISS session index) have their chunks re-embedded
+    through `embeddings`, which the embedding cache turns into lookups of
+    the vectors computed at index time.
+    """
+    from langchain_chroma import Chroma
+
+    ids = [d.id for d in docs]
+    if isinstance(store, Chroma) and all(ids):
+        stored = store.get(ids=ids, include=["embeddings"])
+        by_id = dict(zip(stored["ids"], stored["embeddings"]))
+        if all(i in by_id for i in ids):
+            return [by_id[i] for i in ids]
+    return embeddings.embed_documents([d.page_content for d in docs])
+
+
+def multi_query_mmr(
+    stores: Sequence[VectorStore],
+    query_vectors: Sequence[Sequence[float]],
+    embeddings: Embeddings,
+    k: int,
+    fetch_k: int = MMR_FETCH_K,
+    lambda_mult: float = MMR_LAMBDA,
+    score_threshold: Optional[float] = MMR_SCORE_THRESHOLD,
+    min_per_store: Sequence[int] = (),
+) -> List[Document]:
+    """
+    One MMR pass over the union of the candidates of every query in every
+    store, instead of one MMR per (query, store) pair. `min_per_store[i]`
+    of the `k` slots are kept for store `i`, so a small store is not
+    crowded out by a large one, as long as it has chunks over the threshold.
+    """
+    fetched = [fetch_candidates(s, query_vectors, embeddings, fetch_k) for s in stores]
+    return _select(fetched, query_vectors, k, lambda_mult, score_threshold, min_per_store)
+
+
+async def amulti_query_mmr(
+    stores: Sequence[VectorStore],
+    query_vectors: Sequence[Sequence[float]],
+    embeddings: Embeddings,
+    k: int,
+    fetch_k: int = MMR_FETCH_K,
+    lambda_mult: float = MMR_LAMBDA,
+    score_threshold: Optional[float] = MMR_SCORE_THRESHOLD,
+    min_per_store: Sequence[int] = (),
+) -> List[Document]:
+    """Async version of `multi_query_mmr`: every store and query vector is searched concurrently."""
+    fetched = await asyncio.gather(
+        *(afetch_candidates(s, query_vectors, embeddings, fetch_k) for s in stores)
+    )
+    return _select(fetched, query_vectors, k, lambda_mult, score_threshold, min_per_store)
+
+
+def _select(fetched, query_vectors, k, lambda_mult, score_threshold, min_per_store) -> List[Document]:
+    # Union across stores; the same text in both keeps its first copy
+    docs, vectors, owners, seen = [], [], [], set()
+    for store, (store_docs, store_vectors) in enumerate(fetched):
+        for doc, vector in zip(store_docs, store_vectors):
+            if doc.page_content not in seen:
+                seen.add(doc.page_content)
+                docs.append(doc)
+                vectors.append(vector)
+                owners.append(store)
+
+    # Reserved slots: an MMR pass over each store's own candidates first
+    reserved = []
+    for store, minimum in enumerate(min_per_store):
+        own = [i for i, owner in enumerate(owners) if owner == store]
+        if minimum > 0 and own:
+            sub = mmr_select(
+                query_vectors, [vectors[i] for i in own], minimum, lambda_mult, score_threshold
+            )
+            reserved += [own[i] for i in sub]
+
+    picked = mmr_select(query_vectors, vectors, k, lambda_mult, score_threshold, reserved)
+    return [docs[i] for i in picked]
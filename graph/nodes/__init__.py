@@ -1,10 +1,13 @@
-from graph.nodes.generate import generate
-from graph.nodes.retrieve import retrieve
-from graph.nodes.grade_documents import grade_documents
+from graph.nodes.generate import agenerate, generate
+from graph.nodes.retrieve import aretrieve, retrieve
+from graph.nodes.grade_documents import agrade_documents, grade_documents
 
 
 __all__ = [
     "generate",
     "retrieve",
     "grade_documents",
+    "agenerate",
+    "aretrieve",
+    "agrade_documents",
 ]
\ No newline at end of file
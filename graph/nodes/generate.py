@@ -1,42 +1,74 @@
+import logging
 from typing import Any, Dict
-from graph.chains.generation import generation_chain
+
+from graph.chains.generation import get_generation_chain
+from graph.context_packer import PackedContext, pack_context
+from graph.metrics import metrics
 from graph.state import GraphState
-from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
 
 
 def generate(state: GraphState) -> Dict[str, Any]:
-    print("---GENERATE ANSWER (JSON MODE)---")
+    logger.info("---GENERATE ANSWER (JSON MODE)---")
 
     question = state["question"]
-    description = state["description"]
-    bom = state["bom"]
-    documents = state["documents"]
+    packed = build_context(state)
 
-    # Build context
-    docs_as_text = []
-    for d in documents:
-        src = d.metadata.get("source", "desconocido")
-        page = d.metadata.get("page", "N/A")
-        docs_as_text.append(
-            f"[SOURCE: {src} | PAGE: {page}]\n{d.page_content}"
-        )
-
-    final_context = (
-        "=== Project Description ===\n"
-        + description
-        + "\n\n=== BOM ===\n"
-        + bom
-        + "\n\n=== Retrieved Documents ===\n"
-        + "\n\n".join(docs_as_text)
-    )
+    generation = get_generation_chain().invoke({
+        "context": packed.text,
+        "question": question,
+    })
+
+    return {
+        "generation": generation,
+        "question": question,
+        "documents": packed.documents,
+        "relevance_scores": packed.scores,
+        "context_tokens": packed.tokens,
+    }
 
-    generation = generation_chain.invoke({
-        "context": final_context,
+
+async def agenerate(state: GraphState) -> Dict[str, Any]:
+    """Async version of `generate`."""
+    logger.info("---GENERATE ANSWER (JSON MODE, ASYNC)---")
+
+    question = state["question"]
+    packed = build_context(state)
+
+    generation = await get_generation_chain().ainvoke({
+        "context": packed.text,
         "question": question,
     })
 
     return {
         "generation": generation,
         "question": question,
-        "documents": documents,
-    }
\ No newline at end of file
+        "documents": packed.documents,
+        "relevance_scores": packed.scores,
+        "context_tokens": packed.tokens,
+    }
+
+
+def build_context(state: GraphState) -> PackedContext:
+    """
+    Description, BOM and retrieved chunks packed into the token budget
+    (graph.context_packer). Only the chunks that made it in are passed on,
+    with their scores in the same order, so the hallucination grader checks
+    against what the model saw and a retry packs them the same way.
+    """
+    documents = state["documents"]
+    scores = state.get("relevance_scores")
+    if scores is not None and len(scores) != len(documents):
+        scores = None
+
+    packed = pack_context(state["description"], state["bom"], documents, scores)
+
+    for section, count in packed.tokens.items():
+        metrics.observe(f"context_tokens_{section}", count)
+    logger.info(
+        "---CONTEXT TOKENS: %d (DESCRIPTION %d, BOM %d, DOCUMENTS %d; %d CHUNKS DROPPED)---",
+        packed.tokens["total"], packed.tokens["description"], packed.tokens["bom"],
+        packed.tokens["documents"], packed.dropped,
+    )
+    return packed
@@ -1,36 +1,229 @@
-from typing import Any, Dict
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
-from graph.chains.retrieval_grader import retrieval_grader
+from langchain_core.runnables import RunnableLambda
+
+from graph.chains.retrieval_grader import get_retrieval_grader
+from graph.embeddings import get_embeddings
+from graph.grade_prefilter import (
+    ACCEPTED,
+    BY_CACHE,
+    BY_GRADER,
+    GRADER_LOG_SIMILARITIES,
+    GRADER_PREFILTER,
+    GRADER_PREFILTER_AUDIT_RATE,
+    REJECTED,
+    asimilarities,
+    get_thresholds,
+    similarities,
+)
+from graph.metrics import metrics
 from graph.state import GraphState
+from graph.verdict_cache import get_verdict_cache
+
+# Number of retrieval-grader calls in flight at once (1 = sequential)
+GRADER_MAX_CONCURRENCY = int(os.getenv("GRADER_MAX_CONCURRENCY", "8"))
+
+logger = logging.getLogger(__name__)
+
+
+def _grade_one(inputs: Dict[str, str]) -> Tuple[str, float]:
+    start = time.perf_counter()
+    score = get_retrieval_grader().invoke(inputs)
+    return score.binary_score, time.perf_counter() - start
+
+
+async def _agrade_one(
+    inputs: Dict[str, str], semaphore: asyncio.Semaphore
+) -> Tuple[str, float]:
+    async with semaphore:
+        start = time.perf_counter()
+        score = await get_retrieval_grader().ainvoke(inputs)
+        return score.binary_score, time.perf_counter() - start
 
 
 def grade_documents(state: GraphState) -> Dict[str, Any]:
     """
-    Determines whether the retrieved documents are relevant to the question
-    If any document is not relevant, we will set a flag to run web search
+    Determines whether the retrieved documents are relevant to the question.
+    Verdicts already in the verdict cache skip the grader, and so do chunks
+    whose similarity to the question falls outside the calibrated uncertain
+    band (graph.grade_prefilter); the rest are graded concurrently (up to
+    GRADER_MAX_CONCURRENCY calls at once). The relevant documents are kept
+    in their original order.
 
     Args:
         state (dict): The current graph state
 
     Returns:
-        state (dict): Filtered out irrelevant documents and updated web_search state
+        state (dict): Filtered out irrelevant documents, the grading
+        latency (seconds) of every input document, the verdict cache
+        hit rate, the grader call count and the per-chunk grades
     """
 
-    print("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
+    logger.info("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
     question = state["question"]
     documents = state["documents"]
 
-    filtered_docs = []
-    web_search = False
-    for d in documents:
-        score = retrieval_grader.invoke(
-            {"question": question, "document": d.page_content}
+    keys, cached, todo = _cached_verdicts(question, documents)
+    sims = similarities(question, documents, get_embeddings()) if _wants_similarities() else None
+    tiers, graded_idx = _prefilter(sims, todo)
+
+    inputs = [{"question": question, "document": documents[i].page_content} for i in graded_idx]
+    graded = RunnableLambda(_grade_one).batch(
+        inputs, config={"max_concurrency": GRADER_MAX_CONCURRENCY}
+    ) if inputs else []
+
+    results = _merge(keys, cached, tiers, graded_idx, graded)
+    return _filter_graded(question, documents, results, sims, tiers)
+
+
+async def agrade_documents(state: GraphState) -> Dict[str, Any]:
+    """Async version of `grade_documents` using `ainvoke` on the grader."""
+
+    logger.info("---CHECK DOCUMENT RELEVANCE TO QUESTION (ASYNC)---")
+    question = state["question"]
+    documents = state["documents"]
+
+    keys, cached, todo = _cached_verdicts(question, documents)
+    sims = (
+        await asimilarities(question, documents, get_embeddings())
+        if _wants_similarities()
+        else None
+    )
+    tiers, graded_idx = _prefilter(sims, todo)
+
+    semaphore = asyncio.Semaphore(GRADER_MAX_CONCURRENCY)
+    graded = await asyncio.gather(
+        *(
+            _agrade_one({"question": question, "document": documents[i].page_content}, semaphore)
+            for i in graded_idx
         )
-        grade = score.binary_score
-        if grade.lower() == "yes":
-            print("---GRADE: DOCUMENT RELEVANT---")
+    )
+
+    results = _merge(keys, cached, tiers, graded_idx, graded)
+    return _filter_graded(question, documents, results, sims, tiers)
+
+
+def _cached_verdicts(question, documents) -> Tuple[List[str], Dict[str, str], List[int]]:
+    """Returns (cache key per document, cached verdicts, indexes still to grade)."""
+    verdict_cache = get_verdict_cache()
+    keys = [verdict_cache.key(question, d.page_content) for d in documents]
+    cached = verdict_cache.get_many(keys)
+    todo = [i for i, k in enumerate(keys) if k not in cached]
+    return keys, cached, todo
+
+
+def _wants_similarities() -> bool:
+    """Similarities are only embedded to prefilter with calibrated thresholds, or to log them."""
+    return GRADER_LOG_SIMILARITIES or (GRADER_PREFILTER and get_thresholds() is not None)
+
+
+def _prefilter(sims, todo) -> Tuple[Dict[int, str], List[int]]:
+    """
+    Returns (prefilter tier per clear-cut document, indexes to send to the
+    grader). In audited requests the clear-cut documents are graded too and
+    the grader's verdict wins.
+    """
+    thresholds = get_thresholds()
+    if sims is None or thresholds is None or not GRADER_PREFILTER:
+        return {}, todo
+    tiers = {i: tier for i in todo if (tier := thresholds.tier(sims[i])) is not None}
+    if tiers and random.random() < GRADER_PREFILTER_AUDIT_RATE:
+        return tiers, todo
+    return tiers, [i for i in todo if i not in tiers]
+
+
+def _merge(keys, cached, tiers, graded_idx, graded) -> List[Tuple[str, Optional[float], str]]:
+    """
+    Store the new verdicts and return (grade, latency, how) per document;
+    latency is None when the grader was not called.
+    """
+    get_verdict_cache().set_many(
+        {keys[i]: grade.lower() for i, (grade, _) in zip(graded_idx, graded)}
+    )
+
+    results: List[Tuple[str, Optional[float], str]] = []
+    for i, k in enumerate(keys):
+        if k in cached:
+            results.append((cached[k], None, BY_CACHE))
+        else:
+            tier = tiers.get(i)
+            results.append(("yes" if tier == ACCEPTED else "no", None, tier))
+    for i, (grade, elapsed) in zip(graded_idx, graded):
+        results[i] = (grade, elapsed, BY_GRADER)
+    return results
+
+
+def _filter_graded(question, documents, results, sims, tiers) -> Dict[str, Any]:
+    filtered_docs = []
+    relevance_scores = []
+    latencies = []
+    grades = []
+    hits = calls = audited = agreed = 0
+    for i, (d, (grade, elapsed, how)) in enumerate(zip(documents, results)):
+        relevant = grade.lower() == "yes"
+        if how == BY_CACHE:
+            hits += 1
+            timing = "cached"
+        elif how == BY_GRADER:
+            calls += 1
+            timing = f"{elapsed:.2f}s"
+        else:
+            timing = "prefilter"
+        latencies.append(elapsed or 0.0)
+        grades.append({
+            "similarity": round(sims[i], 4) if sims is not None else None,
+            "verdict": "yes" if relevant else "no",
+            "by": how,
+        })
+
+        # Audited request: the grader also saw a chunk the prefilter decided
+        if how == BY_GRADER and i in tiers:
+            audited += 1
+            agreed += (tiers[i] == ACCEPTED) == relevant
+
+        if relevant:
+            logger.debug("---GRADE: DOCUMENT RELEVANT (%s)---", timing)
             filtered_docs.append(d)
+            relevance_scores.append(sims[i] if sims is not None else None)
         else:
-            print("---GRADE: DOCUMENT NOT RELEVANT---")
+            logger.debug("---GRADE: DOCUMENT NOT RELEVANT (%s)---", timing)
             continue
-    return {"documents": filtered_docs, "question": question}
\ No newline at end of file
+
+    hit_rate = hits / len(documents) if documents else 0.0
+    metrics.incr("grader_cache_hits", hits)
+    metrics.incr("grader_cache_misses", len(documents) - hits)
+    metrics.observe("grader_cache_hit_rate", hit_rate)
+    logger.info("---GRADE CACHE: %d/%d HITS---", hits, len(documents))
+
+    accepted = sum(1 for g in grades if g["by"] == ACCEPTED)
+    rejected = sum(1 for g in grades if g["by"] == REJECTED)
+    metrics.observe("grader_calls", calls)
+    metrics.incr("grader_prefilter_accepted", accepted)
+    metrics.incr("grader_prefilter_rejected", rejected)
+    logger.info(
+        "---GRADER CALLS: %d/%d (PREFILTER: %d ACCEPTED, %d REJECTED)---",
+        calls, len(documents), accepted, rejected,
+    )
+
+    agreement = agreed / audited if audited else None
+    if agreement is not None:
+        metrics.incr("grader_prefilter_audited", audited)
+        metrics.incr("grader_prefilter_agreed", agreed)
+        metrics.observe("grader_prefilter_agreement", agreement)
+        logger.info("---PREFILTER AGREEMENT: %d/%d---", agreed, audited)
+
+    return {
+        "documents": filtered_docs,
+        "relevance_scores": relevance_scores,
+        "question": question,
+        "grade_latencies": latencies,
+        "grade_cache_hit_rate": hit_rate,
+        "grader_calls": calls,
+        "grade_prefilter_agreement": agreement,
+        "grades": grades,
+    }
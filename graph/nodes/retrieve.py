@@ -1,24 +1,57 @@
-from typing import Any, Dict, List
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional
+from langchain_core.documents import Document
+from graph.bm25 import BM25Index
+from graph.bom_planner import aretrieve_for_bom, retrieve_for_bom
+from graph.embeddings import get_embeddings
+from graph.hybrid import (
+    RETRIEVAL_MODE,
+    ahybrid_search,
+    apooled_search,
+    hybrid_search,
+    pooled_search,
+)
+from graph.session_index import session_index_cache
 from graph.state import GraphState
-from ingestion import retriever as base_retriever  # your original retriever
+from graph.stitching import STITCH_NEIGHBORS, stitch_neighbors
+from ingestion import get_bm25_index, get_retriever, get_vectorstore  # your original retriever
 
+# "pooled": question and BOM queries over the base and session stores go
+# through one NumPy MMR pass (graph.mmr); "per_query": one Chroma MMR / RRF
+# search per query and store, as before
+MMR_ENGINE = os.getenv("MMR_ENGINE", "pooled")
 
-embeddings = OpenAIEmbeddings(model="text-embedding-ada-002")
+logger = logging.getLogger(__name__)
 
 
 def retrieve(state: GraphState) -> Dict[str, Any]:
-    print("---RETRIEVE---")
+    logger.info("---RETRIEVE---")
 
     question = state["question"]
     bom = state["bom"]
+    embeddings = get_embeddings()
+
+    if MMR_ENGINE == "pooled":
+        stores = [get_vectorstore()]
+        session_docs = state.get("session_docs", [])
+        if session_docs:
+            logger.debug("---SESSION DOCS FOUND: %d---", len(session_docs))
+            stores.append(session_index_cache.get_or_build(session_docs, embeddings))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("---SESSION INDEX CACHE: %s---", session_index_cache.stats())
+        merged_docs = pooled_search(question, bom, stores, embeddings, _bm25_index())
+        merged_docs = _stitch(merged_docs)
+        logger.info("---POOLED DOC COUNT: %d---", len(merged_docs))
+        return {"documents": merged_docs, "question": question}
 
     # ============================
-    # 1) Base retriever (your existing one)
+    # 1) Base retriever (your existing one) + BM25
     # ============================
-    docs_query_base = base_retriever.invoke(question)
-    docs_bom_base = base_retriever.invoke(bom)
+    docs_query_base = hybrid_search(question, get_retriever(), _bm25_index())
+    # The BOM is split into per-component queries fused with RRF
+    docs_bom_base = retrieve_for_bom(bom, get_vectorstore(), embeddings)
 
     merged = docs_query_base + docs_bom_base
 
@@ -28,30 +61,97 @@ def retrieve(state: GraphState) -> Dict[str, Any]:
     session_docs = state.get("session_docs", [])
 
     if session_docs:
-        print(f"---SESSION DOCS FOUND: {len(session_docs)}---")
-        # Build temporary FAISS vectorstore for the session
-        session_vs = FAISS.from_documents(session_docs, embeddings)
+        logger.debug("---SESSION DOCS FOUND: %d---", len(session_docs))
+        # FAISS vectorstore for the session (built once, cached by content hash)
+        session_vs = session_index_cache.get_or_build(session_docs, embeddings)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("---SESSION INDEX CACHE: %s---", session_index_cache.stats())
         session_retriever = session_vs.as_retriever(search_kwargs={"k": 4})
 
         # Retrieve from session store using your .invoke API
         docs_query_session = session_retriever.invoke(question)
-        docs_bom_session = session_retriever.invoke(bom)
+        docs_bom_session = retrieve_for_bom(bom, session_vs, embeddings, top_k=4)
 
         merged.extend(docs_query_session + docs_bom_session)
 
     # ============================
     # 3) Deduplicate by page_content (keep your logic)
     # ============================
-    unique = {}
-    for d in merged:
-        unique[d.page_content] = d
-
-    merged_docs = list(unique.values())
+    merged_docs = _stitch(_deduplicate(merged))
 
-    print(f"---MERGED DOC COUNT: {len(merged_docs)}---")
+    logger.info("---MERGED DOC COUNT: %d---", len(merged_docs))
 
     # Return merged docs + question unchanged
     return {
         "documents": merged_docs,
         "question": question,
-    }
\ No newline at end of file
+    }
+
+
+async def aretrieve(state: GraphState) -> Dict[str, Any]:
+    """Async version of `retrieve`: all retriever queries run concurrently."""
+    logger.info("---RETRIEVE (ASYNC)---")
+
+    question = state["question"]
+    bom = state["bom"]
+    embeddings = get_embeddings()
+
+    if MMR_ENGINE == "pooled":
+        stores = [get_vectorstore()]
+        session_docs = state.get("session_docs", [])
+        if session_docs:
+            logger.debug("---SESSION DOCS FOUND: %d---", len(session_docs))
+            stores.append(await session_index_cache.aget_or_build(session_docs, embeddings))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("---SESSION INDEX CACHE: %s---", session_index_cache.stats())
+        merged_docs = await apooled_search(question, bom, stores, embeddings, _bm25_index())
+        merged_docs = _stitch(merged_docs)
+        logger.info("---POOLED DOC COUNT: %d---", len(merged_docs))
+        return {"documents": merged_docs, "question": question}
+
+    queries = [
+        ahybrid_search(question, get_retriever(), _bm25_index()),
+        aretrieve_for_bom(bom, get_vectorstore(), embeddings),
+    ]
+
+    session_docs = state.get("session_docs", [])
+    if session_docs:
+        logger.debug("---SESSION DOCS FOUND: %d---", len(session_docs))
+        session_vs = await session_index_cache.aget_or_build(session_docs, embeddings)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("---SESSION INDEX CACHE: %s---", session_index_cache.stats())
+        session_retriever = session_vs.as_retriever(search_kwargs={"k": 4})
+        queries += [
+            session_retriever.ainvoke(question),
+            aretrieve_for_bom(bom, session_vs, embeddings, top_k=4),
+        ]
+
+    results = await asyncio.gather(*queries)
+    merged = [d for docs in results for d in docs]
+
+    merged_docs = _stitch(_deduplicate(merged))
+
+    logger.info("---MERGED DOC COUNT: %d---", len(merged_docs))
+
+    return {
+        "documents": merged_docs,
+        "question": question,
+    }
+
+
+def _bm25_index() -> Optional[BM25Index]:
+    # Dense-only retrieval never searches it: don't load the collection into one
+    return get_bm25_index() if RETRIEVAL_MODE != "dense" else None
+
+
+def _stitch(docs: List[Document]) -> List[Document]:
+    # Adjacent overlapping chunks of one page become one passage: fewer
+    # grader calls and the overlap is not paid twice in the prompt
+    return stitch_neighbors(docs) if STITCH_NEIGHBORS else docs
+
+
+def _deduplicate(docs: List[Document]) -> List[Document]:
+    unique = {}
+    for d in docs:
+        unique[d.page_content] = d
+    return list(unique.values())
\ No newline at end of file
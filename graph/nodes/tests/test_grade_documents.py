@@ -0,0 +1,174 @@
+import importlib
+import time
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from langchain_core.runnables import RunnableLambda
+
+from graph.chains.retrieval_grader import GradeDocuments
+from graph.disk_cache import DiskCache
+from graph.grade_prefilter import Thresholds
+from graph.verdict_cache import VerdictCache
+# graph.nodes re-exports the node function under the module's name
+node = importlib.import_module("graph.nodes.grade_documents")
+
+
+def fake_grader(delay: float):
+    def grade(inputs):
+        time.sleep(delay)
+        relevant = "keep" in inputs["document"]
+        return GradeDocuments(binary_score="yes" if relevant else "no")
+
+    return RunnableLambda(grade)
+
+
+@pytest.fixture(autouse=True)
+def verdicts(monkeypatch, tmp_path):
+    cache = VerdictCache(DiskCache(tmp_path / "verdicts.sqlite", table="verdicts"))
+    monkeypatch.setattr(node, "get_verdict_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def uncalibrated(monkeypatch):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    monkeypatch.setattr(node, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(node, "get_thresholds", lambda: None)
+
+
+class SimilarityEmbeddings(Embeddings):
+    """The question is [1, 0]; a chunk "<text> @0.9" has cosine 0.9 with it."""
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+    def embed_documents(self, texts):
+        cosines = [float(t.rsplit("@", 1)[1]) for t in texts]
+        return [[c, (1 - c * c) ** 0.5] for c in cosines]
+
+
+def test_grading_keeps_order_and_filters(monkeypatch) -> None:
+    grader = fake_grader(0.0)
+    monkeypatch.setattr(node, "get_retrieval_grader", lambda: grader)
+    docs = [
+        Document(page_content=f"{'keep' if i % 2 else 'drop'} {i}") for i in range(8)
+    ]
+
+    result = node.grade_documents({"question": "q", "documents": docs})
+
+    assert [d.page_content for d in result["documents"]] == [
+        "keep 1",
+        "keep 3",
+        "keep 5",
+        "keep 7",
+    ]
+    assert len(result["grade_latencies"]) == len(docs)
+
+
+def test_grading_runs_concurrently(monkeypatch) -> None:
+    grader = fake_grader(0.1)
+    monkeypatch.setattr(node, "get_retrieval_grader", lambda: grader)
+    monkeypatch.setattr(node, "GRADER_MAX_CONCURRENCY", 8)
+    docs = [Document(page_content=f"keep {i}") for i in range(8)]
+
+    start = time.perf_counter()
+    result = node.grade_documents({"question": "q", "documents": docs})
+    elapsed = time.perf_counter() - start
+
+    assert len(result["documents"]) == 8
+    assert elapsed < 0.4
+    assert all(l >= 0.1 for l in result["grade_latencies"])
+
+
+def test_cached_verdicts_skip_the_grader(monkeypatch) -> None:
+    calls = []
+
+    def grade(inputs):
+        calls.append(inputs["document"])
+        return GradeDocuments(binary_score="yes" if "keep" in inputs["document"] else "no")
+
+    grader = RunnableLambda(grade)
+    monkeypatch.setattr(node, "get_retrieval_grader", lambda: grader)
+    docs = [Document(page_content=c) for c in ("keep 1", "drop 2")]
+
+    first = node.grade_documents({"question": "¿Qué acero?", "documents": docs})
+    more = docs + [Document(page_content="keep 3")]
+    second = node.grade_documents({"question": "qué acero", "documents": more})
+
+    assert sorted(calls) == ["drop 2", "keep 1", "keep 3"]
+    assert first["grade_cache_hit_rate"] == 0.0
+    assert second["grade_cache_hit_rate"] == 2 / 3
+    assert [d.page_content for d in second["documents"]] == ["keep 1", "keep 3"]
+
+
+def test_verdicts_invalidated_when_grader_changes(tmp_path) -> None:
+    path = tmp_path / "v.sqlite"
+    key = VerdictCache.key("q", "chunk")
+    VerdictCache(DiskCache(path, table="verdicts", version="a")).set_many({key: "yes"})
+
+    assert VerdictCache(DiskCache(path, table="verdicts", version="a")).get_many([key]) == {key: "yes"}
+    assert VerdictCache(DiskCache(path, table="verdicts", version="b")).get_many([key]) == {}
+
+
+def test_prefilter_grades_only_the_uncertain_band(monkeypatch) -> None:
+    calls = []
+
+    def grade(inputs):
+        calls.append(inputs["document"])
+        return GradeDocuments(binary_score="yes" if "keep" in inputs["document"] else "no")
+
+    grader = RunnableLambda(grade)
+    monkeypatch.setattr(node, "get_retrieval_grader", lambda: grader)
+    monkeypatch.setattr(node, "get_embeddings", SimilarityEmbeddings)
+    monkeypatch.setattr(node, "get_thresholds", lambda: Thresholds(lower=0.5, upper=0.9))
+    monkeypatch.setattr(node, "GRADER_PREFILTER_AUDIT_RATE", 0.0)
+    docs = [Document(page_content=c) for c in ("sure @0.95", "keep @0.7", "drop @0.6", "off @0.1")]
+
+    result = node.grade_documents({"question": "q", "documents": docs})
+
+    assert sorted(calls) == ["drop @0.6", "keep @0.7"]
+    assert result["grader_calls"] == 2
+    assert [d.page_content for d in result["documents"]] == ["sure @0.95", "keep @0.7"]
+    assert [g["by"] for g in result["grades"]] == ["accept", "llm", "llm", "reject"]
+    assert result["grade_prefilter_agreement"] is None
+
+
+def test_audited_request_reports_agreement(monkeypatch) -> None:
+    grader = fake_grader(0.0)
+    monkeypatch.setattr(node, "get_retrieval_grader", lambda: grader)
+    monkeypatch.setattr(node, "get_embeddings", SimilarityEmbeddings)
+    monkeypatch.setattr(node, "get_thresholds", lambda: Thresholds(lower=0.5, upper=0.9))
+    monkeypatch.setattr(node, "GRADER_PREFILTER_AUDIT_RATE", 1.0)
+    # The grader rejects the first chunk the prefilter would have accepted
+    docs = [Document(page_content=c) for c in ("drop @0.95", "keep @0.92", "drop @0.1")]
+
+    result = node.grade_documents({"question": "q", "documents": docs})
+
+    assert result["grader_calls"] == 3
+    assert result["grade_prefilter_agreement"] == 2 / 3
+    assert [d.page_content for d in result["documents"]] == ["keep @0.92"]
+
+
+def test_uncalibrated_grading_skips_similarities(monkeypatch) -> None:
+    grader = fake_grader(0.0)
+    monkeypatch.setattr(node, "get_retrieval_grader", lambda: grader)
+    embedded = []
+
+    class CountingEmbeddings(SimilarityEmbeddings):
+        def embed_documents(self, texts):
+            embedded.extend(texts)
+            return super().embed_documents(texts)
+
+    monkeypatch.setattr(node, "get_embeddings", CountingEmbeddings)
+    docs = [Document(page_content=c) for c in ("keep @0.95", "drop @0.1")]
+
+    result = node.grade_documents({"question": "q", "documents": docs})
+    assert embedded == []
+    assert [g["similarity"] for g in result["grades"]] == [None, None]
+
+    # Collecting calibration data: similarities are logged, every chunk is graded
+    monkeypatch.setattr(node, "GRADER_LOG_SIMILARITIES", True)
+    result = node.grade_documents({"question": "otra q", "documents": docs})
+    assert [g["similarity"] for g in result["grades"]] == [0.95, 0.1]
+    assert [g["by"] for g in result["grades"]] == ["llm", "llm"]
@@ -0,0 +1,295 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Deque, Dict, Mapping, Optional, Sequence
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from graph.metrics import metrics
+from graph.tracing import token_usage
+
+# Limits shared by every chat model of the process (0 = no limit). They are
+# also lowered on the fly from the x-ratelimit-remaining-* response headers.
+LLM_RPM = int(os.getenv("LLM_RPM", "500"))
+LLM_TPM = int(os.getenv("LLM_TPM", "200000"))
+# Seconds of quota that can be spent in one burst
+LLM_BURST_SECONDS = float(os.getenv("LLM_BURST_SECONDS", "5"))
+# Pause after a 429 without Retry-After: doubles per consecutive 429, up to the max
+LLM_BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", "1"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+
+# Lanes in priority order: a waiting generation call goes before any grader call
+GENERATION_LANE = "generation"
+GRADER_LANE = "grader"
+LANES = (GENERATION_LANE, GRADER_LANE)
+
+
+class TokenBucket:
+    """Refills at `per_minute` / 60 per second up to `capacity`; may go negative when debited."""
+
+    def __init__(self, per_minute: float, capacity: float, now: float):
+        self.rate = per_minute / 60
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until(self, level: float) -> float:
+        return max(0.0, (level - self.level) / self.rate)
+
+
+class _Ticket:
+    __slots__ = ("lane", "enqueued", "event", "future", "loop")
+
+    def __init__(self, lane: str, enqueued: float):
+        self.lane = lane
+        self.enqueued = enqueued
+        self.event: Optional[threading.Event] = None
+        self.future: Optional[asyncio.Future] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def wake(self) -> None:
+        if self.future is not None:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+        else:
+            self.event.set()
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(True)
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM calls: a request-per-minute and a
+    token-per-minute bucket, shared by all lanes. Callers wait in one FIFO
+    queue per lane and are let through strictly by lane priority, so a
+    burst of grader calls cannot delay a generation call by more than the
+    requests already in flight.
+
+    A call takes one request up front; its actual tokens are debited when
+    the response arrives (`debit`), which can push the token bucket below
+    zero and hold the next calls until it refills. A 429 (`observe_response`)
+    pauses every lane for Retry-After seconds, or an exponential backoff.
+    """
+
+    def __init__(
+        self,
+        rpm: float = LLM_RPM,
+        tpm: float = LLM_TPM,
+        lanes: Sequence[str] = LANES,
+        burst_seconds: float = LLM_BURST_SECONDS,
+        backoff: float = LLM_BACKOFF_SECONDS,
+        backoff_max: float = LLM_BACKOFF_MAX_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.clock = clock
+        now = clock()
+        self._requests = (
+            TokenBucket(rpm, max(1.0, rpm / 60 * burst_seconds), now) if rpm else None
+        )
+        self._tokens = TokenBucket(tpm, tpm / 60 * burst_seconds, now) if tpm else None
+        self.lanes = tuple(lanes)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+
+        self._lock = threading.Lock()
+        self._queues: Dict[str, Deque[_Ticket]] = {lane: deque() for lane in self.lanes}
+        self._paused_until = 0.0
+        self._consecutive_429 = 0
+        self._timer: Optional[threading.Timer] = None
+        self._timer_due = 0.0
+
+        self.granted = 0
+        self.rate_limited = 0
+
+    # -- admission ---------------------------------------------------------
+
+    def acquire(self, lane: str, blocking: bool = True) -> bool:
+        ticket = _Ticket(lane, self.clock())
+        ticket.event = threading.Event()
+        if not self._enqueue(ticket, blocking):
+            return False
+        ticket.event.wait()
+        return True
+
+    async def aacquire(self, lane: str, blocking: bool = True) -> bool:
+        ticket = _Ticket(lane, self.clock())
+        ticket.loop = asyncio.get_running_loop()
+        ticket.future = ticket.loop.create_future()
+        if not self._enqueue(ticket, blocking):
+            return False
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            with self._lock:
+                queue = self._queues[lane]
+                if ticket in queue:
+                    queue.remove(ticket)
+            raise
+        return True
+
+    def _enqueue(self, ticket: _Ticket, blocking: bool) -> bool:
+        with self._lock:
+            if ticket.lane not in self._queues:
+                raise ValueError(f"Unknown LLM lane: {ticket.lane!r}")
+            queue = self._queues[ticket.lane]
+            if not blocking and (any(self._queues.values()) or self._delay(self.clock())):
+                return False
+            queue.append(ticket)
+            metrics.observe(f"llm_queue_depth_{ticket.lane}", len(queue))
+            self._dispatch()
+        return True
+
+    def _delay(self, now: float) -> float:
+        """Seconds until a call can be let through (0 = now). Lock held."""
+        delay = max(0.0, self._paused_until - now)
+        if self._requests is not None:
+            self._requests.refill(now)
+            delay = max(delay, self._requests.seconds_until(1))
+        if self._tokens is not None:
+            self._tokens.refill(now)
+            # Any positive level lets a call in; its tokens are debited afterwards
+            if self._tokens.level <= 0:
+                delay = max(delay, self._tokens.seconds_until(1))
+        return delay
+
+    def _dispatch(self) -> None:
+        """Let queued calls through, highest lane first, while the buckets allow. Lock held."""
+        while True:
+            lane = next((lane for lane in self.lanes if self._queues[lane]), None)
+            if lane is None:
+                return
+            now = self.clock()
+            delay = self._delay(now)
+            if delay > 0:
+                self._wake_in(delay)
+                return
+            ticket = self._queues[lane].popleft()
+            if self._requests is not None:
+                self._requests.level -= 1
+            self.granted += 1
+            metrics.observe(f"llm_queue_wait_seconds_{lane}", now - ticket.enqueued)
+            ticket.wake()
+
+    def _wake_in(self, delay: float) -> None:
+        due = self.clock() + delay
+        if self._timer is not None and self._timer.is_alive() and self._timer_due <= due:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer_due = due
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    # -- feedback from responses -------------------------------------------
+
+    def debit(self, tokens: int) -> None:
+        """Charge the tokens a finished call actually used."""
+        if self._tokens is None or tokens <= 0:
+            return
+        with self._lock:
+            self._tokens.refill(self.clock())
+            self._tokens.level -= tokens
+
+    def observe_response(self, status: int, headers: Mapping[str, str]) -> None:
+        """Back off on 429s and follow the x-ratelimit-remaining-* headers."""
+        with self._lock:
+            now = self.clock()
+            if status == 429:
+                self.rate_limited += 1
+                self._consecutive_429 += 1
+                metrics.incr("llm_rate_limited")
+                pause = _retry_after(headers)
+                if pause is None:
+                    pause = min(self.backoff_max, self.backoff * 2 ** (self._consecutive_429 - 1))
+                    pause *= 1 + random.random() * 0.1
+                self._paused_until = max(self._paused_until, now + pause)
+                metrics.observe("llm_backoff_seconds", pause)
+                return
+            if status < 400:
+                self._consecutive_429 = 0
+            for bucket, header in (
+                (self._requests, "x-ratelimit-remaining-requests"),
+                (self._tokens, "x-ratelimit-remaining-tokens"),
+            ):
+                remaining = _number(headers.get(header))
+                if bucket is not None and remaining is not None:
+                    bucket.refill(now)
+                    bucket.level = min(bucket.level, remaining)
+            # Timer may be needed earlier or later now; let the next event reschedule it
+            self._dispatch()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "queued": {lane: len(q) for lane, q in self._queues.items()},
+                "granted": self.granted,
+                "rate_limited": self.rate_limited,
+                "paused_for": round(max(0.0, self._paused_until - self.clock()), 3),
+            }
+
+    def limiter(self, lane: str) -> "LaneRateLimiter":
+        return LaneRateLimiter(self, lane)
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    # retry-after-ms is OpenAI's; retry-after is seconds (HTTP dates are not used by the API)
+    ms = _number(headers.get("retry-after-ms"))
+    if ms is not None:
+        return ms / 1000
+    return _number(headers.get("retry-after"))
+
+
+class LaneRateLimiter(BaseRateLimiter):
+    """`rate_limiter` for a chat model: waits for its lane of the shared scheduler."""
+
+    def __init__(self, scheduler: LLMScheduler, lane: str):
+        self.scheduler = scheduler
+        self.lane = lane
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        return self.scheduler.acquire(self.lane, blocking)
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        return await self.scheduler.aacquire(self.lane, blocking)
+
+
+class TokenUsageDebit(BaseCallbackHandler):
+    """Chat model callback that debits each response's token usage from the scheduler."""
+
+    run_inline = True
+
+    def __init__(self, scheduler: LLMScheduler):
+        self.scheduler = scheduler
+
+    def on_llm_end(self, response, **kwargs):
+        prompt, completion = token_usage(response)
+        self.scheduler.debit(prompt + completion)
+
+
+@lru_cache(maxsize=1)
+def get_scheduler() -> LLMScheduler:
+    return LLMScheduler()
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+MAX_SESSION_INDEXES = 32
+
+
+def hash_documents(documents: List[Document]) -> str:
+    """
+    Content hash of a list of documents (text + metadata, in order).
+    Two sessions that upload the same files share the same key.
+    """
+    h = hashlib.sha256()
+    for d in documents:
+        h.update(d.page_content.encode("utf-8"))
+        h.update(b"\x00")
+        h.update(
+            json.dumps(d.metadata or {}, sort_keys=True, default=str).encode("utf-8")
+        )
+        h.update(b"\x01")
+    return h.hexdigest()
+
+
+class SessionIndexCache:
+    """
+    Bounded LRU cache of per-session FAISS indexes keyed by the content
+    hash of the uploaded documents.
+
+    Building an index embeds every page, so it is done once (normally at
+    chat start) and reused by every later turn of the conversation.
+    """
+
+    def __init__(self, max_entries: int = MAX_SESSION_INDEXES):
+        self.max_entries = max_entries
+        self._indexes: "OrderedDict[str, FAISS]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.build_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    def _lookup(self, key: str):
+        with self._lock:
+            vs = self._indexes.get(key)
+            if vs is not None:
+                self._indexes.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return vs
+
+    def _store(self, key: str, vs: "FAISS", elapsed: float) -> "FAISS":
+        with self._lock:
+            self.build_seconds += elapsed
+            # Another caller may have built the same index meanwhile
+            existing = self._indexes.get(key)
+            if existing is not None:
+                self._indexes.move_to_end(key)
+                return existing
+
+            self._indexes[key] = vs
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+                self.evictions += 1
+            return vs
+
+    def get_or_build(self, documents: List[Document], embeddings: Embeddings) -> "FAISS":
+        key = hash_documents(documents)
+        vs = self._lookup(key)
+        if vs is not None:
+            return vs
+
+        start = time.perf_counter()
+        from langchain_community.vectorstores import FAISS
+
+        vs = FAISS.from_documents(documents, embeddings)
+        return self._store(key, vs, time.perf_counter() - start)
+
+    async def aget_or_build(
+        self, documents: List[Document], embeddings: Embeddings
+    ) -> "FAISS":
+        key = hash_documents(documents)
+        vs = self._lookup(key)
+        if vs is not None:
+            return vs
+
+        start = time.perf_counter()
+        from langchain_community.vectorstores import FAISS
+
+        vs = await FAISS.afrom_documents(documents, embeddings)
+        return self._store(key, vs, time.perf_counter() - start)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._indexes),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "build_seconds": round(self.build_seconds, 4),
+            }
+
+
+session_index_cache = SessionIndexCache()
@@ -1,4 +1,4 @@
-from typing import List, TypedDict, Optional
+from typing import Any, Dict, List, TypedDict, Optional
 from langchain_core.documents import Document
 
 
@@ -13,6 +13,14 @@ class GraphState(TypedDict):
         generation: LLM JSON generation (string)
         documents: retrieved documents (base + session)
         session_docs: per-session uploaded docs (description + BOM)
+        grade_latencies: seconds spent grading each retrieved document (0 for cached verdicts)
+        grade_cache_hit_rate: share of verdicts served by the verdict cache
+        grader_calls: retrieval-grader LLM calls made for this request
+        grade_prefilter_agreement: prefilter vs grader agreement (audited requests only)
+        grades: similarity, verdict and how it was reached, per graded document
+        relevance_scores: question similarity of each relevant document (None if unknown)
+        context_tokens: prompt tokens per context section, as packed by generate
+        cache_status: answer-cache marker of this request ("miss" when the graph runs)
     """
 
     question: str
@@ -26,4 +34,18 @@ class GraphState(TypedDict):
     documents: List[Document]
 
     # NEW: uploaded files in this session (used for session-level vectorstore)
-    session_docs: Optional[List[Document]]
\ No newline at end of file
+    session_docs: Optional[List[Document]]
+
+    # Per-document retrieval-grader latency, same order as the graded documents
+    grade_latencies: Optional[List[float]]
+    grade_cache_hit_rate: Optional[float]
+    grader_calls: Optional[int]
+    grade_prefilter_agreement: Optional[float]
+    # Logged with the interaction, to calibrate graph.grade_prefilter
+    grades: Optional[List[Dict[str, Any]]]
+    # Same order as `documents` after grading; generate packs the best first
+    relevance_scores: Optional[List[Optional[float]]]
+    context_tokens: Optional[Dict[str, int]]
+
+    # Answer-cache marker, copied into the interaction log
+    cache_status: Optional[str]
\ No newline at end of file
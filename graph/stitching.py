@@ -0,0 +1,115 @@
+import logging
+import os
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from graph.metrics import metrics
+
+# Merge overlapping chunks of the same source and page after retrieval
+STITCH_NEIGHBORS = os.getenv("STITCH_NEIGHBORS", "1") != "0"
+# Shortest shared text taken as a splitter overlap (the splitter uses 50 tokens)
+MIN_OVERLAP_CHARS = 20
+# Longest overlap looked for at the end of a chunk (50 tokens is ~200-300 characters)
+MAX_OVERLAP_CHARS = 1000
+# Passages are not grown past this, so one page cannot eat the context budget
+MAX_PASSAGE_CHARS = 4000
+
+logger = logging.getLogger(__name__)
+
+
+def overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b` (0 if under MIN_OVERLAP_CHARS)."""
+    probe = b[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    pos = a.find(probe, max(0, len(a) - MAX_OVERLAP_CHARS))
+    while pos != -1:
+        # The earliest match is the longest overlap
+        if b.startswith(a[pos:]):
+            return len(a) - pos
+        pos = a.find(probe, pos + 1)
+    return 0
+
+
+def _page_key(doc: Document) -> Optional[Tuple[Hashable, Hashable]]:
+    source = doc.metadata.get("source")
+    if source is None:
+        return None
+    return source, doc.metadata.get("page")
+
+
+def _join(a: str, b: str) -> Optional[str]:
+    """`a` and `b` as one passage if one contains or continues the other."""
+    if len(b) >= MIN_OVERLAP_CHARS and b in a:
+        return a
+    if len(a) >= MIN_OVERLAP_CHARS and a in b:
+        return b
+    for first, second in ((a, b), (b, a)):
+        n = overlap(first, second)
+        if n and len(first) + len(second) - n <= MAX_PASSAGE_CHARS:
+            return first + second[n:]
+    return None
+
+
+def _stitched(docs: List[Document], members: List[int], text: str) -> Document:
+    metadata = {}
+    for i in members:
+        for key, value in docs[i].metadata.items():
+            metadata.setdefault(key, value)
+    metadata["stitched_chunks"] = len(members)
+    return Document(page_content=text, metadata=metadata)
+
+
+def stitch_neighbors(docs: List[Document]) -> List[Document]:
+    """
+    Merge adjacent chunks of the same source and page into one passage.
+
+    Neighbours are recognised by the text the splitter repeats between them
+    (chunk_overlap): the end of one chunk is the start of the next. Each
+    passage takes the place of its best-ranked chunk, keeps its metadata
+    (plus keys only the others have) and records how many chunks it joins.
+    """
+    groups: Dict[Tuple[Hashable, Hashable], List[int]] = {}
+    for i, doc in enumerate(docs):
+        key = _page_key(doc)
+        if key is not None:
+            groups.setdefault(key, []).append(i)
+
+    # Passage text and chunk positions, keyed by the position that stands for them
+    texts = {i: d.page_content for i, d in enumerate(docs)}
+    members = {i: [i] for i in range(len(docs))}
+    for positions in groups.values():
+        live = list(positions)
+        merged = True
+        while merged:
+            merged = False
+            for a in live:
+                for b in live:
+                    if a == b:
+                        continue
+                    joined = _join(texts[a], texts[b])
+                    if joined is None:
+                        continue
+                    keep, drop = min(a, b), max(a, b)
+                    texts[keep] = joined
+                    members[keep] += members.pop(drop)
+                    del texts[drop]
+                    live.remove(drop)
+                    merged = True
+                    break
+                if merged:
+                    break
+
+    result = []
+    for i in sorted(texts):
+        if len(members[i]) == 1:
+            result.append(docs[i])
+        else:
+            result.append(_stitched(docs, sorted(members[i]), texts[i]))
+
+    stitched = len(docs) - len(result)
+    if stitched:
+        metrics.incr("stitched_chunks", stitched)
+        logger.info("---STITCHED NEIGHBOUR CHUNKS: %d -> %d---", len(docs), len(result))
+    return result
@@ -0,0 +1,80 @@
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+import graph.logger
+from benchmarks.fakes import HashingEmbeddings
+from graph.answer_cache import HIT, MISS, SEMANTIC_HIT, AnswerCache, invoke_cached
+
+STATE = {"question": "¿Qué material usa el eje?", "bom": "| Pieza | Material |", "description": "Proyecto A"}
+RESULT = {"generation": '{"answer": "Acero"}', "documents": [Document(page_content="eje de acero")]}
+
+
+def make(**kwargs):
+    version = {"value": "v1"}
+    cache = AnswerCache(
+        embeddings=HashingEmbeddings(size=64), index_version=lambda: version["value"], **kwargs
+    )
+    return cache, version
+
+
+def test_exact_hit_after_normalization() -> None:
+    cache, _ = make()
+    assert cache.lookup(STATE) == (None, MISS)
+    cache.store(STATE, RESULT)
+
+    cached, status = cache.lookup({**STATE, "question": "  qué material usa el EJE  "})
+    assert status == HIT
+    assert cached["generation"] == RESULT["generation"]
+    # A different BOM is a different answer
+    assert cache.lookup({**STATE, "bom": "| Pieza |"})[1] == MISS
+
+
+def test_ttl_and_lru_eviction(monkeypatch) -> None:
+    cache, _ = make(max_entries=2, ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr("graph.answer_cache.time.time", lambda: now[0])
+
+    for q in ("a", "b", "c"):
+        cache.store({**STATE, "question": q}, RESULT)
+    assert cache.lookup({**STATE, "question": "a"})[1] == MISS
+    assert cache.lookup({**STATE, "question": "c"})[1] == HIT
+
+    now[0] += 11
+    assert cache.lookup({**STATE, "question": "c"})[1] == MISS
+
+
+def test_semantic_hit_respects_threshold_and_scope() -> None:
+    cache, _ = make(semantic=True, threshold=0.8)
+    cache.store(STATE, RESULT)
+
+    near = {**STATE, "question": "qué material usa el eje principal"}
+    assert cache.lookup(near)[1] == SEMANTIC_HIT
+    assert cache.lookup({**STATE, "question": "plazo de entrega"})[1] == MISS
+    assert cache.lookup({**near, "description": "Proyecto B"})[1] == MISS
+
+
+def test_index_version_change_invalidates() -> None:
+    cache, version = make()
+    cache.store(STATE, RESULT)
+    version["value"] = "v2"
+
+    assert cache.lookup(STATE)[1] == MISS
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_invoke_cached_logs_hits(tmp_path, monkeypatch) -> None:
+    log_path = tmp_path / "log.jsonl"
+    monkeypatch.setattr(graph.logger, "LOG_PATH", log_path)
+    cache, _ = make()
+    calls = []
+    app = RunnableLambda(lambda state: calls.append(state) or {**state, **RESULT})
+
+    first = invoke_cached(app, STATE, cache=cache)
+    second = invoke_cached(app, STATE, cache=cache)
+
+    assert len(calls) == 1 and calls[0]["cache_status"] == MISS
+    assert first["generation"] == second["generation"]
+    assert second["cache_status"] == HIT
+    graph.logger.flush()
+    records = list(graph.logger.iter_log_records(log_path))
+    assert records[-1]["cache"] == HIT
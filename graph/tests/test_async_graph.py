@@ -0,0 +1,111 @@
+import asyncio
+import importlib
+import time
+
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.runnables import RunnableLambda
+
+from benchmarks.fakes import HashingEmbeddings
+from graph.bm25 import BM25Index
+from graph.chains.answer_grader import GradeAnswer
+from graph.chains.hallucination_grader import GradeHallucinations
+from graph.chains.retrieval_grader import GradeDocuments
+from graph.disk_cache import DiskCache
+from graph.verdict_cache import VerdictCache
+
+LATENCY = 0.05
+
+
+def slow(value):
+    """Runnable that answers `value(inputs)` after LATENCY seconds, sync or async."""
+
+    def func(inputs):
+        time.sleep(LATENCY)
+        return value(inputs)
+
+    async def afunc(inputs):
+        await asyncio.sleep(LATENCY)
+        return value(inputs)
+
+    return RunnableLambda(func, afunc=afunc)
+
+
+@pytest.fixture
+def graph_module(monkeypatch, tmp_path):
+    module = importlib.import_module("graph.graph")
+
+    docs = [Document(page_content=f"chunk {i}", metadata={"source": "doc.pdf"}) for i in range(4)]
+    retrieve = importlib.import_module("graph.nodes.retrieve")
+    grade = importlib.import_module("graph.nodes.grade_documents")
+    generate = importlib.import_module("graph.nodes.generate")
+    packer = importlib.import_module("graph.context_packer")
+    logger = importlib.import_module("graph.logger")
+    tracing = importlib.import_module("graph.tracing")
+
+    base_retriever = slow(lambda q: docs)
+    retrieval_grader = slow(lambda x: GradeDocuments(binary_score="yes"))
+    generation_chain = slow(lambda x: '{"answer": "ok", "sources": []}')
+    hallucination_grader = slow(lambda x: GradeHallucinations(binary_score=True))
+    answer_grader = slow(lambda x: GradeAnswer(binary_score=True))
+
+    # Local stand-ins for the knowledge base and the OpenAI embeddings
+    embeddings = HashingEmbeddings(size=64)
+    store = Chroma(
+        collection_name="test",
+        persist_directory=str(tmp_path / "chroma"),
+        embedding_function=embeddings,
+    )
+
+    monkeypatch.setattr(retrieve, "MMR_ENGINE", "per_query")
+    monkeypatch.setattr(retrieve, "get_embeddings", lambda: embeddings)
+    monkeypatch.setattr(retrieve, "get_vectorstore", lambda: store)
+    monkeypatch.setattr(retrieve, "get_retriever", lambda: base_retriever)
+    monkeypatch.setattr(retrieve, "get_bm25_index", lambda: BM25Index([]))
+    monkeypatch.setattr(grade, "get_retrieval_grader", lambda: retrieval_grader)
+    monkeypatch.setattr(grade, "get_embeddings", lambda: DeterministicFakeEmbedding(size=8))
+    monkeypatch.setattr(grade, "get_thresholds", lambda: None)
+    monkeypatch.setattr(generate, "get_generation_chain", lambda: generation_chain)
+    monkeypatch.setattr(packer, "get_token_counter", lambda: packer.TokenCounter())
+    monkeypatch.setattr(module, "get_hallucination_grader", lambda: hallucination_grader)
+    monkeypatch.setattr(module, "get_answer_grader", lambda: answer_grader)
+    monkeypatch.setattr(logger, "LOG_PATH", tmp_path / "rag_logs.jsonl")
+    monkeypatch.setattr(tracing, "TRACE_PATH", tmp_path / "rag_traces.jsonl")
+    verdicts = VerdictCache(DiskCache(tmp_path / "verdicts.sqlite", table="verdicts"))
+    monkeypatch.setattr(grade, "get_verdict_cache", lambda: verdicts)
+    return module
+
+
+def initial_state(question: str):
+    return {
+        "question": question,
+        "bom": "",
+        "description": "",
+        "generation": "",
+        "documents": [],
+        "session_docs": [],
+    }
+
+
+def test_ainvoke_matches_invoke(graph_module) -> None:
+    sync_state = graph_module.get_app().invoke(initial_state("q"))
+    async_state = asyncio.run(graph_module.get_app().ainvoke(initial_state("q")))
+
+    assert sync_state["generation"] == async_state["generation"]
+    assert len(sync_state["documents"]) == len(async_state["documents"]) == 4
+
+
+def test_concurrent_sessions_take_about_as_long_as_one(graph_module) -> None:
+    async def run(n: int) -> float:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(graph_module.get_app().ainvoke(initial_state(f"q{i}")) for i in range(n))
+        )
+        return time.perf_counter() - start
+
+    single = asyncio.run(run(1))
+    many = asyncio.run(run(10))
+
+    assert many < 2 * single
@@ -0,0 +1,109 @@
+import importlib
+import math
+from collections import Counter
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.runnables import RunnableLambda
+
+from graph.bm25 import BM25Index, is_identifier_query, tokenize
+from graph.hybrid import hybrid_search
+
+TEXTS = [
+    "Chapa de acero S355JR según UNE-EN 10025-2 para el casco.",
+    "El acero inoxidable 1.4301 resiste la corrosión marina.",
+    "Pinturas antiincrustantes sin biocidas para cascos de acero.",
+    "Reciclaje de aluminio naval y reducción de emisiones.",
+    "Gestión ambiental del astillero según ISO 14001.",
+]
+DOCS = [Document(page_content=t, metadata={"i": i}) for i, t in enumerate(TEXTS)]
+
+
+def reference_scores(docs, query, k1=1.2, b=0.75):
+    tokenized = [tokenize(d.page_content) for d in docs]
+    avgdl = sum(map(len, tokenized)) / len(tokenized)
+    df = Counter(t for toks in tokenized for t in set(toks))
+    scores = []
+    for toks in tokenized:
+        tf = Counter(toks)
+        s = 0.0
+        for term in tokenize(query):
+            if term in tf:
+                idf = math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+                s += idf * tf[term] * (k1 + 1) / (tf[term] + k1 * (1 - b + b * len(toks) / avgdl))
+        scores.append(s)
+    return scores
+
+
+def test_tokenize_keeps_codes_and_folds_accents() -> None:
+    assert tokenize("UNE-EN 10025-2, Corrosión") == [
+        "une-en", "10025-2", "corrosion", "une", "en", "10025", "2",
+    ]
+
+
+def test_vectorized_scores_match_reference() -> None:
+    index = BM25Index(DOCS)
+    for query in ("acero casco", "S355JR", "corrosión marina del acero", "acero acero"):
+        np.testing.assert_allclose(index.scores(query), reference_scores(DOCS, query), rtol=1e-5)
+
+
+def test_search_ranks_exact_identifiers_first() -> None:
+    index = BM25Index(DOCS)
+    assert index.search("s355jr", k=3)[0].metadata["i"] == 0
+    assert index.search("ISO 14001")[0].metadata["i"] == 4
+    assert {d.metadata["i"] for d in index.search("acero", k=2)} <= {0, 1, 2}
+    assert index.search("titanio") == []
+
+
+def test_identifier_queries() -> None:
+    assert is_identifier_query("S355JR")
+    assert is_identifier_query("UNE-EN 1090-2")
+    assert not is_identifier_query("¿Qué acero usar en el casco?")
+    assert not is_identifier_query("impacto de la norma ISO 14001 en el proyecto de transformación naval")
+
+
+def test_identifier_fast_path_skips_dense_retrieval() -> None:
+    calls = []
+    dense = RunnableLambda(lambda q: calls.append(q) or [DOCS[3]])
+    index = BM25Index(DOCS)
+
+    assert hybrid_search("1.4301", dense, index)[0].metadata["i"] == 1
+    assert calls == []
+
+    fused = hybrid_search("reciclaje del acero", dense, index)
+    assert calls == ["reciclaje del acero"]
+    assert {d.metadata["i"] for d in fused} >= {0, 3}
+    # Unknown identifiers fall back to the dense retriever
+    assert hybrid_search("XJ-999", dense, index) == [DOCS[3]]
+
+
+def test_dense_mode_does_not_build_the_index(monkeypatch) -> None:
+    # graph.nodes re-exports the node function under the module's name
+    retrieve = importlib.import_module("graph.nodes.retrieve")
+    built = []
+    monkeypatch.setattr(retrieve, "get_bm25_index", lambda: built.append(1) or BM25Index(DOCS))
+    dense = RunnableLambda(lambda q: [DOCS[3]])
+
+    monkeypatch.setattr(retrieve, "RETRIEVAL_MODE", "dense")
+    assert hybrid_search("1.4301", dense, retrieve._bm25_index(), mode="dense") == [DOCS[3]]
+    assert built == []
+
+    monkeypatch.setattr(retrieve, "RETRIEVAL_MODE", "hybrid")
+    assert retrieve._bm25_index() is not None
+    assert built == [1]
+
+
+def test_index_from_chroma_collection(tmp_path) -> None:
+    store = Chroma(
+        collection_name="test",
+        persist_directory=str(tmp_path / "chroma"),
+        embedding_function=DeterministicFakeEmbedding(size=8),
+    )
+    store.add_documents(DOCS, ids=[str(i) for i in range(len(DOCS))])
+
+    index = BM25Index.from_vectorstore(store)
+
+    assert len(index) == len(DOCS)
+    assert index.search("biocidas")[0].page_content == TEXTS[2]
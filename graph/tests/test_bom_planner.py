@@ -0,0 +1,60 @@
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from benchmarks.fakes import HashingEmbeddings
+from graph.bom_planner import parse_bom_table, plan_bom_queries, retrieve_for_bom
+from graph.fusion import reciprocal_rank_fusion
+
+BOM = "\n".join(
+    [
+        "| Componente | Material | Cantidad |",
+        "|:----------------|----------------|----------------|",
+        "| Bastidor | Acero S355 | 1 |",
+        "| Eje | Acero S355 | 2 |",
+        "| Carcasa | Polipropileno | 1 |",
+        "| Cableado | nan | 10 |",
+    ]
+)
+
+
+def test_parse_bom_table() -> None:
+    headers, rows = parse_bom_table(BOM)
+
+    assert headers == ["Componente", "Material", "Cantidad"]
+    assert rows[0] == ["Bastidor", "Acero S355", "1"]
+    assert len(rows) == 4
+
+
+def test_queries_are_grouped_by_material() -> None:
+    assert plan_bom_queries(BOM) == [
+        "Acero S355: Bastidor, Eje",
+        "Polipropileno: Carcasa",
+        "Cableado",
+    ]
+    assert plan_bom_queries("") == []
+    assert plan_bom_queries("texto libre") == ["texto libre"]
+
+
+def test_rrf_rewards_documents_ranked_by_several_queries() -> None:
+    a, b, c = (Document(page_content=x) for x in "abc")
+
+    fused = reciprocal_rank_fusion([[a, b], [c, b], [b]], top_k=2)
+
+    assert [d.page_content for d in fused] == ["b", "a"]
+
+
+def test_retrieve_for_bom_embeds_all_queries_in_one_batch() -> None:
+    embeddings = HashingEmbeddings()
+    docs = [
+        Document(page_content="Reciclado del acero S355 en estructuras"),
+        Document(page_content="Polipropileno reciclado para carcasas"),
+        Document(page_content="Cableado de cobre y su recuperación"),
+        Document(page_content="Normativa de pinturas navales"),
+    ]
+    store = FAISS.from_documents(docs, embeddings)
+    embeddings.calls = 0
+
+    found = retrieve_for_bom(BOM, store, embeddings, per_query_k=1, top_k=3)
+
+    assert embeddings.calls == 1
+    assert {d.page_content for d in found} == {d.page_content for d in docs[:3]}
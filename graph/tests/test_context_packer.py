@@ -0,0 +1,92 @@
+import importlib
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from graph.bom_planner import summarize_bom
+from graph.context_packer import TRUNCATION_MARK, TokenCounter, pack_context
+
+# ~4 characters per token, no tiktoken download needed
+COUNTER = TokenCounter()
+
+BOM = "\n".join(
+    ["| Componente | Material | Cantidad |", "|---|---|---|"]
+    + [f"| pieza {i} | {'acero' if i % 3 else 'aluminio'} | 1 |" for i in range(300)]
+)
+
+
+def doc(text: str, source: str = "doc.pdf") -> Document:
+    return Document(page_content=text, metadata={"source": source, "page": 1})
+
+
+def test_small_inputs_are_kept_whole() -> None:
+    docs = [doc("acero reciclado"), doc("aluminio")]
+
+    packed = pack_context("Barco", "| a | b |", docs, counter=COUNTER)
+
+    assert packed.documents == docs
+    assert packed.dropped == 0
+    assert "Barco" in packed.text and "aluminio" in packed.text
+    # Sections are counted separately: never less than the joined text
+    assert packed.tokens["total"] >= COUNTER.count(packed.text)
+
+
+def test_budget_keeps_the_best_scored_chunks() -> None:
+    docs = [doc(f"chunk {i} " + "x" * 400) for i in range(10)]
+    scores = [0.1 * i for i in range(10)]
+
+    packed = pack_context("", "", docs, scores, budget=400, counter=COUNTER)
+
+    assert packed.tokens["total"] <= 400
+    assert packed.documents == [docs[9], docs[8], docs[7]]
+    assert packed.scores == [scores[9], scores[8], scores[7]]
+    assert packed.dropped == 7
+
+
+def test_generate_retry_keeps_scores_aligned(monkeypatch) -> None:
+    """A re-run of generate (ungrounded answer) packs the chunks as the first run did."""
+    generate = importlib.import_module("graph.nodes.generate")
+    context_packer = importlib.import_module("graph.context_packer")
+    contexts = []
+    chain = RunnableLambda(lambda inputs: contexts.append(inputs["context"]) or "{}")
+    monkeypatch.setattr(generate, "get_generation_chain", lambda: chain)
+    monkeypatch.setattr(context_packer, "get_token_counter", lambda: COUNTER)
+    docs = [doc("acero"), doc("aluminio"), doc("cobre")]
+    state = {
+        "question": "¿Qué metales?",
+        "description": "Barco",
+        "bom": "",
+        "documents": docs,
+        "relevance_scores": [0.1, 0.9, 0.5],
+    }
+
+    first = generate.generate(state)
+    second = generate.generate({**state, **first})
+
+    assert first["documents"] == [docs[1], docs[2], docs[0]]
+    assert first["relevance_scores"] == [0.9, 0.5, 0.1]
+    assert second["documents"] == first["documents"]
+    assert second["relevance_scores"] == first["relevance_scores"]
+    assert contexts[0] == contexts[1]
+
+
+def test_sections_respect_their_quotas() -> None:
+    packed = pack_context("d" * 40_000, BOM, [], budget=5000,
+                          description_quota=100, bom_quota=200, counter=COUNTER)
+
+    assert packed.tokens["description"] <= 100
+    assert packed.tokens["bom"] <= 200
+    assert TRUNCATION_MARK in packed.text
+    # The oversized BOM is summarized per material, not cut mid-table
+    assert "- acero (200 rows)" in packed.text
+
+
+def test_summarize_bom_groups_rows_by_material() -> None:
+    summary = summarize_bom(BOM, max_components=2)
+
+    assert summary.splitlines() == [
+        "BOM summary: 300 rows grouped by Material",
+        "- acero (200 rows): pieza 1, pieza 2, ...",
+        "- aluminio (100 rows): pieza 0, pieza 3, ...",
+    ]
+    assert summarize_bom("texto libre") == "texto libre"
@@ -0,0 +1,68 @@
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from graph.disk_cache import DiskCache
+from graph.embeddings import CachedEmbeddings
+
+
+class RecordingEmbeddings(DeterministicFakeEmbedding):
+    batches: list = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return super().embed_documents(texts)
+
+
+def make(tmp_path, max_entries=100, batch_size=256):
+    underlying = RecordingEmbeddings(size=16, batches=[])
+    cache = DiskCache(tmp_path / "emb.sqlite", table="embeddings", max_entries=max_entries)
+    return underlying, CachedEmbeddings(underlying, cache=cache, batch_size=batch_size)
+
+
+def test_vectors_match_underlying_and_are_cached(tmp_path) -> None:
+    underlying, cached = make(tmp_path)
+    texts = ["acero", "aluminio", "acero"]
+
+    first = cached.embed_documents(texts)
+    second = cached.embed_documents(texts)
+
+    expected = underlying.embed_documents(texts)
+    for got, want in zip(first, expected):
+        assert got == np.float32(want).tolist()
+    assert first == second
+    # Only the two distinct texts were embedded, in a single batch
+    assert underlying.batches[0] == ["acero", "aluminio"]
+    assert len(underlying.batches) == 2  # + the `expected` call above
+    assert cached.stats()["hits"] == 2  # distinct keys of the second call
+
+
+def test_misses_are_batched(tmp_path) -> None:
+    underlying, cached = make(tmp_path, batch_size=2)
+
+    cached.embed_documents(["a", "b", "c", "d", "e"])
+
+    assert [len(b) for b in underlying.batches] == [2, 2, 1]
+
+
+def test_cache_persists_and_evicts_lru(tmp_path) -> None:
+    underlying, cached = make(tmp_path, max_entries=2)
+    cached.embed_documents(["a"])
+    cached.embed_documents(["b"])
+    cached.embed_documents(["a"])  # "b" is now least recently used
+    cached.embed_documents(["c"])
+
+    assert len(cached.cache) == 2
+
+    # A new process sees the same file
+    _, reopened = make(tmp_path, max_entries=2)
+    reopened.underlying = underlying
+    underlying.batches.clear()
+    reopened.embed_documents(["a", "c", "b"])
+    assert underlying.batches == [["b"]]
+
+
+def test_version_change_clears_table(tmp_path) -> None:
+    cache = DiskCache(tmp_path / "c.sqlite", table="t", version="v1")
+    cache.set("k", b"x")
+    assert DiskCache(tmp_path / "c.sqlite", table="t", version="v1").get("k") == b"x"
+    assert DiskCache(tmp_path / "c.sqlite", table="t", version="v2").get("k") is None
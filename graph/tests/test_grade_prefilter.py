@@ -0,0 +1,45 @@
+import random
+
+from graph.grade_prefilter import ACCEPTED, REJECTED, Thresholds, calibrate, evaluate, graded_pairs
+
+
+def test_tiers() -> None:
+    thresholds = Thresholds(lower=0.5, upper=0.9)
+
+    assert thresholds.tier(0.95) == ACCEPTED
+    assert thresholds.tier(0.7) is None
+    assert thresholds.tier(0.2) == REJECTED
+    assert Thresholds(None, None).tier(0.99) is None
+
+
+def test_graded_pairs_count_only_grader_calls() -> None:
+    records = [
+        {"grades": [
+            {"similarity": 0.9, "verdict": "yes", "by": "llm"},
+            {"similarity": 0.8, "verdict": "no", "by": "cache"},
+            {"similarity": 0.95, "verdict": "yes", "by": "accept"},
+            {"similarity": None, "verdict": "yes", "by": "llm"},
+        ]},
+        {"question": "old record without grades"},
+    ]
+
+    assert graded_pairs(records) == [(0.9, True)]
+
+
+def test_calibration_leaves_the_mixed_band_to_the_grader() -> None:
+    rng = random.Random(0)
+    pairs = [(rng.uniform(0.85, 1.0), True) for _ in range(100)]
+    pairs += [(rng.uniform(0.0, 0.4), False) for _ in range(100)]
+    pairs += [(rng.uniform(0.5, 0.8), rng.random() < 0.5) for _ in range(100)]
+
+    thresholds = calibrate(pairs, precision=0.98, min_support=20)
+    report = evaluate(pairs, thresholds)
+
+    assert 0.7 <= thresholds.upper <= 0.85
+    assert 0.4 <= thresholds.lower <= 0.6
+    assert report["skipped"] >= 200
+    assert report["agreement"] >= 0.98
+
+
+def test_calibration_needs_support() -> None:
+    assert calibrate([(0.99, True), (0.1, False)], min_support=20) == Thresholds(None, None)
@@ -0,0 +1,49 @@
+import json
+
+from graph.json_stream import IncrementalJSONParser
+
+GENERATION = {
+    "answer": 'El acero "S355" es reciclable.\nVer café ♻️ y \\ barras.',
+    "recommendations": [{"current_material": "PVC", "alternative": "PE", "reason": "}]"}],
+    "limitations": ["Sin datos de ACV"],
+    "score": 0.5,
+    "sources": [],
+}
+
+
+def feed_in_chunks(text: str, size: int):
+    parser = IncrementalJSONParser()
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i : i + size]))
+    return parser, events
+
+
+def test_answer_streams_and_sections_close_in_order() -> None:
+    text = "```json\n" + json.dumps(GENERATION, indent=2) + "\n```"
+
+    for size in (1, 3, 7, 64):
+        parser, events = feed_in_chunks(text, size)
+
+        answer = "".join(v for kind, key, v in events if kind == "delta")
+        sections = [key for kind, key, _ in events if kind == "section"]
+
+        assert answer == GENERATION["answer"]
+        assert sections == list(GENERATION)
+        assert parser.result == GENERATION
+        assert parser.done
+
+
+def test_escaped_unicode_is_decoded_incrementally() -> None:
+    text = json.dumps({"answer": "ok ♻️ 😀"}, ensure_ascii=True)
+
+    parser, events = feed_in_chunks(text, 2)
+
+    assert "".join(v for kind, _, v in events if kind == "delta") == "ok ♻️ 😀"
+
+
+def test_non_json_output_produces_no_sections() -> None:
+    parser, events = feed_in_chunks("Lo siento, no puedo responder.", 5)
+
+    assert events == []
+    assert parser.result == {}
@@ -0,0 +1,132 @@
+import gzip
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+from langchain_core.documents import Document
+
+import graph.logger
+from graph.chunk_store import ChunkStore, chunk_store_path
+from graph.logger import LogWriter, iter_log_files, iter_log_records, read_log_files
+
+
+def line(i: int):
+    return {"i": i, "pad": "x" * 50}
+
+
+def test_log_interaction_is_queued_and_flushed(tmp_path, monkeypatch) -> None:
+    path = tmp_path / "rag_logs.jsonl"
+    monkeypatch.setattr(graph.logger, "LOG_PATH", path)
+
+    docs = [Document(page_content="c", metadata={"source": "a.pdf"})]
+    for i in range(5):
+        graph.logger.log_interaction(f"q{i}", docs, "{}", cache="miss")
+    graph.logger.flush()
+
+    records = list(iter_log_records(path))
+    assert [r["question"] for r in records] == [f"q{i}" for i in range(5)]
+    assert records[0]["sources"] == ["a.pdf"] and records[0]["cache"] == "miss"
+
+
+def test_contexts_are_stored_once_and_resolved(tmp_path, monkeypatch) -> None:
+    path = tmp_path / "rag_logs.jsonl"
+    monkeypatch.setattr(graph.logger, "LOG_PATH", path)
+
+    popular = Document(page_content="chunk popular " * 50, metadata={"source": "a.pdf"})
+    for i in range(3):
+        other = Document(page_content=f"chunk {i}", metadata={"source": "b.pdf"})
+        graph.logger.log_interaction(f"q{i}", [popular, other], "{}")
+    graph.logger.flush()
+
+    raw = list(read_log_files([path]))
+    assert "contexts" not in raw[0] and len(raw[0]["context_ids"]) == 2
+    assert raw[0]["context_ids"][0] == raw[2]["context_ids"][0]
+    assert len(ChunkStore(chunk_store_path(path))) == 4
+
+    records = list(iter_log_records(path))
+    assert [r["contexts"] for r in records] == [[popular.page_content, f"chunk {i}"] for i in range(3)]
+    assert list(records[0]).index("contexts") == list(raw[0]).index("context_ids")
+
+
+def test_lines_are_written_in_batches(tmp_path) -> None:
+    path = tmp_path / "log.jsonl"
+    writer = LogWriter(batch_size=100, flush_interval=5)
+    for i in range(250):
+        writer.submit(path, line(i))
+    writer.flush()
+
+    assert [r["i"] for r in iter_log_records(path)] == list(range(250))
+    assert writer.stats()["batches"] <= 4
+    writer.close()
+
+
+def test_full_queue_drops_with_drop_policy(tmp_path, monkeypatch) -> None:
+    release = threading.Event()
+    writer = LogWriter(max_queue=1, policy="drop", flush_interval=0)
+    original = writer._write
+    monkeypatch.setattr(writer, "_write", lambda batch: (release.wait(5), original(batch)))
+
+    accepted = [writer.submit(tmp_path / "log.jsonl", line(i)) for i in range(3)]
+    release.set()
+    writer.flush()
+
+    assert not all(accepted)
+    assert writer.stats()["dropped"] == accepted.count(False)
+    assert writer.stats()["written"] == accepted.count(True)
+    writer.close()
+
+
+def test_rotation_by_size_compresses_segments(tmp_path) -> None:
+    path = tmp_path / "log.jsonl"
+    writer = LogWriter(max_bytes=500, flush_interval=0)
+    for i in range(30):
+        writer.submit(path, line(i))
+        writer.flush()
+
+    segments = iter_log_files(path)[:-1]
+    assert segments and all(p.name.endswith(".jsonl.gz") for p in segments)
+    with gzip.open(segments[0], "rt", encoding="utf-8") as f:
+        assert json.loads(f.readline())["i"] == 0
+    assert [r["i"] for r in iter_log_records(path)] == list(range(30))
+    writer.close()
+
+
+def test_rotation_on_new_day(tmp_path) -> None:
+    path = tmp_path / "log.jsonl"
+    path.write_text(json.dumps(line(0)) + "\n", encoding="utf-8")
+    yesterday = time.time() - 86400
+    os.utime(path, (yesterday, yesterday))
+
+    writer = LogWriter(compress=False)
+    writer.submit(path, line(1))
+    writer.flush()
+
+    day = time.strftime("%Y-%m-%d", time.gmtime(yesterday))
+    assert (tmp_path / f"log.{day}.001.jsonl").exists()
+    assert [r["i"] for r in iter_log_records(path)] == [0, 1]
+    writer.close()
+
+
+def _write_from_process(path, worker: int, n: int) -> None:
+    writer = LogWriter(max_bytes=2000, batch_size=7, flush_interval=0)
+    for i in range(n):
+        writer.submit(path, {"worker": worker, "i": i})
+    writer.flush()
+
+
+def test_several_processes_share_one_log(tmp_path) -> None:
+    path = tmp_path / "log.jsonl"
+    procs = [
+        multiprocessing.Process(target=_write_from_process, args=(path, w, 200)) for w in range(4)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+
+    records = list(iter_log_records(path))
+    assert len(records) == 800
+    for w in range(4):
+        assert [r["i"] for r in records if r["worker"] == w] == list(range(200))
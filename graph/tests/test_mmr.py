@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+from graph.mmr import (
+    afetch_candidates,
+    amulti_query_mmr,
+    fetch_candidates,
+    mmr_select,
+    multi_query_mmr,
+    relevance_from_cosine,
+)
+
+
+class TableEmbeddings(Embeddings):
+    """Fixed vectors per text; counts the texts it is asked to embed."""
+
+    def __init__(self, table):
+        self.table = table
+        self.texts = 0
+
+    def embed_documents(self, texts):
+        self.texts += len(texts)
+        return [self.table[t] for t in texts]
+
+    def embed_query(self, text):
+        return self.table[text]
+
+
+VECTORS = {
+    "acero a": [1.0, 0.0, 0.0],
+    "acero b": [0.99, 0.14, 0.0],
+    "acero c": [0.9, 0.0, 0.43],
+    "aluminio": [0.0, 1.0, 0.0],
+    "cobre": [0.0, 0.0, 1.0],
+}
+
+
+def test_matches_langchain_for_a_single_query() -> None:
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=16)
+    candidates = rng.normal(size=(40, 16))
+
+    expected = maximal_marginal_relevance(query, candidates.tolist(), k=8, lambda_mult=0.5)
+
+    assert mmr_select([query], candidates, k=8, lambda_mult=0.5) == expected
+
+
+def test_near_duplicates_are_skipped() -> None:
+    vectors = [VECTORS[t] for t in ("acero a", "acero b", "cobre")]
+
+    picked = mmr_select([[1.0, 0.0, 0.3]], vectors, k=2, lambda_mult=0.5)
+
+    assert picked == [0, 2]
+
+
+def test_every_query_contributes_relevance() -> None:
+    vectors = [VECTORS[t] for t in ("acero a", "acero b", "aluminio")]
+
+    picked = mmr_select([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], vectors, k=2, lambda_mult=0.9)
+
+    assert set(picked) == {0, 2}
+
+
+def test_score_threshold_is_enforced() -> None:
+    vectors = [VECTORS[t] for t in ("acero a", "acero c", "cobre")]
+    cosine = np.array([1.0, 0.9, 0.0])
+    threshold = float(relevance_from_cosine(cosine)[1])
+
+    assert mmr_select([[1.0, 0.0, 0.0]], vectors, k=3, score_threshold=threshold) == [0, 1]
+    assert mmr_select([[0.0, 1.0, 0.0]], vectors, k=3, score_threshold=threshold) == []
+
+
+def test_pools_candidates_from_chroma_and_faiss(tmp_path) -> None:
+    embeddings = TableEmbeddings(VECTORS)
+    base = Chroma(
+        collection_name="test",
+        persist_directory=str(tmp_path / "chroma"),
+        embedding_function=embeddings,
+    )
+    base.add_documents([Document(page_content=t) for t in ("acero a", "acero b", "cobre")])
+    session = FAISS.from_documents(
+        [Document(page_content=t) for t in ("acero a", "aluminio")], embeddings
+    )
+    embeddings.texts = 0
+    queries = [VECTORS["acero a"], VECTORS["aluminio"]]
+
+    docs = multi_query_mmr([base, session], queries, embeddings, k=2, score_threshold=0.5)
+    adocs = asyncio.run(
+        amulti_query_mmr([base, session], queries, embeddings, k=2, score_threshold=0.5)
+    )
+
+    assert [d.page_content for d in docs] == [d.page_content for d in adocs]
+    assert {d.page_content for d in docs} == {"acero a", "aluminio"}
+    # Chroma returns its stored vectors; only the FAISS candidates are looked up
+    assert embeddings.texts == 2 * 2
+
+
+def test_session_store_keeps_its_reserved_slots(tmp_path) -> None:
+    vectors = {f"acero {i}": [1.0, 0.02 * i, 0.0] for i in range(6)}
+    vectors["acero sesión"] = [0.8, 0.0, 0.6]
+    embeddings = TableEmbeddings(vectors)
+    base = Chroma(
+        collection_name="test",
+        persist_directory=str(tmp_path / "chroma"),
+        embedding_function=embeddings,
+    )
+    base.add_documents([Document(page_content=f"acero {i}") for i in range(6)])
+    session = FAISS.from_documents([Document(page_content="acero sesión")], embeddings)
+    query = [[1.0, 0.0, 0.0]]
+
+    # Pure relevance: the knowledge base fills every slot
+    crowded = multi_query_mmr([base, session], query, embeddings, k=3, lambda_mult=1.0)
+    kept = multi_query_mmr(
+        [base, session], query, embeddings, k=3, lambda_mult=1.0, min_per_store=[0, 1]
+    )
+
+    assert "acero sesión" not in {d.page_content for d in crowded}
+    assert [d.page_content for d in kept] == ["acero sesión", "acero 0", "acero 1"]
+
+
+def test_query_vectors_are_searched_in_parallel() -> None:
+    embeddings = TableEmbeddings(VECTORS)
+    store = FAISS.from_documents([Document(page_content=t) for t in VECTORS], embeddings)
+    search = store.similarity_search_by_vector
+
+    def slow_search(vector, k):
+        time.sleep(0.1)
+        return search(vector, k=k)
+
+    store.similarity_search_by_vector = slow_search
+    queries = [VECTORS[t] for t in ("acero a", "aluminio", "cobre", "acero c")]
+
+    start = time.perf_counter()
+    docs, vectors = fetch_candidates(store, queries, embeddings, fetch_k=2)
+    elapsed = time.perf_counter() - start
+    astart = time.perf_counter()
+    adocs, _ = asyncio.run(afetch_candidates(store, queries, embeddings, fetch_k=2))
+    aelapsed = time.perf_counter() - astart
+
+    assert [d.page_content for d in docs] == [d.page_content for d in adocs]
+    assert len(docs) == len(vectors) > 4
+    assert elapsed < 0.3 and aelapsed < 0.3
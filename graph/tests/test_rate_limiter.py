@@ -0,0 +1,117 @@
+import asyncio
+import importlib
+import time
+
+import openai
+from langchain_openai import ChatOpenAI
+
+from graph.llm import http_clients
+from graph.rate_limiter import GENERATION_LANE, GRADER_LANE, LLMScheduler, TokenUsageDebit
+
+# The httpx the SDK's clients are built on (newer openai releases ship their own fork)
+httpx = importlib.import_module(openai.DefaultHttpxClient.__mro__[1].__module__.split(".")[0])
+
+
+def test_generation_lane_goes_first() -> None:
+    # 10 requests/s with room for one at a time
+    scheduler = LLMScheduler(rpm=600, tpm=0, burst_seconds=0.1)
+    order = []
+
+    async def call(lane, name):
+        await scheduler.aacquire(lane)
+        order.append(name)
+
+    async def run():
+        await scheduler.aacquire(GRADER_LANE)  # empties the bucket
+        graders = [asyncio.create_task(call(GRADER_LANE, f"grader{i}")) for i in range(3)]
+        await asyncio.sleep(0.01)
+        generation = asyncio.create_task(call(GENERATION_LANE, "generation"))
+        await asyncio.gather(*graders, generation)
+
+    asyncio.run(run())
+
+    assert order == ["generation", "grader0", "grader1", "grader2"]
+
+
+def test_429_pauses_every_lane() -> None:
+    scheduler = LLMScheduler(rpm=0, tpm=0)
+    scheduler.observe_response(429, {"retry-after-ms": "200"})
+
+    start = time.perf_counter()
+    scheduler.acquire(GENERATION_LANE)
+
+    assert time.perf_counter() - start >= 0.18
+    assert scheduler.rate_limited == 1
+
+
+def test_backoff_doubles_without_retry_after() -> None:
+    scheduler = LLMScheduler(rpm=0, tpm=0, backoff=1, backoff_max=3)
+
+    pauses = []
+    for _ in range(3):
+        scheduler.observe_response(429, {})
+        pauses.append(scheduler.stats()["paused_for"])
+
+    assert 1 <= pauses[0] < 1.2
+    assert 2 <= pauses[1] < 2.3
+    assert 3 <= pauses[2] < 3.4
+    assert scheduler.acquire(GRADER_LANE, blocking=False) is False
+
+
+def test_token_debit_holds_next_call() -> None:
+    # 100 tokens/s, bucket of 10
+    scheduler = LLMScheduler(rpm=0, tpm=6000, burst_seconds=0.1)
+    scheduler.debit(40)
+
+    start = time.perf_counter()
+    scheduler.acquire(GRADER_LANE)
+
+    # From -30 back above zero takes ~0.31s
+    assert time.perf_counter() - start >= 0.25
+
+
+def test_remaining_requests_header_lowers_the_bucket() -> None:
+    scheduler = LLMScheduler(rpm=600, tpm=0, burst_seconds=5)
+    scheduler.observe_response(200, {"x-ratelimit-remaining-requests": "0"})
+
+    assert scheduler.acquire(GRADER_LANE, blocking=False) is False
+
+
+def test_chat_model_through_fake_server() -> None:
+    """First response is a 429: the SDK retries it, the scheduler pauses and debits the usage."""
+    scheduler = LLMScheduler(rpm=600, tpm=60000)
+    responses = []
+
+    def server(request: httpx.Request) -> httpx.Response:
+        responses.append(request.url.path)
+        if len(responses) == 1:
+            return httpx.Response(429, headers={"retry-after-ms": "50"}, json={"error": {"message": "slow down"}})
+        return httpx.Response(200, json={
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4.1",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "hola"},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 30, "completion_tokens": 20, "total_tokens": 50},
+        })
+
+    client, _ = http_clients(scheduler, transport=httpx.MockTransport(server))
+    llm = ChatOpenAI(
+        model="gpt-4.1",
+        api_key="test",
+        http_client=client,
+        max_retries=1,
+        rate_limiter=scheduler.limiter(GRADER_LANE),
+        callbacks=[TokenUsageDebit(scheduler)],
+    )
+
+    assert llm.invoke("hola").content == "hola"
+    assert len(responses) == 2
+    assert scheduler.rate_limited == 1
+    assert scheduler.granted == 1
+    # 50 tokens debited from a full bucket of 5000
+    assert scheduler._tokens.level < 4960
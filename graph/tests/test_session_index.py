@@ -0,0 +1,62 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from graph.session_index import SessionIndexCache, hash_documents
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return super().embed_documents(texts)
+
+
+def make_docs(tag: str):
+    return [
+        Document(page_content=f"{tag} page {i}", metadata={"source": tag, "page": i})
+        for i in range(3)
+    ]
+
+
+def test_hash_depends_on_content_and_metadata() -> None:
+    docs = make_docs("a")
+    assert hash_documents(docs) == hash_documents(make_docs("a"))
+    assert hash_documents(docs) != hash_documents(make_docs("b"))
+
+    moved = make_docs("a")
+    moved[0].metadata["page"] = 7
+    assert hash_documents(docs) != hash_documents(moved)
+
+
+def test_index_is_built_once_and_reused() -> None:
+    cache = SessionIndexCache(max_entries=4)
+    embeddings = CountingEmbeddings(size=8)
+
+    first = cache.get_or_build(make_docs("a"), embeddings)
+    second = cache.get_or_build(make_docs("a"), embeddings)
+
+    assert first is second
+    assert embeddings.calls == 1
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["build_seconds"] >= 0
+
+
+def test_lru_eviction_across_sessions() -> None:
+    cache = SessionIndexCache(max_entries=2)
+    embeddings = CountingEmbeddings(size=8)
+
+    cache.get_or_build(make_docs("a"), embeddings)
+    cache.get_or_build(make_docs("b"), embeddings)
+    cache.get_or_build(make_docs("a"), embeddings)  # "b" is now least recent
+    cache.get_or_build(make_docs("c"), embeddings)
+
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] == 1
+
+    cache.get_or_build(make_docs("a"), embeddings)
+    assert embeddings.calls == 3
+    cache.get_or_build(make_docs("b"), embeddings)
+    assert embeddings.calls == 4
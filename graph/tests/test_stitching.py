@@ -0,0 +1,49 @@
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from graph.stitching import overlap, stitch_neighbors
+
+MATERIALS = ["acero", "aluminio", "cobre", "latón", "titanio", "zinc", "níquel", "plomo"]
+TEXT = " ".join(
+    f"El {m} de la pieza {i} se recicla en la planta {i * 7} con un rendimiento del {90 - i}%."
+    for i, m in enumerate(MATERIALS * 2)
+)
+
+
+def split(text: str, **metadata):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=60)
+    return splitter.split_documents([Document(page_content=text, metadata=metadata)])
+
+
+def test_overlap_of_splitter_neighbours() -> None:
+    a, b = (d.page_content for d in split(TEXT)[:2])
+
+    n = overlap(a, b)
+
+    assert n >= 20
+    assert a.endswith(b[:n])
+    assert overlap(b, a) == 0
+
+
+def test_neighbours_are_stitched_back_in_rank_order() -> None:
+    chunks = split(TEXT, source="guia.pdf", page=3)
+    other = Document(page_content="Otro documento", metadata={"source": "otro.pdf", "page": 3})
+    # Ranked out of order, with another source in between
+    docs = [chunks[2], other, chunks[0], chunks[1]]
+
+    stitched = stitch_neighbors(docs)
+
+    assert [d.metadata["source"] for d in stitched] == ["guia.pdf", "otro.pdf"]
+    assert stitched[0].page_content in TEXT
+    assert all(c.page_content in stitched[0].page_content for c in chunks[:3])
+    assert stitched[0].metadata["stitched_chunks"] == 3
+    assert stitched[1] is other
+
+
+def test_other_pages_and_unrelated_chunks_stay_apart() -> None:
+    chunks = split(TEXT, source="guia.pdf", page=3)
+    moved = Document(page_content=chunks[1].page_content, metadata={"source": "guia.pdf", "page": 4})
+    far = chunks[-1]
+    docs = [chunks[0], moved, far]
+
+    assert stitch_neighbors(docs) == docs
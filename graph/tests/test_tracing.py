@@ -0,0 +1,124 @@
+import asyncio
+import itertools
+import json
+from typing import List, TypedDict
+
+from langchain_core.documents import Document
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import END, StateGraph
+
+from graph.consts import GENERATE, GRADE_DOCUMENTS, GRADE_GENERATION, RETRIEVE
+from graph.logger import LogWriter
+from graph.metrics import Metrics
+from graph.tracing import TraceRecorder
+
+
+class State(TypedDict):
+    question: str
+    documents: List[Document]
+    generation: str
+
+
+def build_app():
+    """Same shape as graph.graph: generate is re-run once before the router accepts it."""
+    llm = GenericFakeChatModel(
+        messages=itertools.cycle(
+            [AIMessage(content="ok", usage_metadata={"input_tokens": 10, "output_tokens": 2, "total_tokens": 12})]
+        )
+    )
+    decisions = {}
+
+    def retrieve(state):
+        return {"documents": [Document(page_content=f"chunk {i}") for i in range(4)]}
+
+    def grade_documents(state):
+        return {"documents": state["documents"][:3]}
+
+    def generate(state):
+        return {"generation": llm.invoke(state["question"]).content}
+
+    def router(state):
+        llm.invoke("grounded?")
+        n = decisions[state["question"]] = decisions.get(state["question"], 0) + 1
+        return "not supported" if n == 1 else "useful"
+
+    workflow = StateGraph(State)
+    workflow.add_node(RETRIEVE, RunnableLambda(retrieve))
+    workflow.add_node(GRADE_DOCUMENTS, RunnableLambda(grade_documents))
+    workflow.add_node(GENERATE, RunnableLambda(generate))
+    workflow.set_entry_point(RETRIEVE)
+    workflow.add_edge(RETRIEVE, GRADE_DOCUMENTS)
+    workflow.add_edge(GRADE_DOCUMENTS, GENERATE)
+    workflow.add_conditional_edges(
+        GENERATE,
+        RunnableLambda(router, name=GRADE_GENERATION),
+        {"not supported": GENERATE, "useful": END},
+    )
+    return workflow.compile()
+
+
+def read_traces(recorder, path):
+    recorder.flush()
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_spans_per_node_and_retry(tmp_path) -> None:
+    path = tmp_path / "traces.jsonl"
+    recorder = TraceRecorder(path, LogWriter(chunk_store=False, flush_interval=0.01))
+
+    build_app().invoke(
+        {"question": "q"}, config={"callbacks": [recorder], "metadata": {"request_id": "req-1"}}
+    )
+
+    [trace] = read_traces(recorder, path)
+    assert trace["request_id"] == "req-1"
+    assert trace["status"] == "ok"
+    assert [(s["node"], s["attempt"]) for s in trace["spans"]] == [
+        (RETRIEVE, 1),
+        (GRADE_DOCUMENTS, 1),
+        (GENERATE, 1),
+        (GRADE_GENERATION, 1),
+        (GENERATE, 2),
+        (GRADE_GENERATION, 2),
+    ]
+    assert trace["retries"] == {GENERATE: 1, GRADE_GENERATION: 1}
+
+    spans = trace["spans"]
+    assert spans[0]["documents_out"] == 4
+    assert spans[1]["documents_in"] == 4 and spans[1]["documents_out"] == 3
+    assert [s.get("decision") for s in spans[3::2]] == ["not supported", "useful"]
+    # Each LLM call is counted in the innermost span, not also in generate
+    assert [s["llm_calls"] for s in spans[2:]] == [1, 1, 1, 1]
+    assert spans[2]["prompt_tokens"] == 10 and spans[2]["completion_tokens"] == 2
+    assert all(s["seconds"] is not None for s in spans)
+
+
+def test_async_runs_are_traced_separately(tmp_path) -> None:
+    path = tmp_path / "traces.jsonl"
+    recorder = TraceRecorder(path, LogWriter(chunk_store=False, flush_interval=0.01))
+    app = build_app().with_config(callbacks=[recorder])
+
+    async def run():
+        await asyncio.gather(*(app.ainvoke({"question": f"q{i}"}) for i in range(5)))
+
+    asyncio.run(run())
+
+    traces = read_traces(recorder, path)
+    assert len(traces) == 5
+    assert len({t["request_id"] for t in traces}) == 5
+    assert all(len(t["spans"]) == 6 for t in traces)
+    assert all(sum(s["llm_calls"] for s in t["spans"]) == 4 for t in traces)
+
+
+def test_prometheus_text() -> None:
+    registry = Metrics()
+    registry.incr("llm_calls_generate", 3)
+    registry.observe("node_seconds_retrieve", 0.5)
+
+    text = registry.to_prometheus()
+
+    assert "rag_llm_calls_generate_total 3" in text
+    assert 'rag_node_seconds_retrieve{quantile="0.95"} 0.5' in text
+    assert "rag_node_seconds_retrieve_count 1" in text
@@ -0,0 +1,234 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from graph.consts import GENERATE, GRADE_DOCUMENTS, GRADE_GENERATION, RETRIEVE
+from graph.logger import LogWriter
+from graph.metrics import metrics
+
+# Per-request spans of the graph nodes, appended to RAG_TRACE_PATH
+RAG_TRACING = os.getenv("RAG_TRACING", "1") != "0"
+TRACE_PATH = Path(os.getenv("RAG_TRACE_PATH", "./rag_traces.jsonl"))
+# Level of the graph's progress banners ("---RETRIEVE---" and friends)
+RAG_LOG_LEVEL = os.getenv("RAG_LOG_LEVEL", "INFO").upper()
+
+# Runs that get a span
+TRACED_NODES = (RETRIEVE, GRADE_DOCUMENTS, GENERATE, GRADE_GENERATION)
+
+
+def configure_logging(level: str = RAG_LOG_LEVEL, names: Sequence[str] = ("graph",)) -> None:
+    """
+    Print the log records of the graph (and of any other `names`, such as
+    an entry point's own logger) to stdout as bare messages, like the
+    banners used to be. Entry points call this; as a library the graph
+    leaves logging configuration to its host.
+    """
+    for name in names:
+        root = logging.getLogger(name)
+        root.setLevel(level)
+        if not any(getattr(h, "_rag_banner", False) for h in root.handlers):
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            handler._rag_banner = True
+            root.addHandler(handler)
+            root.propagate = False
+
+
+def _document_count(payload) -> Optional[int]:
+    if isinstance(payload, dict) and isinstance(payload.get("documents"), list):
+        return len(payload["documents"])
+    return None
+
+
+def token_usage(response) -> Tuple[int, int]:
+    """(prompt, completion) tokens of an LLMResult; (0, 0) if the provider reported none."""
+    prompt = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+    if not (prompt or completion):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt = usage.get("prompt_tokens", 0)
+        completion = usage.get("completion_tokens", 0)
+    return prompt, completion
+
+
+class _Request:
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.timestamp = datetime.now(timezone.utc).isoformat()
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.attempts: Dict[str, int] = defaultdict(int)
+
+
+class _Span:
+    def __init__(self, request: _Request, node: str, parent: Optional["_Span"], inputs):
+        request.attempts[node] += 1
+        self.parent = parent
+        self.started = time.perf_counter()
+        # Time spent in spans nested in this one (the router runs inside GENERATE)
+        self.nested = 0.0
+        self.data: Dict[str, Any] = {
+            "node": node,
+            "attempt": request.attempts[node],
+            "offset": round(self.started - request.started, 4),
+            "seconds": None,
+            "llm_calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+        documents = _document_count(inputs)
+        if documents is not None:
+            self.data["documents_in"] = documents
+        request.spans.append(self.data)
+
+
+class TraceRecorder(BaseCallbackHandler):
+    """
+    Callback handler that turns each graph run into one trace record: a
+    span per run of retrieve, grade_documents, generate and the grading
+    router with its wall time (not counting nested spans), LLM calls,
+    prompt/completion tokens, documents in and out, and which attempt it
+    was (generate re-runs after an ungrounded answer).
+
+    The request ID is the `request_id` in the run metadata, or the root
+    run ID. Finished traces are appended to `path` as JSONL by a background
+    writer, and their totals go to the metrics registry for /metrics.
+    """
+
+    # Called in the event loop thread for async runs, instead of through an
+    # executor: the bookkeeping is cheap, and events stay in order
+    run_inline = True
+
+    def __init__(self, path: Optional[Path] = None, writer: Optional[LogWriter] = None):
+        self.path = path
+        self._writer = writer or LogWriter(chunk_store=False)
+        self._lock = threading.Lock()
+        # run ID -> (request, innermost span around the run)
+        self._runs: Dict[UUID, Tuple[_Request, Optional[_Span]]] = {}
+        self._span_runs: Dict[UUID, _Span] = {}
+        self._roots: Dict[UUID, _Request] = {}
+
+    def on_chain_start(
+        self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, name=None, **kwargs
+    ):
+        with self._lock:
+            parent = self._runs.get(parent_run_id)
+            if parent is None:
+                request = _Request((metadata or {}).get("request_id") or str(run_id))
+                self._roots[run_id] = request
+                self._runs[run_id] = (request, None)
+                return
+            request, span = parent
+            # A node's own RunnableLambda runs inside a step of the same name
+            if name in TRACED_NODES and (span is None or span.data["node"] != name):
+                span = _Span(request, name, span, inputs)
+                self._span_runs[run_id] = span
+            self._runs[run_id] = (request, span)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id, outputs, None)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, None, error)
+
+    def _end(self, run_id, outputs, error) -> None:
+        with self._lock:
+            self._runs.pop(run_id, None)
+            span = self._span_runs.pop(run_id, None)
+            if span is not None:
+                elapsed = time.perf_counter() - span.started
+                span.data["seconds"] = round(elapsed - span.nested, 4)
+                if span.parent is not None:
+                    span.parent.nested += elapsed
+                documents = _document_count(outputs)
+                if documents is not None:
+                    span.data["documents_out"] = documents
+                if isinstance(outputs, str):
+                    span.data["decision"] = outputs
+                if error is not None:
+                    span.data["error"] = type(error).__name__
+            request = self._roots.pop(run_id, None)
+        if request is not None:
+            self._finish(request, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._llm_start(run_id, parent_run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._llm_start(run_id, parent_run_id)
+
+    def _llm_start(self, run_id, parent_run_id) -> None:
+        with self._lock:
+            parent = self._runs.get(parent_run_id)
+            if parent is None:
+                return
+            self._runs[run_id] = parent
+            if parent[1] is not None:
+                parent[1].data["llm_calls"] += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt, completion = token_usage(response)
+        with self._lock:
+            entry = self._runs.pop(run_id, None)
+            if entry is not None and entry[1] is not None:
+                entry[1].data["prompt_tokens"] += prompt
+                entry[1].data["completion_tokens"] += completion
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    def _finish(self, request: _Request, error) -> None:
+        seconds = time.perf_counter() - request.started
+        record = {
+            "request_id": request.request_id,
+            "timestamp": request.timestamp,
+            "seconds": round(seconds, 4),
+            "status": "ok" if error is None else "error",
+            "spans": request.spans,
+            "retries": {node: n - 1 for node, n in request.attempts.items() if n > 1},
+        }
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+
+        metrics.incr("requests")
+        metrics.observe("request_seconds", seconds)
+        if error is not None:
+            metrics.incr("request_errors")
+        for span in request.spans:
+            node = span["node"]
+            metrics.incr(f"node_runs_{node}")
+            metrics.incr(f"llm_calls_{node}", span["llm_calls"])
+            metrics.incr(f"prompt_tokens_{node}", span["prompt_tokens"])
+            metrics.incr(f"completion_tokens_{node}", span["completion_tokens"])
+            if span["seconds"] is not None:
+                metrics.observe(f"node_seconds_{node}", span["seconds"])
+            if span["attempt"] > 1:
+                metrics.incr(f"node_retries_{node}")
+            if "documents_out" in span:
+                metrics.observe(f"documents_out_{node}", span["documents_out"])
+
+        self._writer.submit(self.path or TRACE_PATH, record)
+
+    def flush(self) -> None:
+        self._writer.flush()
+
+
+@lru_cache(maxsize=1)
+def get_tracer() -> TraceRecorder:
+    return TraceRecorder()
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from graph.answer_cache import normalize_question
+from graph.chains.retrieval_grader import GradeDocuments, grade_prompt
+from graph.disk_cache import DiskCache
+from graph.llm import LLM_MODEL, LLM_TEMPERATURE
+
+VERDICT_CACHE_PATH = Path(os.getenv("VERDICT_CACHE_PATH", "./.cache/verdicts.sqlite"))
+VERDICT_CACHE_MAX_ENTRIES = int(os.getenv("VERDICT_CACHE_MAX_ENTRIES", "100000"))
+
+
+def grader_fingerprint() -> str:
+    """Hash of everything a verdict depends on besides its inputs: prompt, model and schema."""
+    parts = {
+        "prompt": [m.prompt.template for m in grade_prompt.messages],
+        "model": LLM_MODEL,
+        "temperature": LLM_TEMPERATURE,
+        "schema": GradeDocuments.model_json_schema(),
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """
+    Persistent retrieval-grader verdicts per (question, chunk).
+
+    The grader runs at temperature 0, so the verdict for a normalized
+    question and a chunk's page_content does not change until the grader
+    prompt or model does; `version` (the grader fingerprint by default)
+    empties the cache when that happens.
+    """
+
+    def __init__(self, cache: Optional[DiskCache] = None, version: Optional[str] = None):
+        if cache is None:
+            cache = DiskCache(
+                VERDICT_CACHE_PATH,
+                table="verdicts",
+                max_entries=VERDICT_CACHE_MAX_ENTRIES,
+                version=version if version is not None else grader_fingerprint(),
+            )
+        self.cache = cache
+
+    @staticmethod
+    def key(question: str, page_content: str) -> str:
+        return f"{_sha(normalize_question(question))}:{_sha(page_content)}"
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Cached verdicts ("yes" / "no") among `keys`."""
+        return {k: v.decode("utf-8") for k, v in self.cache.get_many(keys).items()}
+
+    def set_many(self, verdicts: Dict[str, str]) -> None:
+        self.cache.set_many({k: v.encode("utf-8") for k, v in verdicts.items()})
+
+    def stats(self):
+        return self.cache.stats()
+
+
+@lru_cache(maxsize=None)
+def get_verdict_cache() -> VerdictCache:
+    return VerdictCache()
@@ -1,62 +1,446 @@
+import argparse
+import hashlib
+import json
+import logging
 import os
-from dotenv import load_dotenv  
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from dotenv import load_dotenv
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from langchain_community.document_loaders import UnstructuredMarkdownLoader, UnstructuredFileLoader
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStoreRetriever
+
+from graph.bm25 import BM25Index
+from graph.embeddings import get_embeddings
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
 
 load_dotenv()
 
-# DOC_DIR = "./docs"
-
-# def load_single_file(path):
-#     ext = path.lower().split(".")[-1]
-
-#     if ext == "pdf":
-#         return PyPDFLoader(path).load()
-#     elif ext in ["txt"]:
-#         return TextLoader(path).load()
-#     elif ext in ["md", "markdown"]:
-#         return UnstructuredMarkdownLoader(path).load()
-#     else:
-#         return UnstructuredFileLoader(path).load()
-
-# all_docs = []
-# visible_files = [
-#     f for f in sorted(os.listdir(DOC_DIR))
-#     if not f.startswith(".")
-# ]
-
-# files = visible_files[:100]
-# for f in files:
-#     path = os.path.join(DOC_DIR, f)
-#     print(f"Loading: {path}")
-#     docs = load_single_file(path)
-#     all_docs.extend(docs)
-
-# text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-#     chunk_size=400, chunk_overlap=50
-# )
-
-# doc_splits = text_splitter.split_documents(all_docs)
-
-# vectorstore = Chroma.from_documents(
-#     documents=doc_splits,
-#     collection_name="rag-chroma",
-#     embedding=OpenAIEmbeddings(model="text-embedding-ada-002"),
-#     persist_directory="./.chroma",
-# ).as_retriever()
-
-retriever = Chroma(
-    collection_name="rag-chroma",
-    persist_directory="./.chroma",
-    embedding_function=OpenAIEmbeddings(model="text-embedding-ada-002"),
-).as_retriever(
-    search_type="mmr",
-    search_kwargs={
-        "k": 6,          
-        "fetch_k": 20,
-        "score_threshold": 0.35,
-    },
-)
\ No newline at end of file
+DOC_DIR = "./docs"
+COLLECTION_NAME = "rag-chroma"
+PERSIST_DIRECTORY = "./.chroma"
+MANIFEST_PATH = Path(PERSIST_DIRECTORY) / "manifest.json"
+
+# Chunks embedded and upserted per Chroma call
+UPSERT_BATCH_SIZE = 128
+
+# Processes parsing and splitting files (1 = serial, in this process)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+# Extracted text per file content hash, so re-runs skip PDF parsing
+EXTRACTED_CACHE_DIR = Path("./.cache/extracted")
+
+logger = logging.getLogger(__name__)
+
+
+def load_single_file(path):
+    # Loaders pull in langchain_community / unstructured: import them only when parsing
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader
+    from langchain_community.document_loaders import UnstructuredMarkdownLoader, UnstructuredFileLoader
+
+    ext = path.lower().split(".")[-1]
+
+    if ext == "pdf":
+        return PyPDFLoader(path).load()
+    elif ext in ["txt"]:
+        return TextLoader(path, encoding="utf-8").load()
+    elif ext in ["md", "markdown"]:
+        return UnstructuredMarkdownLoader(path).load()
+    else:
+        return UnstructuredFileLoader(path).load()
+
+
+def get_text_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        chunk_size=400, chunk_overlap=50
+    )
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_id(rel_path: str, content_hash: str, index: int) -> str:
+    """Stable ID of the index-th chunk of a file version."""
+    return hashlib.sha256(f"{rel_path}\0{content_hash}\0{index}".encode("utf-8")).hexdigest()[:32]
+
+
+# --------------------------
+# Manifest: (path, size, mtime, content hash) -> chunk IDs
+# --------------------------
+
+def load_manifest(path: Path = MANIFEST_PATH) -> Dict[str, Any]:
+    if not path.exists():
+        return {"index_version": "", "files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: Dict[str, Any], path: Path = MANIFEST_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def get_index_version(path: Path = MANIFEST_PATH) -> str:
+    """Changes every time an ingestion run adds, updates or removes chunks."""
+    return load_manifest(path).get("index_version", "")
+
+
+class ManifestVersion:
+    """Index version of the Chroma collection, re-read only when the manifest changes."""
+
+    def __init__(self, path: Path = MANIFEST_PATH):
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._version = ""
+
+    def __call__(self) -> str:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return ""
+        if mtime != self._mtime:
+            self._mtime = mtime
+            self._version = get_index_version(self.path)
+        return self._version
+
+
+def list_documents(doc_dir: Path) -> List[Path]:
+    return [
+        p
+        for p in sorted(doc_dir.rglob("*"))
+        if p.is_file() and not any(part.startswith(".") for part in p.relative_to(doc_dir).parts)
+    ]
+
+
+def scan(doc_dir: Path, manifest: Dict[str, Any], full: bool = False):
+    """
+    Compare the files on disk with the manifest.
+    Returns (changed, unchanged, removed): changed is a list of
+    (rel_path, path, stat, content_hash); the others are lists of rel paths.
+    """
+    known = manifest["files"]
+    changed, unchanged = [], []
+    seen = set()
+
+    for path in list_documents(doc_dir):
+        rel = path.relative_to(doc_dir).as_posix()
+        seen.add(rel)
+        st = path.stat()
+        entry = known.get(rel)
+
+        if not full and entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            unchanged.append(rel)
+            continue
+
+        content_hash = file_sha256(path)
+        if not full and entry and entry["sha256"] == content_hash:
+            # Touched but identical: only refresh the manifest entry
+            entry["mtime"] = st.st_mtime
+            unchanged.append(rel)
+            continue
+
+        changed.append((rel, path, st, content_hash))
+
+    removed = [rel for rel in known if rel not in seen]
+    return changed, unchanged, removed
+
+
+# --------------------------
+# Streaming load -> split -> embed pipeline
+# --------------------------
+
+@lru_cache(maxsize=1)
+def _worker_text_splitter() -> RecursiveCharacterTextSplitter:
+    # Built once per worker process (the tiktoken splitter is not picklable)
+    return get_text_splitter()
+
+
+def load_cached_text(path: Path, content_hash: str, use_text_cache: bool = True) -> List[Document]:
+    """
+    Load a file, reusing the text extracted on a previous run of the same
+    content (keyed by file hash) so PDFs are only parsed once.
+    """
+    cache_file = EXTRACTED_CACHE_DIR / f"{content_hash}.json"
+    if use_text_cache and cache_file.exists():
+        with open(cache_file, "r", encoding="utf-8") as f:
+            pages = json.load(f)
+        return [
+            Document(page_content=p["page_content"], metadata={**p["metadata"], "source": str(path)})
+            for p in pages
+        ]
+
+    docs = load_single_file(str(path))
+    if use_text_cache:
+        EXTRACTED_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                [{"page_content": d.page_content, "metadata": d.metadata} for d in docs],
+                f,
+                ensure_ascii=False,
+                default=str,
+            )
+        os.replace(tmp, cache_file)
+    return docs
+
+
+def load_and_split(task):
+    """
+    Worker: load (or reuse the extracted text of) one file and split it.
+    Returns (rel_path, manifest_entry, chunks, chunk_ids).
+    """
+    rel, path, st, content_hash, splitter, use_text_cache = task
+    splitter = splitter or _worker_text_splitter()
+
+    chunks = splitter.split_documents(load_cached_text(path, content_hash, use_text_cache))
+    ids = [chunk_id(rel, content_hash, i) for i in range(len(chunks))]
+    entry = {
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "sha256": content_hash,
+        "chunk_ids": ids,
+    }
+    return rel, entry, chunks, ids
+
+
+def iter_split_files(tasks, workers: int):
+    """
+    Yield load_and_split results in order. With workers > 1 files are parsed
+    in a process pool, keeping at most 2 * workers files in flight so memory
+    stays bounded however large the corpus is.
+    """
+    if workers <= 1:
+        yield from map(load_and_split, tasks)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = deque()
+        for task in tasks:
+            window.append(pool.submit(load_and_split, task))
+            if len(window) >= 2 * workers:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+def iter_chunk_batches(split_results, batch_size: int):
+    """
+    Regroup per-file chunks into fixed-size batches for the embedder.
+    Yields (docs, ids, completed_files); a file is reported as completed
+    once its last chunk is part of a yielded batch.
+    """
+    docs, ids, completed = [], [], []
+    for rel, entry, file_docs, file_ids in split_results:
+        print(f"Split: {rel} ({len(file_docs)} chunks)")
+        for d, i in zip(file_docs, file_ids):
+            docs.append(d)
+            ids.append(i)
+            if len(docs) == batch_size:
+                yield docs, ids, completed
+                docs, ids, completed = [], [], []
+        completed.append((rel, entry))
+    if docs or completed:
+        yield docs, ids, completed
+
+
+def ingest(
+    doc_dir: str = DOC_DIR,
+    store: Optional["Chroma"] = None,
+    manifest_path: Path = MANIFEST_PATH,
+    batch_size: int = UPSERT_BATCH_SIZE,
+    full: bool = False,
+    splitter: Optional[RecursiveCharacterTextSplitter] = None,
+    workers: int = INGEST_WORKERS,
+    use_text_cache: bool = True,
+) -> Dict[str, Any]:
+    """
+    Incrementally sync `doc_dir` into the Chroma collection.
+
+    Only new or modified files are loaded, split and embedded. Chunks of
+    modified and deleted files are removed first. Files are parsed in a
+    process pool and their chunks streamed to the embedder in batches of
+    `batch_size`. The manifest is saved after every batch, so an
+    interrupted run resumes where it stopped. `full` empties the
+    collection and re-indexes every file.
+    """
+    store = store if store is not None else get_vectorstore()
+    doc_dir = Path(doc_dir)
+    manifest = load_manifest(manifest_path)
+    files = manifest["files"]
+
+    started = time.perf_counter()
+    # Chunks missing from the manifest would never be deleted: start from an
+    # empty collection on --full runs, or if the manifest is gone (or predates
+    # the collection's contents)
+    reset = full or (not files and bool(store.get(limit=1, include=[])["ids"]))
+    if reset:
+        print("Resetting the collection")
+        store.reset_collection()
+        files.clear()
+        save_manifest(manifest, manifest_path)
+
+    changed, unchanged, removed = scan(doc_dir, manifest, full=full)
+    print(
+        f"Files: {len(changed)} new/modified, {len(unchanged)} unchanged, "
+        f"{len(removed)} removed"
+    )
+
+    for rel in removed:
+        print(f"Removing: {rel}")
+        old_ids = files.pop(rel)["chunk_ids"]
+        if old_ids:
+            store.delete(ids=old_ids)
+        save_manifest(manifest, manifest_path)
+
+    for rel, *_ in changed:
+        old_ids = files.pop(rel, {}).get("chunk_ids", [])
+        if old_ids:
+            store.delete(ids=old_ids)
+    if changed:
+        save_manifest(manifest, manifest_path)
+
+    total_chunks = 0
+    embed_seconds = 0.0
+
+    tasks = [
+        (rel, path, st, content_hash, splitter, use_text_cache)
+        for rel, path, st, content_hash in changed
+    ]
+    batches = iter_chunk_batches(iter_split_files(tasks, workers), batch_size)
+    for docs, ids, completed in batches:
+        if docs:
+            t0 = time.perf_counter()
+            store.add_documents(docs, ids=ids)
+            embed_seconds += time.perf_counter() - t0
+            total_chunks += len(docs)
+
+        if completed:
+            files.update(completed)
+            save_manifest(manifest, manifest_path)
+
+    if changed or removed or reset:
+        fingerprint = json.dumps(
+            sorted((rel, entry["sha256"]) for rel, entry in files.items())
+        )
+        manifest["index_version"] = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+    save_manifest(manifest, manifest_path)
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "files_changed": len(changed),
+        "files_unchanged": len(unchanged),
+        "files_removed": len(removed),
+        "chunks_upserted": total_chunks,
+        "seconds": round(elapsed, 3),
+        "chunks_per_second": round(total_chunks / embed_seconds, 2) if embed_seconds else 0.0,
+        "index_version": manifest["index_version"],
+    }
+    print(
+        f"Upserted {total_chunks} chunks in {elapsed:.1f}s "
+        f"({stats['chunks_per_second']} chunks/s embedding + upsert)"
+    )
+    return stats
+
+
+@lru_cache(maxsize=None)
+def get_vectorstore() -> "Chroma":
+    """The persistent rag-chroma collection, opened on first use."""
+    from langchain_chroma import Chroma
+
+    return Chroma(
+        collection_name=COLLECTION_NAME,
+        persist_directory=PERSIST_DIRECTORY,
+        embedding_function=get_embeddings(),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_retriever() -> VectorStoreRetriever:
+    return get_vectorstore().as_retriever(
+        search_type="mmr",
+        search_kwargs={
+            "k": 6,
+            "fetch_k": 20,
+            "score_threshold": 0.35,
+        },
+    )
+
+
+_bm25_lock = threading.Lock()
+_bm25_index: Optional[BM25Index] = None
+_bm25_version: Optional[str] = None
+_manifest_version = ManifestVersion()
+
+
+def get_bm25_index() -> BM25Index:
+    """
+    BM25 index over the same chunks as the Chroma collection, built on first
+    use and rebuilt whenever an ingestion run changes the index version.
+    """
+    global _bm25_index, _bm25_version
+    version = _manifest_version()
+    with _bm25_lock:
+        if _bm25_index is None or _bm25_version != version:
+            started = time.perf_counter()
+            _bm25_index = BM25Index.from_vectorstore(get_vectorstore())
+            _bm25_version = version
+            logger.info(
+                "BM25 index: %d chunks, %d terms (%.2fs)",
+                len(_bm25_index), len(_bm25_index.vocab), time.perf_counter() - started,
+            )
+        return _bm25_index
+
+
+def __getattr__(name):
+    # `from ingestion import vectorstore, retriever` keeps working, lazily
+    if name == "vectorstore":
+        return get_vectorstore()
+    if name == "retriever":
+        return get_retriever()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Incrementally index a documents folder into the rag-chroma collection."
+    )
+    parser.add_argument("--docs", default=DOC_DIR, help="Documents folder (default: ./docs)")
+    parser.add_argument("--batch-size", type=int, default=UPSERT_BATCH_SIZE)
+    parser.add_argument(
+        "--workers", type=int, default=INGEST_WORKERS, help="Parsing processes (1 = serial)"
+    )
+    parser.add_argument(
+        "--no-text-cache", action="store_true", help="Always re-parse files"
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="Empty the collection and re-index every file"
+    )
+    args = parser.parse_args()
+
+    ingest(
+        args.docs,
+        batch_size=args.batch_size,
+        full=args.full,
+        workers=args.workers,
+        use_text_cache=not args.no_text_cache,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,235 @@
+# main.py
+"""
+Ejecuta preguntas contra el grafo RAG con la descripción y el BOM del proyecto.
+
+    python main.py                                          # la pregunta de ejemplo
+    python main.py --preguntas preguntas.jsonl              # lote -> respuestas.jsonl
+    python main.py --preguntas preguntas.csv --concurrencia 16 --salida lote.jsonl
+
+En modo lote, las preguntas (JSONL con "question" o CSV con una columna
+"question"; "id" opcional en ambos) se ejecutan con `abatch_as_completed`
+y cada resultado se añade a la salida en cuanto termina. La propia salida
+hace de checkpoint: al relanzar se saltan las preguntas que ya tienen una
+respuesta correcta y se reintentan las que fallaron (para cada id vale la
+última línea). Cada línea lleva un hash de la descripción y el BOM, y solo
+cuentan las del mismo proyecto: si cambian, se vuelve a responder todo.
+description.txt y el BOM se cargan una sola vez.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Set
+
 from dotenv import load_dotenv
 load_dotenv()
 
-from graph.graph import app
+from graph.graph import get_app
+from graph.tracing import configure_logging
 import pandas as pd
 
-if __name__ == "__main__":
-    print("This is the main module.")
+DESCRIPCION_PATH = "description.txt"
+BOM_PATH = "BOM.xlsx"
+SALIDA_PATH = "respuestas.jsonl"
+# Preguntas en curso a la vez en modo lote
+CONCURRENCIA = 8
+
+PREGUNTA_EJEMPLO = "Ciclos materiales: acero, motores, contrapesos, electrónica, plásticos."
+
+
+def id_pregunta(pregunta: str) -> str:
+    return hashlib.sha1(pregunta.encode("utf-8")).hexdigest()[:16]
+
+
+def hash_proyecto(proyecto: Dict[str, str]) -> str:
+    """Identifica la descripción y el BOM con los que se respondió una pregunta."""
+    contenido = proyecto["description"] + "\0" + proyecto["bom"]
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()[:16]
+
+
+def _filas(path: Path) -> Iterable[Dict[str, Any]]:
+    if path.suffix.lower() == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for linea in f:
+            if linea.strip():
+                yield json.loads(linea)
+
+
+def cargar_preguntas(path) -> List[Dict[str, str]]:
+    """Preguntas con su id (el de la fila, o un hash de la pregunta), sin repetir ids."""
+    preguntas, vistas = [], set()
+    for fila in _filas(Path(path)):
+        pregunta = (fila.get("question") or "").strip()
+        if not pregunta:
+            continue
+        pid = str(fila.get("id") or "").strip() or id_pregunta(pregunta)
+        if pid in vistas:
+            continue
+        vistas.add(pid)
+        preguntas.append({"id": pid, "question": pregunta})
+    return preguntas
+
+
+def ids_completados(salida, proyecto: str) -> Set[str]:
+    """Ids cuya última línea del proyecto `proyecto` (su hash) es una respuesta correcta."""
+    estado: Dict[str, str] = {}
+    try:
+        with open(salida, "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    item = json.loads(linea)
+                except json.JSONDecodeError:
+                    # Línea a medio escribir de una ejecución interrumpida
+                    continue
+                if not isinstance(item, dict) or "id" not in item:
+                    continue
+                if item.get("proyecto") == proyecto:
+                    estado[item["id"]] = item.get("status")
+    except FileNotFoundError:
+        pass
+    return {pid for pid, status in estado.items() if status == "ok"}
+
+
+def _abrir_salida(salida):
+    """Abre la salida para añadir, cerrando antes la línea que una ejecución cortada dejara a medias."""
+    try:
+        with open(salida, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            cortada = f.read(1) != b"\n"
+    except OSError:  # no existe o está vacía
+        cortada = False
+    f = open(salida, "a", encoding="utf-8")
+    if cortada:
+        f.write("\n")
+    return f
+
 
-    # Load description
-    with open("description.txt", "r", encoding="utf-8") as f:
-        description = f.read()
+def cargar_proyecto(descripcion_path=DESCRIPCION_PATH, bom_path=BOM_PATH) -> Dict[str, str]:
+    with open(descripcion_path, "r", encoding="utf-8") as f:
+        descripcion = f.read()
+    bom = pd.read_excel(bom_path).to_markdown(index=False)
+    return {"description": descripcion, "bom": bom}
 
-    # Load BOM Excel
-    df = pd.read_excel("BOM.xlsx")
-    bom = df.to_markdown(index=False)
 
-    # Example question (you may modify this)
-    question = "Ciclos materiales: acero, motores, contrapesos, electrónica, plásticos."
+def estado_inicial(pregunta: str, proyecto: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        "question": pregunta,
+        "bom": proyecto["bom"],
+        "description": proyecto["description"],
+        "generation": "",
+        "documents": [],
+        "session_docs": [],
+    }
 
-    result = app.invoke(
-        input={
-            "question": question,
-            "bom": bom,
-            "description": description,
-        }
+
+def resultado(pregunta: Dict[str, str], salida: Any, proyecto: str) -> Dict[str, Any]:
+    item = {"id": pregunta["id"], "question": pregunta["question"], "proyecto": proyecto}
+    if isinstance(salida, Exception):
+        item.update(status="error", error=f"{type(salida).__name__}: {salida}")
+        return item
+    documentos = salida.get("documents") or []
+    item.update(
+        status="ok",
+        answer=salida.get("generation"),
+        sources=[getattr(d, "metadata", {}).get("source") for d in documentos],
     )
+    return item
+
+
+async def ejecutar_lote(
+    app,
+    preguntas: List[Dict[str, str]],
+    proyecto: Dict[str, str],
+    salida,
+    concurrencia: int = CONCURRENCIA,
+) -> Dict[str, Any]:
+    """Ejecuta las preguntas pendientes y añade cada resultado a `salida` según termina."""
+    huella = hash_proyecto(proyecto)
+    hechas = ids_completados(salida, huella)
+    pendientes = [p for p in preguntas if p["id"] not in hechas]
+    resumen = {
+        "preguntas": len(preguntas),
+        "omitidas": len(preguntas) - len(pendientes),
+        "ok": 0,
+        "fallos": 0,
+    }
+    print(f"Preguntas: {len(preguntas)} ({resumen['omitidas']} ya respondidas, "
+          f"{len(pendientes)} pendientes, concurrencia {concurrencia})")
 
+    inicio = time.perf_counter()
+    if pendientes:
+        entradas = [estado_inicial(p["question"], proyecto) for p in pendientes]
+        # max_concurrency se lee de la primera; el id va a la traza de cada petición
+        configs = [
+            {"max_concurrency": concurrencia, "metadata": {"request_id": p["id"]}}
+            for p in pendientes
+        ]
+        with _abrir_salida(salida) as f:
+            async for i, out in app.abatch_as_completed(entradas, configs, return_exceptions=True):
+                item = resultado(pendientes[i], out, huella)
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+                f.flush()
+                resumen["ok" if item["status"] == "ok" else "fallos"] += 1
+                hechas_ahora = resumen["ok"] + resumen["fallos"]
+                ritmo = hechas_ahora / (time.perf_counter() - inicio)
+                estado = "ok" if item["status"] == "ok" else f"FALLO ({item['error']})"
+                print(f"[{hechas_ahora}/{len(pendientes)}] {item['id']}: {estado} "
+                      f"- {ritmo * 60:.1f} preguntas/min")
+
+    segundos = time.perf_counter() - inicio
+    resumen["segundos"] = round(segundos, 2)
+    resumen["preguntas_por_minuto"] = (
+        round(60 * (resumen["ok"] + resumen["fallos"]) / segundos, 2) if segundos > 0 else None
+    )
+    return resumen
+
+
+def pregunta_unica(proyecto: Dict[str, str], pregunta: str) -> None:
+    configure_logging()
+    result = get_app().invoke(input=estado_inicial(pregunta, proyecto))
     print(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ejecuta preguntas contra el grafo RAG.")
+    parser.add_argument("--preguntas", help="JSONL o CSV con las preguntas (modo lote)")
+    parser.add_argument("--pregunta", default=PREGUNTA_EJEMPLO, help="Pregunta única")
+    parser.add_argument("--salida", default=SALIDA_PATH)
+    parser.add_argument("--concurrencia", type=int, default=CONCURRENCIA)
+    parser.add_argument("--descripcion", default=DESCRIPCION_PATH)
+    parser.add_argument("--bom", default=BOM_PATH)
+    parser.add_argument("--nivel-log", default="WARNING",
+                        help="Nivel de los mensajes del grafo en modo lote")
+    parser.add_argument("--puerto-metricas", type=int,
+                        help="Sirve /metrics (Prometheus) en este puerto durante el lote")
+    args = parser.parse_args()
+
+    proyecto = cargar_proyecto(args.descripcion, args.bom)
+    if not args.preguntas:
+        pregunta_unica(proyecto, args.pregunta)
+        return
+
+    configure_logging(args.nivel_log)
+    if args.puerto_metricas:
+        from graph.metrics import serve_metrics
+
+        serve_metrics(args.puerto_metricas)
+        print(f"Métricas en http://localhost:{args.puerto_metricas}/metrics")
+
+    preguntas = cargar_preguntas(args.preguntas)
+    resumen = asyncio.run(
+        ejecutar_lote(get_app(), preguntas, proyecto, args.salida, args.concurrencia)
+    )
+    print(json.dumps(resumen, indent=2, ensure_ascii=False))
+    print(f"Resultados en: {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# migrate_logs.py
+"""
+Convierte logs antiguos (textos completos en "contexts") al formato con
+almacén de chunks: cada texto distinto se guarda una sola vez en
+<log>.chunks.sqlite y los registros solo guardan sus IDs ("context_ids").
+
+    python migrate_logs.py                      # rag_logs.jsonl y sus segmentos
+    python migrate_logs.py logs/topk3.jsonl logs/topk5.jsonl
+
+Mide el tamaño en disco y el tiempo de carga antes y después.
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from graph.chunk_store import ChunkStore, chunk_store_path
+from graph.logger import (
+    LOG_PATH,
+    compact_records,
+    iter_log_files,
+    iter_log_records,
+    log_lock,
+    read_log_files,
+    resolve_records,
+)
+
+
+def tamano_total(path: Path) -> int:
+    ficheros = iter_log_files(path)
+    store = chunk_store_path(path)
+    ficheros += [p for p in (store, Path(f"{store}-wal")) if p.exists()]
+    return sum(p.stat().st_size for p in ficheros)
+
+
+def tiempo_de_carga(path: Path) -> float:
+    t0 = time.perf_counter()
+    for _ in iter_log_records(path):
+        pass
+    return time.perf_counter() - t0
+
+
+def escribir(file: Path, registros: List[Dict[str, Any]]) -> None:
+    opener = gzip.open if file.suffix == ".gz" else open
+    tmp = file.with_name(file.name + ".migrating")
+    with opener(tmp, "wt", encoding="utf-8") as f:
+        for r in registros:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    os.replace(tmp, file)
+
+
+def migrar(path: Path) -> Dict[str, Any]:
+    antes = {"bytes": tamano_total(path), "load_seconds": round(tiempo_de_carga(path), 4)}
+
+    store = ChunkStore(chunk_store_path(path))
+    migrados = 0
+    # Bloqueo compartido con el logger: nadie escribe ni rota mientras tanto
+    with log_lock(path):
+        for file in iter_log_files(path):
+            registros = list(read_log_files([file]))
+            if not any("contexts" in r for r in registros):
+                continue
+            compactados = compact_records(registros, store)
+            if resolve_records(compactados, store) != registros:
+                raise RuntimeError(f"La conversión de {file} no es reversible; no se modifica")
+            escribir(file, compactados)
+            migrados += 1
+            print(f"Migrado: {file} ({len(registros)} registros)")
+    chunks = len(store)
+    store.close()
+
+    despues = {"bytes": tamano_total(path), "load_seconds": round(tiempo_de_carga(path), 4)}
+    return {
+        "log": str(path),
+        "files_migrated": migrados,
+        "chunks": chunks,
+        "before": antes,
+        "after": despues,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra logs RAG al almacén de chunks.")
+    parser.add_argument("logs", nargs="*", default=[str(LOG_PATH)])
+    args = parser.parse_args()
+
+    for log in args.logs:
+        path = Path(log)
+        if not iter_log_files(path):
+            print(f"No existe: {path}")
+            continue
+        resultado = migrar(path)
+        print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
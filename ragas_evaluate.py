@@ -1,59 +1,38 @@
-import json
-from datasets import Dataset
+import asyncio
+
 from dotenv import load_dotenv
 load_dotenv()
-from ragas import evaluate
 from ragas.metrics import (
     # context_precision,   #  De momento los quitamos
     # context_recall,
     faithfulness,
     answer_relevancy,
 )
-from ragas.embeddings import HuggingfaceEmbeddings
-from langchain_openai import OpenAIEmbeddings, OpenAI
-from ragas.llms import llm_factory
-llm = llm_factory("gpt-4.1", client=OpenAI())
+from ragas_runner import cargar_muestras, crear_juez, ejecutar, preparar_metricas, tabla
 
-embedding = OpenAIEmbeddings(model="text-embedding-ada-002")  
 LOG_PATH = "rag_logs.jsonl"
 
 
-def cargar_logs():
-    datos = []
-    with open(LOG_PATH, "r", encoding="utf-8") as f:
-        for linea in f:
-            item = json.loads(linea.strip())
-            datos.append(
-                {
-                    "question": item["question"],
-                    "answer": item["answer"],
-                    "contexts": item["contexts"],
-                }
-            )
-    return datos
-
-
 def main():
     print(" Cargando registros de interacción RAG desde:", LOG_PATH)
-    registros = cargar_logs()
+    # Incluye los segmentos rotados (.jsonl.gz) del log
+    registros = cargar_muestras(LOG_PATH)
 
     if len(registros) == 0:
         print(" No se encontraron logs. Ejecuta el sistema RAG primero.")
         return
 
-    ds = Dataset.from_list(registros)
-
     print("\nEjecutando evaluación con RAGAS...\n")
 
     # 🔧 De momento solo usamos métricas que NO requieren 'reference'
-    resultado = evaluate(
-        dataset=ds,
-        metrics=[faithfulness, answer_relevancy],
-        embeddings=embedding,
-    )
+    # Las puntuaciones ya calculadas salen de la caché: solo se evalúan
+    # los registros nuevos desde la última ejecución
+    llm, embedding = crear_juez()
+    metricas = preparar_metricas([faithfulness, answer_relevancy], llm, embedding)
+    resultado = asyncio.run(ejecutar({LOG_PATH: registros}, metricas))
 
     print("\nResultados de la evaluación:")
-    print(resultado)
+    print(tabla(resultado))
 
     print("\nExplicación de las métricas usadas ahora mismo:")
     print("""
@@ -1,7 +1,15 @@
 # ragas_experiments.py
+"""
+Compara configuraciones del recuperador evaluando sus logs con RAGAS.
+
+Los experimentos se evalúan en paralelo y las puntuaciones se guardan por
+muestra (ragas_runner.py): una ejecución interrumpida se reanuda y las
+muestras ya puntuadas no se vuelven a enviar al juez.
+"""
+import asyncio
 import json
-from datasets import Dataset
-from ragas import evaluate
+import time
+
 from ragas.metrics import (
     context_precision,
     context_recall,
@@ -9,6 +17,8 @@ from ragas.metrics import (
     answer_relevancy,
 )
 
+from ragas_runner import cargar_muestras, crear_juez, ejecutar, preparar_metricas, tabla
+
 EXPERIMENTOS = [
     {
         "nombre": "topk_3",
@@ -25,79 +35,49 @@ EXPERIMENTOS = [
     # {"nombre": "bge_large", "ruta_logs": "logs/bge_large.jsonl"},
 ]
 
-
-def cargar_logs(path):
-    datos = []
-    with open(path, "r", encoding="utf-8") as f:
-        for linea in f:
-            item = json.loads(linea.strip())
-            datos.append(
-                {
-                    "question": item["question"],
-                    "answer": item["answer"],
-                    "contexts": item["contexts"],
-                }
-            )
-    return datos
-
-
-def evaluar_experimento(nombre, ruta_logs):
-    print(f"\nEjecutando experimento: {nombre}")
-    print(f"   Fichero de logs: {ruta_logs}")
-
-    registros = cargar_logs(ruta_logs)
-    if len(registros) == 0:
-        print("No hay registros en este fichero. Se omite.")
-        return None
-
-    ds = Dataset.from_list(registros)
-
-    resultado = evaluate(
-        dataset=ds,
-        metrics=[
-            context_precision,
-            context_recall,
-            faithfulness,
-            answer_relevancy,
-        ],
-    )
-
-    # resultado suele ser un objeto que ya imprime un resumen,
-    # pero aquí asumimos que se comporta como un dict con medias.
-    print("   Evaluación completada.")
-    print("   Resultado bruto:")
-    print(resultado)
-
-    return resultado
+# Tabla comparativa de la última ejecución
+RESULTADOS_PATH = "ragas_experimentos.json"
 
 
 def main():
     print("Iniciando batería de experimentos con RAGAS...\n")
 
-    resultados = {}
-
+    experimentos = {}
     for exp in EXPERIMENTOS:
         nombre = exp["nombre"]
         ruta = exp["ruta_logs"]
-        res = evaluar_experimento(nombre, ruta)
-        if res is not None:
-            resultados[nombre] = res
-
-    print("\nResumen comparativo (alto nivel):")
-    if not resultados:
+        # Resuelve los context_ids contra el almacén de chunks del log
+        muestras = cargar_muestras(ruta)
+        print(f"   {nombre}: {len(muestras)} registros ({ruta})")
+        if len(muestras) == 0:
+            print("   No hay registros en este fichero. Se omite.")
+            continue
+        experimentos[nombre] = muestras
+
+    if not experimentos:
         print("No se ha podido evaluar ningún experimento.")
         return
 
-    # Aquí simplemente los mostramos uno por uno.
-    # Si quieres, puedes adaptar esto para extraer métricas concretas.
-    for nombre, res in resultados.items():
-        print("────────────────────────────────────────")
-        print(f"Experimento: {nombre}")
-        print(res)
+    llm, embeddings = crear_juez()
+    metricas = preparar_metricas(
+        [context_precision, context_recall, faithfulness, answer_relevancy], llm, embeddings
+    )
+
+    inicio = time.perf_counter()
+    resultados = asyncio.run(ejecutar(experimentos, metricas))
+    total = time.perf_counter() - inicio
+
+    print("\nResumen comparativo (medias por configuración):\n")
+    print(tabla(resultados))
+    print(f"\nTiempo total: {total:.1f}s")
+
+    with open(RESULTADOS_PATH, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, ensure_ascii=False, indent=2)
+    print(f"Tabla guardada en: {RESULTADOS_PATH}")
 
     print("\nFin de la batería de experimentos.")
     print("   Usa estos resultados para elegir la mejor configuración de retriever.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,230 @@
+# ragas_runner.py
+"""
+Evaluación RAGAS en paralelo y reanudable.
+
+Cada puntuación se guarda en una caché en disco por (hash de la muestra,
+métrica, modelo juez) en cuanto se calcula, así que:
+
+- volver a evaluar un log solo puntúa los registros nuevos;
+- una ejecución interrumpida continúa donde se quedó;
+- varios experimentos con las mismas muestras comparten resultados.
+
+Los experimentos se evalúan a la vez, con un límite común de llamadas al
+LLM juez (RAGAS_LLM_RPS) y de puntuaciones en curso (RAGAS_MAX_CONCURRENCIA).
+Lo usan ragas_experiments.py y ragas_evaluate.py.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from graph.disk_cache import DiskCache
+from graph.logger import iter_log_records
+
+JUEZ_MODELO = os.getenv("RAGAS_JUDGE_MODEL", "gpt-4.1")
+EMBEDDINGS_MODELO = "text-embedding-ada-002"
+RAGAS_CACHE_PATH = Path(os.getenv("RAGAS_CACHE_PATH", "./.cache/ragas_scores.sqlite"))
+RAGAS_CACHE_MAX_ENTRIES = int(os.getenv("RAGAS_CACHE_MAX_ENTRIES", "1000000"))
+# Llamadas por segundo al LLM juez, compartidas por todos los experimentos
+RAGAS_LLM_RPS = float(os.getenv("RAGAS_LLM_RPS", "5"))
+# Puntuaciones (muestra, métrica) en curso a la vez
+RAGAS_MAX_CONCURRENCIA = int(os.getenv("RAGAS_MAX_CONCURRENCIA", "16"))
+
+# Campos de SingleTurnSample que se rellenan desde los logs
+CAMPOS_MUESTRA = ("user_input", "response", "retrieved_contexts", "reference")
+
+
+def cargar_muestras(path) -> List[Dict[str, Any]]:
+    """Registros del log (con segmentos rotados) en el formato de SingleTurnSample."""
+    muestras = []
+    for item in iter_log_records(path):
+        muestras.append(
+            {
+                "user_input": item["question"],
+                "response": item["answer"],
+                "retrieved_contexts": [c for c in item.get("contexts") or [] if c is not None],
+                "reference": item.get("reference"),
+            }
+        )
+    return muestras
+
+
+def hash_muestra(muestra: Dict[str, Any]) -> str:
+    datos = {campo: muestra.get(campo) for campo in CAMPOS_MUESTRA}
+    texto = json.dumps(datos, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:32]
+
+
+def columnas_requeridas(metrica) -> set:
+    requeridas = getattr(metrica, "required_columns", None) or {}
+    return set(requeridas.get("SINGLE_TURN", ()))
+
+
+class CachePuntuaciones:
+    """Puntuaciones por (muestra, métrica, modelo juez); NaN se guarda como null."""
+
+    def __init__(self, cache: Optional[DiskCache] = None):
+        if cache is None:
+            cache = DiskCache(
+                RAGAS_CACHE_PATH, table="ragas_scores", max_entries=RAGAS_CACHE_MAX_ENTRIES
+            )
+        self.cache = cache
+
+    @staticmethod
+    def clave(hash_muestra: str, metrica: str, modelo: str) -> str:
+        return f"{modelo}:{metrica}:{hash_muestra}"
+
+    def get_many(self, claves: List[str]) -> Dict[str, Optional[float]]:
+        return {k: json.loads(v) for k, v in self.cache.get_many(claves).items()}
+
+    def set(self, clave: str, valor: Optional[float]) -> None:
+        if valor is not None and math.isnan(valor):
+            valor = None
+        self.cache.set_many({clave: json.dumps(valor).encode("utf-8")})
+
+
+def crear_juez(modelo: str = JUEZ_MODELO, rps: float = RAGAS_LLM_RPS):
+    """LLM juez y embeddings para RAGAS; el limitador de tasa es común a todas las llamadas."""
+    from langchain_core.rate_limiters import InMemoryRateLimiter
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+    from ragas.embeddings import LangchainEmbeddingsWrapper
+    from ragas.llms import LangchainLLMWrapper
+
+    limitador = InMemoryRateLimiter(requests_per_second=rps, max_bucket_size=max(1, int(rps)))
+    llm = ChatOpenAI(model=modelo, temperature=0, rate_limiter=limitador)
+    embeddings = OpenAIEmbeddings(model=EMBEDDINGS_MODELO)
+    return LangchainLLMWrapper(llm), LangchainEmbeddingsWrapper(embeddings)
+
+
+def preparar_metricas(metricas, llm, embeddings):
+    from ragas.run_config import RunConfig
+
+    for metrica in metricas:
+        if hasattr(metrica, "llm"):
+            metrica.llm = llm
+        if hasattr(metrica, "embeddings"):
+            metrica.embeddings = embeddings
+        metrica.init(RunConfig())
+    return metricas
+
+
+def muestra_ragas(muestra: Dict[str, Any]):
+    from ragas import SingleTurnSample
+
+    return SingleTurnSample(**{k: v for k, v in muestra.items() if v is not None})
+
+
+async def puntuar_experimento(
+    nombre: str,
+    muestras: List[Dict[str, Any]],
+    metricas,
+    cache: CachePuntuaciones,
+    semaforo: asyncio.Semaphore,
+    modelo: str = JUEZ_MODELO,
+    construir_muestra: Callable = muestra_ragas,
+    en_curso: Optional[Dict[str, asyncio.Task]] = None,
+) -> Dict[str, Any]:
+    """
+    Puntúa las muestras que faltan en la caché y resume el experimento.
+    `en_curso` se comparte entre experimentos: una muestra que otro ya está
+    puntuando no se puntúa dos veces.
+    """
+    inicio = time.perf_counter()
+    en_curso = {} if en_curso is None else en_curso
+    hashes = [hash_muestra(m) for m in muestras]
+    claves = {
+        (h, metrica.name): CachePuntuaciones.clave(h, metrica.name, modelo)
+        for h in hashes
+        for metrica in metricas
+    }
+    puntuaciones = cache.get_many(list(claves.values()))
+    cacheadas = sum(1 for k in claves.values() if k in puntuaciones)
+
+    async def puntuar(muestra, metrica, clave) -> Optional[float]:
+        async with semaforo:
+            try:
+                valor = await metrica.single_turn_ascore(construir_muestra(muestra))
+            except Exception as e:
+                print(f"   [{nombre}] {metrica.name} falló: {e}")
+                raise
+        valor = None if valor is None or math.isnan(valor) else float(valor)
+        # Se guarda ya: si la ejecución se corta, esta puntuación no se repite
+        cache.set(clave, valor)
+        return valor
+
+    propias, pendientes, omitidas = set(), {}, set()
+    for muestra, h in zip(muestras, hashes):
+        for metrica in metricas:
+            clave = claves[(h, metrica.name)]
+            if clave in puntuaciones or clave in pendientes:
+                continue
+            if any(not muestra.get(c) for c in columnas_requeridas(metrica)):
+                omitidas.add(clave)
+                continue
+            if clave not in en_curso:
+                en_curso[clave] = asyncio.ensure_future(puntuar(muestra, metrica, clave))
+                propias.add(clave)
+            pendientes[clave] = en_curso[clave]
+
+    resultados = await asyncio.gather(*pendientes.values(), return_exceptions=True)
+    # Fallos de este experimento, también los de tareas que puntuaba otro;
+    # nuevas, solo las que puntuó este y salieron bien
+    fallos = nuevas = 0
+    for clave, valor in zip(pendientes, resultados):
+        if isinstance(valor, BaseException):
+            fallos += 1
+            continue
+        puntuaciones[clave] = valor
+        nuevas += clave in propias
+
+    medias = {}
+    for metrica in metricas:
+        valores = [puntuaciones.get(claves[(h, metrica.name)]) for h in hashes]
+        valores = [v for v in valores if v is not None]
+        medias[metrica.name] = round(sum(valores) / len(valores), 4) if valores else None
+
+    return {
+        "experimento": nombre,
+        "muestras": len(muestras),
+        **medias,
+        "nuevas": nuevas,
+        "cacheadas": cacheadas,
+        "omitidas": len(omitidas),
+        "fallos": fallos,
+        "segundos": round(time.perf_counter() - inicio, 2),
+    }
+
+
+async def ejecutar(
+    experimentos: Dict[str, List[Dict[str, Any]]],
+    metricas,
+    cache: Optional[CachePuntuaciones] = None,
+    modelo: str = JUEZ_MODELO,
+    max_concurrencia: int = RAGAS_MAX_CONCURRENCIA,
+    construir_muestra: Callable = muestra_ragas,
+) -> List[Dict[str, Any]]:
+    """Evalúa todos los experimentos a la vez; devuelve una fila de resumen por experimento."""
+    cache = cache or CachePuntuaciones()
+    semaforo = asyncio.Semaphore(max_concurrencia)
+    en_curso: Dict[str, asyncio.Task] = {}
+    return list(
+        await asyncio.gather(
+            *(
+                puntuar_experimento(
+                    nombre, muestras, metricas, cache, semaforo, modelo,
+                    construir_muestra, en_curso,
+                )
+                for nombre, muestras in experimentos.items()
+            )
+        )
+    )
+
+
+def tabla(resultados: List[Dict[str, Any]]) -> str:
+    import pandas as pd
+
+    return pd.DataFrame(resultados).set_index("experimento").to_string()
@@ -0,0 +1,129 @@
+import gzip
+import json
+import os
+from datetime import date
+
+import doc_stats
+from doc_stats import Agregador, ContadorDistintos
+
+
+def record(question: str, sources, day: str = "2026-10-17") -> bytes:
+    item = {"timestamp": f"{day}T10:00:00", "question": question, "sources": sources, "answer": "{}"}
+    return (json.dumps(item) + "\n").encode("utf-8")
+
+
+def run(log, checkpoint):
+    agregador = Agregador.cargar(checkpoint)
+    nuevos = agregador.actualizar(log)
+    agregador.guardar(checkpoint)
+    return agregador, nuevos
+
+
+def test_only_appended_records_are_processed(tmp_path) -> None:
+    log, checkpoint = tmp_path / "rag_logs.jsonl", tmp_path / "ck.json"
+    log.write_bytes(record("q1", ["a.pdf", "b.pdf"]) + record("q2", ["a.pdf"]))
+
+    _, nuevos = run(log, checkpoint)
+    assert nuevos == 2
+
+    # A line still being written is left for the next run
+    with open(log, "ab") as f:
+        f.write(record("q1", ["a.pdf"]) + record("q3", ["b.pdf"])[:10])
+    agregador, nuevos = run(log, checkpoint)
+    assert nuevos == 1
+
+    with open(log, "ab") as f:
+        f.write(record("q3", ["b.pdf"])[10:])
+    agregador, nuevos = run(log, checkpoint)
+    assert nuevos == 1
+
+    docs = {d["source"]: d for d in agregador.resumen()["documents"]}
+    assert docs["a.pdf"]["hits"] == 3 and docs["a.pdf"]["questions"] == 2
+    assert docs["b.pdf"]["hits"] == 2
+    full = Agregador()
+    full.actualizar(log)
+    assert full.resumen()["documents"] == agregador.resumen()["documents"]
+
+
+def test_rotated_segment_continues_from_checkpoint(tmp_path) -> None:
+    log, checkpoint = tmp_path / "rag_logs.jsonl", tmp_path / "ck.json"
+    log.write_bytes(record("q1", ["a.pdf"]))
+    run(log, checkpoint)
+
+    # The writer appends, rotates and compresses the live file, then starts a new one
+    with open(log, "ab") as f:
+        f.write(record("q2", ["a.pdf"]))
+    segment = tmp_path / "rag_logs.2026-10-17.001.jsonl.gz"
+    with gzip.open(segment, "wb") as f:
+        f.write(log.read_bytes())
+    os.remove(log)
+    log.write_bytes(record("q3", ["b.pdf"]))
+
+    agregador, nuevos = run(log, checkpoint)
+    assert nuevos == 2
+    assert agregador.resumen()["total_hits"] == 3
+    assert run(log, checkpoint)[1] == 0
+
+
+def test_segment_read_before_compression_is_not_counted_again(tmp_path) -> None:
+    log, checkpoint = tmp_path / "rag_logs.jsonl", tmp_path / "ck.json"
+    log.write_bytes(record("q1", ["a.pdf"]))
+    run(log, checkpoint)
+
+    # Rotated but not compressed yet when doc_stats runs
+    rotated = tmp_path / "rag_logs.2026-10-17.001.jsonl"
+    with open(log, "ab") as f:
+        f.write(record("q2", ["a.pdf"]))
+    os.replace(log, rotated)
+    log.write_bytes(record("q3", ["b.pdf"]))
+    assert run(log, checkpoint)[1] == 2
+
+    # The writer finishes compressing it
+    with open(rotated, "rb") as src, gzip.open(f"{rotated}.gz", "wb") as dst:
+        dst.write(src.read())
+    os.remove(rotated)
+
+    agregador, nuevos = run(log, checkpoint)
+    assert nuevos == 0
+    assert agregador.resumen()["total_hits"] == 3
+
+
+def test_distinct_questions_use_a_fixed_size_sketch(tmp_path) -> None:
+    log, checkpoint = tmp_path / "rag_logs.jsonl", tmp_path / "ck.json"
+    log.write_bytes(b"".join(record(f"q{i}", ["a.pdf"]) for i in range(5000)))
+
+    agregador, _ = run(log, checkpoint)
+    estimate = agregador.resumen()["documents"][0]["questions"]
+    assert abs(estimate - 5000) / 5000 < 0.1
+    # The checkpoint does not grow with the number of questions
+    assert checkpoint.stat().st_size < 4096
+
+    contador = ContadorDistintos()
+    for q in ("q1", "q2", "q1"):
+        contador.add(doc_stats._hash(q))
+    assert contador.estimar() == 2
+
+
+def test_time_windows_and_summary(tmp_path, monkeypatch) -> None:
+    log = tmp_path / "rag_logs.jsonl"
+    log.write_bytes(
+        record("q1", ["a.pdf"], "2026-10-17")
+        + record("q2", ["b.pdf"], "2026-10-12")
+        + record("q3", ["c.pdf"], "2026-09-01")
+    )
+    agregador = Agregador()
+    agregador.actualizar(log)
+    hoy = date(2026, 10, 17)
+
+    assert [d["source"] for d in agregador.resumen(1, hoy)["documents"]] == ["a.pdf"]
+    assert agregador.resumen(7, hoy)["records"] == 2
+    assert agregador.resumen(None, hoy)["total_hits"] == 3
+
+    summary = tmp_path / "summary.json"
+    monkeypatch.setattr(
+        "sys.argv",
+        ["doc_stats.py", "--log", str(log), "--checkpoint", str(tmp_path / "ck.json"),
+         "--summary", str(summary), "--window", "week"],
+    )
+    doc_stats.main()
+    assert json.loads(summary.read_text(encoding="utf-8"))["window_days"] == 7
@@ -0,0 +1,122 @@
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+import ingestion
+
+
+def make_store(tmp_path):
+    return Chroma(
+        collection_name="test",
+        persist_directory=str(tmp_path / "chroma"),
+        embedding_function=DeterministicFakeEmbedding(size=8),
+    )
+
+
+def run(docs, store, manifest, workers=1, full=False):
+    # Character splitter: the tiktoken one downloads its encoding on first use
+    splitter = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=50)
+    return ingestion.ingest(
+        str(docs),
+        store=store,
+        manifest_path=manifest,
+        batch_size=2,
+        splitter=splitter,
+        workers=workers,
+        full=full,
+    )
+
+
+@pytest.fixture(autouse=True)
+def text_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingestion, "EXTRACTED_CACHE_DIR", tmp_path / "extracted")
+    return tmp_path / "extracted"
+
+
+def test_incremental_ingestion(tmp_path) -> None:
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.txt").write_text("Acero reciclado en estructuras navales.", encoding="utf-8")
+    (docs / "b.txt").write_text("Pinturas con bajo contenido en COV.", encoding="utf-8")
+    (docs / ".hidden.txt").write_text("ignorar", encoding="utf-8")
+    store = make_store(tmp_path)
+    manifest = tmp_path / "manifest.json"
+
+    first = run(docs, store, manifest)
+    assert first["files_changed"] == 2
+    assert len(store.get()["ids"]) == first["chunks_upserted"] == 2
+
+    # Nothing changed: nothing is embedded and the index version is kept
+    second = run(docs, store, manifest)
+    assert second["files_changed"] == 0
+    assert second["chunks_upserted"] == 0
+    assert second["index_version"] == first["index_version"]
+
+    # Modify one file and delete the other
+    (docs / "a.txt").write_text("Acero inoxidable dúplex para cubierta.", encoding="utf-8")
+    (docs / "b.txt").unlink()
+    third = run(docs, store, manifest)
+    assert third["files_changed"] == 1
+    assert third["files_removed"] == 1
+    assert third["index_version"] != first["index_version"]
+
+    stored = store.get()
+    assert stored["documents"] == ["Acero inoxidable dúplex para cubierta."]
+    assert stored["ids"] == ingestion.load_manifest(manifest)["files"]["a.txt"]["chunk_ids"]
+
+
+def test_chunks_unknown_to_the_manifest_are_removed(tmp_path) -> None:
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.txt").write_text("Acero reciclado en estructuras navales.", encoding="utf-8")
+    store = make_store(tmp_path)
+    manifest = tmp_path / "manifest.json"
+
+    # Indexed before the manifest existed
+    store.add_texts(["Chunk huérfano"], ids=["legacy"])
+    run(docs, store, manifest)
+    assert store.get()["documents"] == ["Acero reciclado en estructuras navales."]
+
+    # --full drops whatever the manifest does not cover
+    store.add_texts(["Otro chunk huérfano"], ids=["stray"])
+    full = run(docs, store, manifest, full=True)
+    assert full["files_changed"] == 1
+    assert store.get()["ids"] == ingestion.load_manifest(manifest)["files"]["a.txt"]["chunk_ids"]
+
+
+def test_chunk_ids_are_stable() -> None:
+    assert ingestion.chunk_id("a.pdf", "abc", 0) == ingestion.chunk_id("a.pdf", "abc", 0)
+    assert ingestion.chunk_id("a.pdf", "abc", 0) != ingestion.chunk_id("a.pdf", "abc", 1)
+    assert ingestion.chunk_id("a.pdf", "abc", 0) != ingestion.chunk_id("b.pdf", "abc", 0)
+
+
+def test_parallel_matches_serial_and_reuses_extracted_text(tmp_path, text_cache) -> None:
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for i in range(5):
+        (docs / f"{i}.txt").write_text(f"Documento {i}. " * 60, encoding="utf-8")
+
+    serial_store = make_store(tmp_path / "serial")
+    serial = run(docs, serial_store, tmp_path / "serial.json", workers=1)
+    parallel_store = make_store(tmp_path / "parallel")
+    parallel = run(docs, parallel_store, tmp_path / "parallel.json", workers=2)
+
+    assert serial["chunks_upserted"] == parallel["chunks_upserted"] > 5
+    assert sorted(serial_store.get()["ids"]) == sorted(parallel_store.get()["ids"])
+    assert len(list(text_cache.glob("*.json"))) == 5
+
+
+def test_batches_have_fixed_size() -> None:
+    results = [
+        ("a", {"sha256": "a"}, ["a0", "a1", "a2"], ["ia0", "ia1", "ia2"]),
+        ("b", {"sha256": "b"}, ["b0"], ["ib0"]),
+        ("c", {"sha256": "c"}, ["c0", "c1"], ["ic0", "ic1"]),
+    ]
+
+    batches = list(ingestion.iter_chunk_batches(results, batch_size=2))
+
+    assert [len(docs) for docs, _, _ in batches if docs] == [2, 2, 2]
+    # every file is reported as completed exactly once, after its last chunk
+    completed = [rel for _, _, done in batches for rel, _ in done]
+    assert completed == ["a", "b", "c"]
@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+import main
+
+PROYECTO = {"description": "Barco", "bom": "| material |\n| acero |"}
+
+
+def fake_app(fallan=()):
+    vistas = []
+
+    async def run(state):
+        vistas.append(state["question"])
+        await asyncio.sleep(0.01)
+        if state["question"] in fallan:
+            raise RuntimeError("sin respuesta")
+        return {
+            "generation": f'{{"answer": "{state["question"]}"}}',
+            "documents": [Document(page_content="x", metadata={"source": "guia.pdf"})],
+        }
+
+    return RunnableLambda(lambda state: None, afunc=run), vistas
+
+
+def lineas(path):
+    return [json.loads(l) for l in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_jsonl_and_csv_questions(tmp_path) -> None:
+    jsonl = tmp_path / "p.jsonl"
+    jsonl.write_text(
+        '{"id": "a", "question": "q1"}\n\n{"question": "q2"}\n{"question": "q2"}\n{"question": " "}\n',
+        encoding="utf-8",
+    )
+    csv = tmp_path / "p.csv"
+    csv.write_text("id,question\nb,q3\n,q4\n", encoding="utf-8")
+
+    assert main.cargar_preguntas(jsonl) == [
+        {"id": "a", "question": "q1"},
+        {"id": main.id_pregunta("q2"), "question": "q2"},
+    ]
+    assert main.cargar_preguntas(csv) == [
+        {"id": "b", "question": "q3"},
+        {"id": main.id_pregunta("q4"), "question": "q4"},
+    ]
+
+
+def test_rerun_skips_answered_and_retries_failures(tmp_path) -> None:
+    salida = tmp_path / "respuestas.jsonl"
+    preguntas = [{"id": f"p{i}", "question": f"q{i}"} for i in range(6)]
+
+    app, vistas = fake_app(fallan={"q2"})
+    resumen = asyncio.run(main.ejecutar_lote(app, preguntas, PROYECTO, salida, concurrencia=3))
+
+    assert (resumen["ok"], resumen["fallos"], resumen["omitidas"]) == (5, 1, 0)
+    assert sorted(vistas) == [f"q{i}" for i in range(6)]
+    escritas = {l["id"]: l for l in lineas(salida)}
+    assert escritas["p0"]["sources"] == ["guia.pdf"]
+    assert escritas["p2"]["status"] == "error" and "sin respuesta" in escritas["p2"]["error"]
+
+    # Interrupted mid-line: the partial line is ignored
+    with open(salida, "a", encoding="utf-8") as f:
+        f.write('{"id": "p5", "question": "pregunta cortada á')
+
+    app, vistas = fake_app()
+    resumen = asyncio.run(main.ejecutar_lote(app, preguntas, PROYECTO, salida, concurrencia=3))
+
+    assert vistas == ["q2"]
+    assert (resumen["ok"], resumen["fallos"], resumen["omitidas"]) == (1, 0, 5)
+    assert main.ids_completados(salida, main.hash_proyecto(PROYECTO)) == {f"p{i}" for i in range(6)}
+
+
+def test_other_project_reanswers_everything(tmp_path) -> None:
+    salida = tmp_path / "respuestas.jsonl"
+    preguntas = [{"id": f"p{i}", "question": f"q{i}"} for i in range(3)]
+    app, _ = fake_app()
+    asyncio.run(main.ejecutar_lote(app, preguntas, PROYECTO, salida))
+    # Lines without an id (written by hand or by another tool) are ignored
+    with open(salida, "a", encoding="utf-8") as f:
+        f.write('{"status": "ok"}\n["p0"]\n')
+
+    otro_bom = {**PROYECTO, "bom": "| material |\n| aluminio |"}
+    app, vistas = fake_app()
+    resumen = asyncio.run(main.ejecutar_lote(app, preguntas, otro_bom, salida))
+
+    assert sorted(vistas) == ["q0", "q1", "q2"]
+    assert resumen["omitidas"] == 0
+    assert main.ids_completados(salida, main.hash_proyecto(PROYECTO)) == {"p0", "p1", "p2"}
@@ -0,0 +1,37 @@
+import gzip
+import json
+
+import migrate_logs
+from graph.chunk_store import chunk_store_path
+from graph.logger import iter_log_records, read_log_files
+
+
+def old_record(i: int):
+    return {
+        "timestamp": f"2025-12-0{i + 1}T10:00:00",
+        "question": f"q{i}",
+        "contexts": ["normativa naval " * 100, f"chunk {i}"],
+        "sources": ["a.pdf", "b.pdf"],
+        "answer": "{}",
+    }
+
+
+def test_migration_is_lossless_and_smaller(tmp_path) -> None:
+    log = tmp_path / "rag_logs.jsonl"
+    segment = tmp_path / "rag_logs.2025-12-01.001.jsonl.gz"
+    with gzip.open(segment, "wt", encoding="utf-8") as f:
+        f.write(json.dumps(old_record(0)) + "\n")
+    log.write_text("".join(json.dumps(old_record(i)) + "\n" for i in range(1, 40)), encoding="utf-8")
+    original = list(iter_log_records(log))
+
+    result = migrate_logs.migrar(log)
+
+    assert result["files_migrated"] == 2
+    assert result["chunks"] == 41
+    assert result["after"]["bytes"] < result["before"]["bytes"]
+    assert chunk_store_path(log).exists()
+    assert all("context_ids" in r for r in read_log_files([segment, log]))
+    assert list(iter_log_records(log)) == original
+
+    # Already migrated logs are left alone
+    assert migrate_logs.migrar(log)["files_migrated"] == 0
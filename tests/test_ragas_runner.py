@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from graph.disk_cache import DiskCache
+from ragas_runner import CachePuntuaciones, ejecutar, hash_muestra, tabla
+
+
+class FakeMetric:
+    """Métrica de prueba: puntuación = longitud de la respuesta / 10."""
+
+    def __init__(self, name, required=("user_input", "response"), fail_on=None):
+        self.name = name
+        self.required_columns = {"SINGLE_TURN": set(required)}
+        self.fail_on = fail_on
+        self.calls = []
+
+    async def single_turn_ascore(self, sample):
+        self.calls.append(sample["response"])
+        await asyncio.sleep(0.01)
+        if sample["response"] == self.fail_on:
+            raise RuntimeError("rate limit")
+        return len(sample["response"]) / 10
+
+
+def muestra(respuesta, reference=None):
+    return {
+        "user_input": "¿acero?",
+        "response": respuesta,
+        "retrieved_contexts": ["acero reciclado"],
+        "reference": reference,
+    }
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CachePuntuaciones(DiskCache(tmp_path / "ragas.sqlite", table="ragas_scores"))
+
+
+def run(experimentos, metricas, cache):
+    return asyncio.run(ejecutar(experimentos, metricas, cache, construir_muestra=lambda m: m))
+
+
+def test_scores_are_cached_per_sample_and_shared(cache) -> None:
+    metric = FakeMetric("faithfulness")
+    experimentos = {
+        "topk_3": [muestra("abcd"), muestra("ab")],
+        "topk_5": [muestra("abcd"), muestra("abcdef")],
+    }
+
+    first = run(experimentos, [metric], cache)
+    # El mismo registro en dos experimentos se puntúa una vez
+    assert sorted(metric.calls) == ["ab", "abcd", "abcdef"]
+    assert [r["faithfulness"] for r in first] == [0.3, 0.5]
+
+    experimentos["topk_5"].append(muestra("abcdefgh"))
+    second = run(experimentos, [metric], cache)
+
+    assert metric.calls[3:] == ["abcdefgh"]
+    assert second[1]["cacheadas"] == 2 and second[1]["nuevas"] == 1
+    assert second[1]["faithfulness"] == round((0.4 + 0.6 + 0.8) / 3, 4)
+
+
+def test_failed_scores_are_retried_on_the_next_run(cache) -> None:
+    flaky = FakeMetric("answer_relevancy", fail_on="abc")
+    result = run({"e": [muestra("abc"), muestra("a")]}, [flaky], cache)[0]
+    assert result["fallos"] == 1 and result["answer_relevancy"] == 0.1
+
+    flaky.fail_on = None
+    result = run({"e": [muestra("abc"), muestra("a")]}, [flaky], cache)[0]
+    assert result["nuevas"] == 1 and result["answer_relevancy"] == 0.2
+
+
+def test_shared_failure_is_reported_by_every_experiment(cache) -> None:
+    flaky = FakeMetric("faithfulness", fail_on="abc")
+
+    first, second = run({"a": [muestra("abc"), muestra("a")], "b": [muestra("abc")]}, [flaky], cache)
+
+    assert flaky.calls.count("abc") == 1
+    assert (first["fallos"], first["nuevas"]) == (1, 1)
+    assert (second["fallos"], second["nuevas"]) == (1, 0)
+
+
+def test_metrics_missing_columns_are_skipped(cache) -> None:
+    recall = FakeMetric("context_recall", required=("user_input", "reference"))
+
+    result = run({"e": [muestra("ab"), muestra("abcd", reference="acero")]}, [recall], cache)[0]
+
+    assert recall.calls == ["abcd"]
+    assert result["omitidas"] == 1
+    assert tabla([result]).splitlines()[-1].startswith("e ")
+
+
+def test_hash_depends_on_the_sample() -> None:
+    assert hash_muestra(muestra("a")) == hash_muestra(dict(muestra("a")))
+    assert hash_muestra(muestra("a")) != hash_muestra(muestra("a", reference="x"))